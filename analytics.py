@@ -0,0 +1,203 @@
+# analytics.py
+# Spending trend and anomaly detection over per-category time series
+# Series come from one grouped query; rolling statistics are computed for
+# every category at once as (categories x periods) NumPy arrays
+
+import datetime
+import sqlite3
+from decimal import Decimal, ROUND_HALF_UP
+import columnar_cache
+from db_utils import REPORT_FILTER, get_categories, cached_until_import, month_keys
+from profiling import timed
+
+FREQUENCIES = ('month', 'week')
+METHODS = ('mad', 'zscore', 'seasonal')
+DEFAULT_PERIODS = {'month': 24, 'week': 52}   # History loaded per analysis
+DEFAULT_WINDOW = {'month': 6, 'week': 8}      # Trailing periods forming the baseline
+SEASON = {'month': 12, 'week': 52}            # Lag compared by the seasonal method
+DEFAULT_THRESHOLD = {'mad': 3.5, 'zscore': 3.0, 'seasonal': 3.5}
+MIN_EXCESS = 25.0   # Spikes smaller than this many dollars over the baseline are ignored
+MAD_SCALE = 1.4826  # Makes MAD comparable to a standard deviation for normal data
+
+def period_keys(freq, periods, end=None):
+    """ Period labels ending at `end` (default today), oldest first: 'YYYY-MM' for months, the Monday 'YYYY-MM-DD' for weeks. """
+    end = end or datetime.date.today()
+    if freq == 'month': return month_keys(periods, end.year, end.month)
+    monday = end - datetime.timedelta(days=end.weekday())
+    return [(monday - datetime.timedelta(weeks=i)).isoformat() for i in range(periods - 1, -1, -1)]
+
+def _period_range(freq, keys):
+    """ [start, end) dates covering all keys. """
+    if freq == 'month':
+        y, m = map(int, keys[-1].split('-'))
+        return keys[0] + '-01', datetime.date(y + (m == 12), m % 12 + 1, 1).isoformat()
+    return keys[0], (datetime.date.fromisoformat(keys[-1]) + datetime.timedelta(weeks=1)).isoformat()
+
+def _series_from_snapshot(conn, snapshot, freq, keys):
+    """ Same rows as the grouped query, summed with NumPy over the memory-mapped export (see arrow_export). """
+    import numpy as np
+    from arrow_export import snapshot_columns
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT c.id FROM categories c WHERE {REPORT_FILTER}"); report_ids = np.array([r[0] for r in cursor.fetchall()], dtype=np.int64)
+    except sqlite3.Error as e: print(f"DB error loading report categories: {e}"); return None
+    finally:
+        if cursor: cursor.close()
+    epoch = datetime.date(1970, 1, 1)
+    start, stop = ((datetime.date.fromisoformat(d) - epoch).days for d in _period_range(freq, keys))
+    if freq == 'month': edges = np.array([(datetime.date.fromisoformat(k + '-01') - epoch).days for k in keys] + [stop])
+    else: edges = np.arange(start, stop + 1, 7)
+    totals = {}
+    for cols in snapshot_columns(snapshot):
+        days = cols['date']
+        mask = (~cols['is_income']) & (days >= start) & (days < stop) & np.isin(cols['category_id'], report_ids)
+        if not mask.any(): continue
+        cats = cols['category_id'][mask]; col = np.searchsorted(edges, days[mask], side='right') - 1
+        ids, row = np.unique(cats, return_inverse=True)
+        part = np.zeros((len(ids), len(keys))); np.add.at(part, (row, col), cols['amount'][mask])
+        for i, cid in enumerate(ids): totals[int(cid)] = totals.get(int(cid), 0) + part[i]
+    category_ids = sorted(totals)
+    return keys, category_ids, np.array([totals[c] for c in category_ids]) if category_ids else np.zeros((0, len(keys)))
+
+@timed
+def get_category_series(conn, freq='month', periods=None, end=None, snapshot=None):
+    """
+    Spending per category per period in one grouped query, from a columnar `snapshot` (arrow_export.load_snapshot),
+    or from the in-memory columnar cache when that is enabled.
+    Returns (keys, category_ids, matrix) where matrix is a float array of shape (categories, periods), or None on error.
+    """
+    import numpy as np
+    periods = periods or DEFAULT_PERIODS[freq]
+    keys = period_keys(freq, periods, end)
+    if snapshot is not None: return _series_from_snapshot(conn, snapshot, freq, keys)
+    store = columnar_cache.get_store(conn) if columnar_cache.is_enabled() else None
+    if store is not None:
+        if freq == 'month':
+            first = columnar_cache.month_number(*map(int, keys[0].split('-')))
+            category_ids, cents = store.totals_by_period(list(range(first, first + len(keys) + 1)), store.report_ids)
+        else:
+            first = (datetime.date.fromisoformat(keys[0]) - datetime.date(1970, 1, 1)).days
+            category_ids, cents = store.totals_by_period(list(range(first, first + 7 * len(keys) + 1, 7)), store.report_ids, key='day')
+        return keys, category_ids, cents / 100
+    bucket = "substr(t.transaction_date, 1, 7)" if freq == 'month' else "date(t.transaction_date, '-6 days', 'weekday 1')" # Monday on or before the date
+    sql = f"""
+        SELECT t.category_id, {bucket} AS period, SUM(t.amount) AS total
+        FROM transactions t JOIN categories c ON c.id = t.category_id
+        WHERE t.is_income = 0 AND t.transaction_date >= ? AND t.transaction_date < ? AND {REPORT_FILTER}
+        GROUP BY t.category_id, period;
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, _period_range(freq, keys))
+        rows = cursor.fetchall()
+    except sqlite3.Error as e: print(f"DB error building {freq}ly series: {e}"); return None
+    finally:
+        if cursor: cursor.close()
+    category_ids = sorted({r['category_id'] for r in rows})
+    row_of = {cid: i for i, cid in enumerate(category_ids)}; col_of = {k: i for i, k in enumerate(keys)}
+    matrix = np.zeros((len(category_ids), len(keys)))
+    for r in rows:
+        if r['period'] in col_of: matrix[row_of[r['category_id']], col_of[r['period']]] = r['total']
+    return keys, category_ids, matrix
+
+def rolling_stats(values, window):
+    """
+    Trailing statistics for each point over the `window` points before it (the point itself is excluded).
+    Returns dict of arrays shaped like values: mean, std, median, mad. The first `window` columns are NaN.
+    """
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+    stats = {k: np.full(values.shape, np.nan) for k in ('mean', 'std', 'median', 'mad')}
+    if values.shape[1] <= window: return stats
+    windows = sliding_window_view(values, window, axis=1)[:, :-1, :] # windows[:, j] is the baseline for point j + window
+    median = np.median(windows, axis=2)
+    stats['mean'][:, window:] = windows.mean(axis=2)
+    stats['std'][:, window:] = windows.std(axis=2, ddof=1) if window > 1 else 0.0
+    stats['median'][:, window:] = median
+    stats['mad'][:, window:] = np.median(np.abs(windows - median[..., None]), axis=2)
+    return stats
+
+def _robust_scores(values, window):
+    """ (expected, score): median baseline with MAD scale, falling back to the std when MAD is zero. """
+    import numpy as np
+    s = rolling_stats(values, window)
+    scale = MAD_SCALE * s['mad']
+    scale = np.where(scale > 0, scale, s['std'])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        score = np.where(scale > 0, (values - s['median']) / scale, np.where(values > s['median'], np.inf, 0.0))
+    return s['median'], score
+
+def anomaly_scores(values, freq='month', method='mad', window=None):
+    """ Vectorized spike scores for a (categories x periods) matrix. Returns (expected, score) arrays; NaN where there is no baseline yet. """
+    import numpy as np
+    window = window or DEFAULT_WINDOW[freq]
+    if method == 'zscore':
+        s = rolling_stats(values, window)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            score = np.where(s['std'] > 0, (values - s['mean']) / s['std'], np.where(values > s['mean'], np.inf, 0.0))
+        return s['mean'], score
+    if method == 'seasonal':
+        # Compare with the same period a season ago, then score the year-over-year change robustly
+        lag = SEASON[freq]
+        change = np.full(values.shape, np.nan); change[:, lag:] = values[:, lag:] - values[:, :-lag]
+        expected_change, score = _robust_scores(np.nan_to_num(change), window)
+        expected = np.full(values.shape, np.nan); expected[:, lag:] = values[:, :-lag] + expected_change[:, lag:]
+        score[:, :lag + window] = np.nan
+        return expected, score
+    return _robust_scores(values, window)
+
+def trend_slopes(values, window):
+    """ Least-squares slope (dollars per period) over the last `window` periods, per category. """
+    import numpy as np
+    tail = values[:, -window:]
+    t = np.arange(tail.shape[1]) - (tail.shape[1] - 1) / 2
+    return (tail * t).sum(axis=1) / (t * t).sum() if tail.shape[1] > 1 else np.zeros(len(values))
+
+def _money(x):
+    return Decimal(str(round(float(x), 2))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+def _analyze(conn, freq, method, window, threshold, periods, lookback, end, snapshot=None):
+    import numpy as np
+    series = get_category_series(conn, freq, periods, end, snapshot)
+    if series is None: return None
+    keys, category_ids, values = series
+    names = {c['id']: c['name'] for c in get_categories(conn)}
+    result = {'freq': freq, 'method': method, 'periods': keys, 'anomalies': [], 'trends': []}
+    if not category_ids: return result
+    expected, score = anomaly_scores(values, freq, method, window)
+    flagged = (score >= threshold) & (values - expected >= MIN_EXCESS)
+    flagged[:, :-lookback] = False # Only the most recent periods are reported
+    for i, j in zip(*np.nonzero(flagged)):
+        cid = category_ids[i]
+        result['anomalies'].append({'category_id': cid, 'category': names.get(cid, f"ID {cid}"), 'period': keys[j], 'amount': _money(values[i, j]),
+                                    'expected': _money(expected[i, j]), 'score': float(score[i, j]), 'method': method})
+    result['anomalies'].sort(key=lambda a: (a['period'], -a['score']))
+    slopes = trend_slopes(values[:, :-1], window) # The current period is partial, so trends use complete ones
+    baseline = values[:, -window - 1:-1].mean(axis=1)
+    for i, cid in enumerate(category_ids):
+        result['trends'].append({'category_id': cid, 'category': names.get(cid, f"ID {cid}"), 'slope': _money(slopes[i]), 'average': _money(baseline[i])})
+    result['trends'].sort(key=lambda t: -abs(t['slope']))
+    return result
+
+@timed
+def analyze_spending(conn, freq='month', method='mad', window=None, threshold=None, periods=None, lookback=2, end=None, snapshot=None):
+    """
+    Per-category anomaly flags for the last `lookback` periods and spending trends.
+    Returns {'freq', 'method', 'periods', 'anomalies': [...], 'trends': [...]}, or None on error.
+    Cached until the next CSV import. A `snapshot` replaces the SQL read but not the cache key, so it should be current.
+    """
+    if freq not in FREQUENCIES or method not in METHODS: raise ValueError(f"Unknown frequency/method: {freq}/{method}")
+    window = window or DEFAULT_WINDOW[freq]
+    threshold = threshold if threshold is not None else DEFAULT_THRESHOLD[method]
+    end = end or datetime.date.today()
+    args = (freq, method, window, threshold, periods, max(1, lookback), end)
+    return cached_until_import(conn, f"analytics:{freq}:{method}", lambda: _analyze(conn, *args, snapshot), args)
+
+def get_anomalies(conn, freq='month', method='mad', lookback=2):
+    """ Flagged spikes, most recent period last; [] when there is nothing to report or NumPy is unavailable. """
+    try: result = analyze_spending(conn, freq, method, lookback=lookback)
+    except ImportError: return []
+    return result['anomalies'] if result else []
+
+def format_anomaly(a):
+    return f"{a['category']} ({a['period']}): ${a['amount']:.2f} vs typical ${a['expected']:.2f}"
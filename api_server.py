@@ -0,0 +1,260 @@
+# api_server.py
+# Local JSON API over a ledger for dashboards and scripts (standard library only)
+# Reads run on a pool of read-only connections in worker threads; mutations go through
+# one writer connection on its own thread, so writes are serialized; GET responses are
+# cached until PRAGMA data_version shows that any connection has written
+# Usage: python api_server.py [--ledger NAME | --db FILE] [--host 127.0.0.1] [--port 8765] [--readers 4]
+
+import argparse
+import asyncio
+import collections
+import datetime
+import json
+import math
+import os
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlsplit, parse_qsl
+import db_utils
+import profiling
+import columnar_cache
+from database_setup import ensure_schema
+from ledgers import add_source_arguments, resolve_db_file
+from utils import json_default, parse_month
+
+DEFAULT_HOST = '127.0.0.1'     # Local only: there is no authentication
+DEFAULT_PORT = 8765
+DEFAULT_READERS = 4
+CACHE_ENTRIES = 256
+MAX_BODY = 64 * 1024
+BUSY_TIMEOUT_MS = 5000
+STATUS_TEXT = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message); self.status = status
+
+def _connect(db_file, readonly):
+    conn = sqlite3.connect(db_utils.file_uri(db_file, readonly), uri=True, check_same_thread=False, factory=profiling.connection_factory()) # Each connection is used by one thread at a time
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    return conn
+
+# --- Request parameters ---
+def _month(params):
+    """ ?month=YYYY-MM (default: current month) -> (year, month). """
+    value = params.get('month')
+    if not value: today = datetime.date.today(); return today.year, today.month
+    try: return parse_month(value)
+    except ValueError: raise ApiError(400, "month must be YYYY-MM")
+
+def _int(params, name, default, low, high):
+    try: value = int(params.get(name, default))
+    except (TypeError, ValueError): raise ApiError(400, f"{name} must be an integer")
+    if not low <= value <= high: raise ApiError(400, f"{name} must be between {low} and {high}")
+    return value
+
+def _decimal(data, name):
+    try: value = Decimal(str(data[name]))
+    except KeyError: raise ApiError(400, f"missing field '{name}'")
+    except InvalidOperation: raise ApiError(400, f"{name} must be a number")
+    if not value.is_finite() or value < 0: raise ApiError(400, f"{name} must be a non-negative number")
+    if not math.isfinite(float(value)): raise ApiError(400, f"{name} is too large") # Stored as REAL, so it must fit a float
+    return value
+
+def _content_length(headers):
+    """ The request body's length in bytes (0 without a Content-Length header). """
+    value = headers.get('content-length') or '0'
+    if not (value.isascii() and value.isdigit()): raise ApiError(400, "Content-Length must be a non-negative integer")
+    return int(value)
+
+# --- Read handlers: (conn, params) -> JSON-able, run on a pool thread ---
+def read_summary(conn, params):
+    year, month = _month(params)
+    snapshot = db_utils.get_dashboard_snapshot(conn, year, month)
+    if snapshot is None: raise ApiError(500, "could not compute summary")
+    return snapshot # Carries its own 'year' and 'month'
+
+def read_spending(conn, params):
+    year, month = _month(params)
+    names = {c['id']: c['name'] for c in db_utils.get_categories(conn)}
+    budgets = {b['id']: b['monthly_limit'] for b in db_utils.get_budgets(conn)}
+    spending = db_utils.get_spending_for_month(conn, year, month)
+    rows = [{'category_id': cid, 'category': names.get(cid), 'spent': spent, 'budget': budgets.get(cid)} for cid, spent in spending.items()]
+    return {'month': f"{year:04d}-{month:02d}", 'categories': sorted(rows, key=lambda r: r['spent'], reverse=True)}
+
+def read_spending_months(conn, params):
+    matrix = db_utils.get_spending_matrix(conn, _int(params, 'months', 12, 1, 120))
+    if matrix is None: raise ApiError(500, "could not compute spending by month")
+    names = {c['id']: c['name'] for c in db_utils.get_categories(conn)}
+    return {'months': matrix['months'], 'categories': [{'category_id': cid, 'category': names.get(cid), 'totals': totals} for cid, totals in matrix['totals'].items()]}
+
+def read_budgets(conn, params):
+    return {'budgets': db_utils.get_budgets(conn)}
+
+def read_debts(conn, params):
+    return {'debts': db_utils.get_debts(conn)}
+
+def read_simulation(conn, params):
+    from debt_manager import simulate_payoff
+    strategy = params.get('strategy', 'avalanche').lower()
+    if strategy not in ('avalanche', 'snowball'): raise ApiError(400, "strategy must be avalanche or snowball")
+    if 'payment' not in params: raise ApiError(400, "missing parameter 'payment'")
+    schedule, stats = simulate_payoff(conn, strategy, _decimal(params, 'payment'))
+    if schedule is None: raise ApiError(400, "payment does not cover the minimums, or there are no debts")
+    months = [{'month': m['month'], 'interest': m['interest_paid'], 'paid': sum(m['payments'].values(), Decimal('0.00')),
+               'balance': sum(m['balances_after'].values(), Decimal('0.00'))} for m in schedule]
+    return {'strategy': strategy, **stats, 'schedule': months}
+
+def read_health(conn, params):
+    return {'status': 'ok'}
+
+# --- Write handlers: (conn, data) -> JSON-able, run on the writer thread ---
+def write_budget(conn, data):
+    try: category_id = int(data['category_id'])
+    except (KeyError, TypeError, ValueError): raise ApiError(400, "category_id must be an integer")
+    limit = _decimal(data, 'monthly_limit')
+    if not any(c['id'] == category_id for c in db_utils.get_categories(conn)): raise ApiError(404, f"no category {category_id}")
+    if not db_utils.set_budget(conn, category_id, limit): raise ApiError(500, "could not save budget")
+    return {'category_id': category_id, 'monthly_limit': limit}
+
+def write_debt(conn, data):
+    name = str(data.get('name') or '').strip()
+    if not name: raise ApiError(400, "missing field 'name'")
+    debt_id = db_utils.add_debt(conn, name, data.get('lender'), _decimal(data, 'current_balance'), _decimal(data, 'interest_rate'), _decimal(data, 'minimum_payment'))
+    if debt_id is None: raise ApiError(400, f"could not add debt '{name}' (duplicate name?)")
+    return {'id': debt_id, 'name': name}
+
+READ_ROUTES = {
+    '/health': read_health, '/summary': read_summary, '/spending': read_spending, '/spending/months': read_spending_months,
+    '/budgets': read_budgets, '/debts': read_debts, '/simulate': read_simulation,
+}
+WRITE_ROUTES = {'/budgets': write_budget, '/debts': write_debt}
+
+class ApiServer:
+    """ Owns the reader pool, the writer and the response cache for one database file. """
+    def __init__(self, db_file, readers=DEFAULT_READERS, cache=True):
+        self.db_file = db_file; self.readers = readers; self.cache_enabled = cache
+        self.cache = collections.OrderedDict()  # (path, params) -> (data_version, status, body)
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.read_executor = ThreadPoolExecutor(self.readers, thread_name_prefix='api-read')
+        self.write_executor = ThreadPoolExecutor(1, thread_name_prefix='api-write') # One thread: writes never overlap
+        self.writer = await self._on(self.write_executor, _connect, self.db_file, False)
+        # WAL lets the readers keep reading while the writer commits; the mode is stored in the file
+        await self._on(self.write_executor, lambda: self.writer.execute("PRAGMA journal_mode = WAL").fetchone())
+        if not await self._on(self.write_executor, ensure_schema, self.writer): raise RuntimeError(f"Cannot update the schema of {self.db_file}")
+        self.pool = asyncio.Queue()
+        for _ in range(self.readers): self.pool.put_nowait(await self._on(self.read_executor, _connect, self.db_file, True))
+        self.version_conn = _connect(self.db_file, True) # Used only on the event loop thread, for PRAGMA data_version
+        self.server = await asyncio.start_server(self._handle_client, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.server.close(); await self.server.wait_closed()
+        while not self.pool.empty(): self.pool.get_nowait().close()
+        self.version_conn.close()
+        await self._on(self.write_executor, self.writer.close)
+        self.read_executor.shutdown(); self.write_executor.shutdown()
+
+    def _on(self, executor, fn, *args):
+        return asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+    def _data_version(self):
+        return self.version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    # --- Dispatch ---
+    async def _read(self, path, params):
+        handler = READ_ROUTES[path]
+        key = (path, tuple(sorted(params.items())))
+        version = self._data_version() # Taken before the query: a write that lands mid-query only costs a later miss
+        if self.cache_enabled:
+            entry = self.cache.get(key)
+            if entry and entry[0] == version: self.cache.move_to_end(key); return entry[1], entry[2]
+        conn = await self.pool.get()
+        try: status, body = 200, await self._on(self.read_executor, self._encode, handler, conn, params)
+        finally: self.pool.put_nowait(conn)
+        if self.cache_enabled:
+            self.cache[key] = (version, status, body); self.cache.move_to_end(key)
+            if len(self.cache) > CACHE_ENTRIES: self.cache.popitem(last=False)
+        return status, body
+
+    async def _write(self, path, data):
+        return 201, await self._on(self.write_executor, self._encode, WRITE_ROUTES[path], self.writer, data)
+
+    @staticmethod
+    def _encode(handler, conn, arg):
+        return json.dumps(handler(conn, arg), default=json_default).encode()
+
+    async def dispatch(self, method, target, body):
+        parts = urlsplit(target); path = parts.path.rstrip('/') or '/'
+        if method == 'GET' and path in READ_ROUTES: return await self._read(path, dict(parse_qsl(parts.query)))
+        if method == 'POST' and path in WRITE_ROUTES:
+            try: data = json.loads(body or b'{}')
+            except ValueError: raise ApiError(400, "body must be JSON")
+            if not isinstance(data, dict): raise ApiError(400, "body must be a JSON object")
+            return await self._write(path, data)
+        if path in READ_ROUTES or path in WRITE_ROUTES: raise ApiError(405, f"{method} not allowed on {path}")
+        raise ApiError(404, f"no route {path}")
+
+    # --- HTTP/1.1 with keep-alive ---
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line: break
+                try: method, target, version = request_line.decode('latin-1').split()
+                except ValueError: break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''): break
+                    name, _, value = line.decode('latin-1').partition(':'); headers[name.strip().lower()] = value.strip()
+                length = None # Unknown when the header is invalid: the body cannot be skipped, so the connection is closed
+                try:
+                    length = _content_length(headers)
+                    if length > MAX_BODY: raise ApiError(413, "request body too large")
+                    body = await reader.readexactly(length) if length else b''
+                    status, payload = await self.dispatch(method.upper(), target, body)
+                except ApiError as e: status, payload = e.status, json.dumps({'error': str(e)}).encode()
+                except Exception as e:
+                    print(f"API error on {method} {target}: {e}")
+                    status, payload = 500, json.dumps({'error': 'internal error'}).encode()
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1' and status != 413 and length is not None
+                writer.write(f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload)
+                await writer.drain()
+                if not keep_alive: break
+        except (ConnectionError, asyncio.IncompleteReadError): pass
+        finally:
+            writer.close()
+
+async def serve(db_file, host, port, readers, cache=True):
+    api = ApiServer(db_file, readers, cache)
+    bound = await api.start(host, port)
+    print(f"DoDoFin API on http://{host}:{bound} ({db_file}, {readers} readers{'' if cache else ', no cache'})", flush=True)
+    try: await asyncio.Event().wait()
+    finally: await api.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve ledger summaries, spending, budgets and debts as JSON.")
+    add_source_arguments(parser)
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"Interface (default: {DEFAULT_HOST})")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"Port (default: {DEFAULT_PORT}; 0 picks a free one)")
+    parser.add_argument('--readers', type=int, default=DEFAULT_READERS, help=f"Read connections (default: {DEFAULT_READERS})")
+    parser.add_argument('--no-cache', action='store_true', help="Disable response caching")
+    parser.add_argument('--columnar', action='store_true', help="Serve analytics from the in-memory columnar store")
+    args = parser.parse_args(argv)
+    try: db_file = resolve_db_file(args)
+    except ValueError as e: print(e); return 1
+    if not os.path.exists(db_file): print(f"DB '{db_file}' not found."); return 1
+    if args.columnar: columnar_cache.enable()
+    try: asyncio.run(serve(db_file, args.host, args.port, max(1, args.readers), not args.no_cache))
+    except KeyboardInterrupt: print("\nStopped.")
+    except RuntimeError as e: print(e); return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,201 @@
+# arrow_export.py
+# Columnar export of transactions for notebooks and analytics
+# Writes one Arrow IPC (or Parquet) file per year/month partition, rewriting only
+# partitions whose contents changed since the last export, and memory-maps them back
+# Usage: python arrow_export.py [--ledger NAME | --db FILE] [--out finance_export] [--format arrow|parquet] [--full]
+
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import zlib
+from db_utils import create_connection
+from ledgers import add_source_arguments, resolve_db_file
+from profiling import timed
+
+DEFAULT_EXPORT_DIR = 'finance_export'
+EXPORT_FORMATS = {'arrow': '.arrow', 'parquet': '.parquet'}
+MANIFEST = '_manifest.json'
+
+def _schema():
+    import pyarrow as pa
+    return pa.schema([
+        ('id', pa.int64()), ('transaction_date', pa.date32()), ('description', pa.string()), ('amount', pa.float64()),
+        ('category_id', pa.int64()), ('category', pa.dictionary(pa.int32(), pa.string())), ('is_income', pa.bool_()),
+    ])
+
+def _partition_path(out_dir, month, fmt):
+    year, mon = month.split('-')
+    return os.path.join(out_dir, f"year={year}", f"month={mon}", f"part{EXPORT_FORMATS[fmt]}")
+
+# --- Change detection ---
+def _description_hash(row_id, description):
+    """ CRC-32 of a row's description salted with its id, so equal-length edits and swaps between rows both show. """
+    return zlib.crc32(f"{row_id}:{description}".encode('utf-8'))
+
+def _partition_fingerprints(conn):
+    """
+    One grouped pass: {'YYYY-MM': [count, max id, amount total, id/category checksum, id-weighted amount,
+    id-weighted date, description hash sum]}. Any insert, delete, date move, recategorization, amount or
+    description change alters its month's fingerprint, including values swapped between two rows.
+    """
+    conn.create_function('export_description_hash', 2, _description_hash, deterministic=True)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT substr(transaction_date, 1, 7) AS month, COUNT(*), MAX(id), TOTAL(amount),
+                   TOTAL(id * (COALESCE(category_id, 0) + 1) * (is_income + 1)), TOTAL(id * amount),
+                   TOTAL(id * julianday(transaction_date)), SUM(export_description_hash(id, description))
+            FROM transactions GROUP BY month;
+        """)
+        return {r[0]: list(r[1:]) for r in cursor.fetchall() if r[0]}
+    finally:
+        cursor.close()
+
+def _categories_fingerprint(conn):
+    """ Category names are denormalized into every partition, so a rename rewrites them all. """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT group_concat(id || ':' || name, '|') FROM (SELECT id, name FROM categories ORDER BY id)")
+        return cursor.fetchone()[0] or ''
+    finally:
+        cursor.close()
+
+def _load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST), encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError): return {}
+
+# --- Export ---
+def _read_partition(conn, month):
+    """ Returns a pyarrow Table with the month's transactions, read as plain tuples (no sqlite3.Row per row). """
+    import pyarrow as pa
+    y, m = map(int, month.split('-'))
+    start = datetime.date(y, m, 1); end = datetime.date(y + (m == 12), m % 12 + 1, 1)
+    cursor = conn.cursor(); cursor.row_factory = None
+    try:
+        cursor.execute("""
+            SELECT t.id, t.transaction_date, t.description, t.amount, t.category_id, c.name, t.is_income
+            FROM transactions t LEFT JOIN categories c ON c.id = t.category_id
+            WHERE t.transaction_date >= ? AND t.transaction_date < ? ORDER BY t.transaction_date, t.id;
+        """, (start.isoformat(), end.isoformat()))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    ids, dates, descs, amounts, cat_ids, cats, incomes = zip(*rows) if rows else ((),) * 7
+    schema = _schema()
+    return pa.table([
+        pa.array(ids, pa.int64()),
+        pa.array([datetime.date.fromisoformat(d[:10]) for d in dates], pa.date32()),
+        pa.array(descs, pa.string()), pa.array(amounts, pa.float64()), pa.array(cat_ids, pa.int64()),
+        pa.array(cats, pa.string()).dictionary_encode().cast(schema.field('category').type),
+        pa.array([bool(i) for i in incomes], pa.bool_()),
+    ], schema=schema)
+
+def _write_partition(table, path, fmt):
+    """ Writes to a temporary file and renames it over the old partition, so readers never see a half-written file. """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(table, tmp)
+    else:
+        import pyarrow as pa
+        with pa.OSFile(tmp, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer: writer.write_table(table) # Uncompressed, so it can be memory-mapped
+    os.replace(tmp, path)
+
+def _remove_partition(path):
+    try: os.remove(path)
+    except FileNotFoundError: return
+    for d in (os.path.dirname(path), os.path.dirname(os.path.dirname(path))):
+        try: os.rmdir(d)
+        except OSError: break # Not empty
+
+@timed
+def export_transactions(conn, out_dir=DEFAULT_EXPORT_DIR, fmt='arrow', full=False):
+    """
+    Exports transactions (with category names) to out_dir/year=YYYY/month=MM/part.<fmt>.
+    Only partitions whose fingerprint changed since the last export are rewritten; vanished months are removed.
+    Returns {'written': [...months], 'removed': [...months], 'unchanged': n}, or None on error.
+    """
+    if fmt not in EXPORT_FORMATS: print(f"Unknown export format '{fmt}'."); return None
+    try: import pyarrow # noqa: F401
+    except ImportError: print("Columnar export needs pyarrow (pip install pyarrow)."); return None
+    try:
+        current = _partition_fingerprints(conn); categories = _categories_fingerprint(conn)
+        manifest = _load_manifest(out_dir)
+        if full or manifest.get('format') != fmt or manifest.get('categories') != categories: previous = {}
+        else: previous = manifest.get('partitions', {})
+        changed = sorted(m for m, fp in current.items() if previous.get(m) != fp)
+        removed = sorted(set(manifest.get('partitions', {})) - set(current))
+        for month in changed: _write_partition(_read_partition(conn, month), _partition_path(out_dir, month, fmt), fmt)
+        for month in removed: _remove_partition(_partition_path(out_dir, month, manifest.get('format', fmt)))
+        if manifest.get('format') not in (None, fmt): # Switching formats: drop the old files
+            for month in manifest.get('partitions', {}): _remove_partition(_partition_path(out_dir, month, manifest['format']))
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, MANIFEST + '.tmp'), 'w', encoding='utf-8') as f:
+            json.dump({'format': fmt, 'categories': categories, 'exported_at': datetime.datetime.now().isoformat(timespec='seconds'), 'partitions': current}, f)
+        os.replace(os.path.join(out_dir, MANIFEST + '.tmp'), os.path.join(out_dir, MANIFEST))
+    except (sqlite3.Error, OSError) as e: print(f"Export error: {e}"); return None
+    return {'written': changed, 'removed': removed, 'unchanged': len(current) - len(changed)}
+
+# --- Load ---
+@timed
+def load_snapshot(out_dir=DEFAULT_EXPORT_DIR, start=None, end=None):
+    """
+    Memory-maps the exported Arrow partitions (optionally only months in ['YYYY-MM', 'YYYY-MM']) into one
+    pyarrow Table without copying: each partition becomes a chunk backed by the mapped file.
+    Parquet exports are read normally (decoding needs a copy). Returns None when there is no export.
+    """
+    import pyarrow as pa
+    manifest = _load_manifest(out_dir)
+    if not manifest: print(f"No export found in '{out_dir}'."); return None
+    fmt = manifest['format']
+    months = sorted(m for m in manifest['partitions'] if (start is None or m >= start) and (end is None or m <= end))
+    tables = []
+    for month in months:
+        path = _partition_path(out_dir, month, fmt)
+        if fmt == 'parquet':
+            import pyarrow.parquet as pq
+            tables.append(pq.read_table(path, memory_map=True))
+        else: tables.append(pa.ipc.open_file(pa.memory_map(path, 'r')).read_all())
+    schema = _schema()
+    return pa.concat_tables(tables) if tables else schema.empty_table()
+
+def snapshot_columns(snapshot):
+    """
+    Yields one dict of NumPy arrays per chunk (partition): 'date' (int32 days since 1970-01-01), 'amount',
+    'category_id' (-1 when uncategorized) and 'is_income'. Dates and amounts are views over the mapped memory.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    for batch in snapshot.to_batches():
+        yield {
+            'date': batch.column('transaction_date').view(pa.int32()).to_numpy(),
+            'amount': batch.column('amount').to_numpy(),
+            'category_id': pc.fill_null(batch.column('category_id'), -1).to_numpy(),
+            'is_income': batch.column('is_income').to_numpy(zero_copy_only=False),
+        }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export transactions to partitioned Arrow/Parquet files.")
+    add_source_arguments(parser)
+    parser.add_argument('--out', default=DEFAULT_EXPORT_DIR, help=f"Export directory (default: {DEFAULT_EXPORT_DIR})")
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='arrow', help="File format (default: arrow, which can be memory-mapped)")
+    parser.add_argument('--full', action='store_true', help="Rewrite every partition")
+    args = parser.parse_args(argv)
+    try: db_file = resolve_db_file(args)
+    except ValueError as e: print(e); return 2
+    if not os.path.exists(db_file): print(f"DB '{db_file}' not found."); return 1
+    conn = create_connection(db_file)
+    if conn is None: return 1
+    try: result = export_transactions(conn, args.out, args.format, args.full)
+    finally: conn.close()
+    if result is None: return 1
+    print(f"Export to '{args.out}': {len(result['written'])} partitions written, {len(result['removed'])} removed, {result['unchanged']} unchanged.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
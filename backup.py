@@ -0,0 +1,193 @@
+# backup.py
+# Online snapshots of a ledger database with the SQLite backup API
+# The copy is made in page steps, so the read lock is held only for one step at a time and the
+# GUI, CLI or watcher keep working during a backup. Each snapshot is integrity-checked, then gzipped.
+# Rotation keeps the newest snapshot of each of the last --daily days and --weekly ISO weeks;
+# the copy a restore saves first (<name>-<time>.pre-restore.db.gz) is never rotated away.
+# Usage: python backup.py [--ledger NAME | --db FILE] [--dir backups] create [--no-prune] | list | verify [SNAPSHOT ...]
+#        | prune [--daily 7] [--weekly 8] | restore SNAPSHOT [--yes]
+
+import argparse
+import datetime
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import db_utils
+from ledgers import add_source_arguments, resolve_db_file
+
+BACKUP_DIR = 'backups'
+PAGES_PER_STEP = 256   # Pages copied per backup step (1 MB at the default 4 KB page size)
+STEP_SLEEP = 0.005     # Seconds between steps, so writers get the lock in between
+KEEP_DAILY = 7         # Days that keep their newest snapshot
+KEEP_WEEKLY = 8        # ISO weeks that keep their newest snapshot
+PRE_RESTORE = 'pre-restore'
+_SNAPSHOT_RE = re.compile(r'^(?P<stem>.+)-(?P<stamp>\d{8}-\d{6})(?:-\d+)?(?:\.(?P<label>[a-z-]+))?\.db\.gz$')
+
+def snapshot_dir(db_file, backup_dir=BACKUP_DIR):
+    """ Snapshots of one database live in backup_dir/<database name>/, so ledgers rotate separately. """
+    return os.path.join(backup_dir, os.path.splitext(os.path.basename(db_file))[0])
+
+def snapshot_time(path):
+    """ Creation time encoded in a snapshot's file name, or None if the name is not a snapshot's. """
+    m = _SNAPSHOT_RE.match(os.path.basename(path))
+    return datetime.datetime.strptime(m.group('stamp'), '%Y%m%d-%H%M%S') if m else None
+
+def list_snapshots(db_file, backup_dir=BACKUP_DIR):
+    """ [(path, created)] for db_file, newest first. """
+    folder = snapshot_dir(db_file, backup_dir)
+    if not os.path.isdir(folder): return []
+    found = [(os.path.join(folder, n), snapshot_time(n)) for n in os.listdir(folder)]
+    return sorted([(p, t) for p, t in found if t], key=lambda s: (s[1], s[0]), reverse=True)
+
+def _copy_online(source_conn, target_file, pages=PAGES_PER_STEP, sleep=STEP_SLEEP, progress=None):
+    """ Copies a live database into target_file step by step and leaves it as a standalone rollback-journal file. """
+    target = sqlite3.connect(target_file)
+    try:
+        source_conn.backup(target, pages=pages, sleep=sleep, progress=progress)
+        target.execute("PRAGMA journal_mode = DELETE") # The source may be in WAL; the snapshot must be one file
+    finally: target.close()
+
+def integrity_errors(db_file):
+    """ Runs PRAGMA integrity_check on an uncompressed database file. Returns a list of problems (empty = ok). """
+    conn = None
+    try:
+        conn = sqlite3.connect(db_utils.file_uri(db_file, readonly=True), uri=True)
+        rows = [r[0] for r in conn.execute("PRAGMA integrity_check").fetchall()]
+        return [] if rows == ['ok'] else rows
+    except sqlite3.Error as e: return [str(e)]
+    finally:
+        if conn: conn.close()
+
+def _gunzip_to(snapshot, target_file):
+    with gzip.open(snapshot, 'rb') as src, open(target_file, 'wb') as dst: shutil.copyfileobj(src, dst, 1 << 20)
+
+def create_snapshot(db_file, backup_dir=BACKUP_DIR, pages=PAGES_PER_STEP, sleep=STEP_SLEEP, label=None):
+    """
+    Takes an online snapshot of db_file, checks it and writes it as <name>-YYYYMMDD-HHMMSS[.label].db.gz.
+    Returns the snapshot path. Raises sqlite3.Error / OSError on failure and ValueError if the copy is corrupt.
+    """
+    folder = snapshot_dir(db_file, backup_dir); os.makedirs(folder, exist_ok=True)
+    stem = os.path.basename(folder); stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    suffix = f".{label}.db.gz" if label else '.db.gz'
+    target = os.path.join(folder, f"{stem}-{stamp}{suffix}"); n = 1
+    while os.path.exists(target): target = os.path.join(folder, f"{stem}-{stamp}-{n}{suffix}"); n += 1
+    fd, raw = tempfile.mkstemp(suffix='.db', dir=folder); os.close(fd)
+    try:
+        source = sqlite3.connect(db_utils.file_uri(db_file, readonly=True), uri=True)
+        try: _copy_online(source, raw, pages, sleep)
+        finally: source.close()
+        problems = integrity_errors(raw)
+        if problems: raise ValueError(f"Snapshot of {db_file} failed its integrity check: {'; '.join(problems[:5])}")
+        with open(raw, 'rb') as src, gzip.open(target + '.part', 'wb', compresslevel=6) as dst: shutil.copyfileobj(src, dst, 1 << 20)
+        os.replace(target + '.part', target) # A half-written snapshot never carries the final name
+    finally:
+        for leftover in (raw, raw + '-journal', target + '.part'):
+            if os.path.exists(leftover): os.remove(leftover)
+    return target
+
+def verify_snapshot(snapshot):
+    """ Decompresses a snapshot to a temporary file and integrity-checks it. Returns a list of problems (empty = ok). """
+    fd, raw = tempfile.mkstemp(suffix='.db'); os.close(fd)
+    try:
+        _gunzip_to(snapshot, raw)
+        return integrity_errors(raw)
+    except (OSError, EOFError) as e: return [f"Cannot read {snapshot}: {e}"]
+    finally: os.remove(raw)
+
+def expired_snapshots(snapshots, keep_daily=KEEP_DAILY, keep_weekly=KEEP_WEEKLY):
+    """ From [(path, created)] newest first, the paths that no daily or weekly slot keeps. Labelled snapshots are kept. """
+    keep = set(); days = {}; weeks = {}
+    for path, created in snapshots:
+        if _SNAPSHOT_RE.match(os.path.basename(path)).group('label'): keep.add(path); continue
+        day = created.date(); week = day.isocalendar()[:2]
+        if day not in days and len(days) < keep_daily: days[day] = path; keep.add(path)
+        if week not in weeks and len(weeks) < keep_weekly: weeks[week] = path; keep.add(path)
+    return [path for path, _ in snapshots if path not in keep]
+
+def prune_snapshots(db_file, backup_dir=BACKUP_DIR, keep_daily=KEEP_DAILY, keep_weekly=KEEP_WEEKLY):
+    """ Deletes snapshots outside the retention slots. Returns the deleted paths. """
+    expired = expired_snapshots(list_snapshots(db_file, backup_dir), keep_daily, keep_weekly)
+    for path in expired: os.remove(path)
+    return expired
+
+def restore_snapshot(snapshot, db_file, backup_dir=BACKUP_DIR):
+    """
+    Replaces db_file's contents with a verified snapshot. A snapshot of the current contents is taken first
+    (returned, or None if db_file did not exist). The copy goes through the backup API into the live file,
+    so WAL and open connections stay consistent: other connections simply see the restored data.
+    """
+    fd, raw = tempfile.mkstemp(suffix='.db'); os.close(fd)
+    try:
+        _gunzip_to(snapshot, raw)
+        problems = integrity_errors(raw)
+        if problems: raise ValueError(f"{snapshot} failed its integrity check: {'; '.join(problems[:5])}")
+        safety = create_snapshot(db_file, backup_dir, label=PRE_RESTORE) if os.path.exists(db_file) else None
+        source = sqlite3.connect(db_utils.file_uri(raw, readonly=True), uri=True); target = db_utils.create_connection(db_file)
+        if target is None: source.close(); raise sqlite3.OperationalError(f"Cannot open {db_file}")
+        try:
+            db_utils.tune_connection(target)
+            source.backup(target) # One step: the restore must not interleave with writers
+        finally: source.close(); target.close()
+        return safety
+    finally: os.remove(raw)
+
+def _size(path):
+    size = os.path.getsize(path)
+    return f"{size / 1048576:.1f} MB" if size >= 1048576 else f"{size / 1024:.0f} KB"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Back up and restore a ledger database.")
+    add_source_arguments(parser)
+    parser.add_argument('--dir', default=BACKUP_DIR, help=f"Backup folder (default: {BACKUP_DIR})")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('create', help="Take a snapshot now (then prune)"); p.add_argument('--no-prune', action='store_true')
+    p.add_argument('--daily', type=int, default=KEEP_DAILY); p.add_argument('--weekly', type=int, default=KEEP_WEEKLY)
+    sub.add_parser('list', help="List snapshots, newest first")
+    p = sub.add_parser('verify', help="Integrity-check snapshots (default: all)"); p.add_argument('snapshots', nargs='*')
+    p = sub.add_parser('prune', help="Delete snapshots outside the retention slots")
+    p.add_argument('--daily', type=int, default=KEEP_DAILY, help=f"Days to keep (default: {KEEP_DAILY})")
+    p.add_argument('--weekly', type=int, default=KEEP_WEEKLY, help=f"ISO weeks to keep (default: {KEEP_WEEKLY})")
+    p = sub.add_parser('restore', help="Replace the database with a snapshot"); p.add_argument('snapshot')
+    p.add_argument('--yes', action='store_true', help="Do not ask for confirmation")
+    args = parser.parse_args(argv)
+    try: db_file = resolve_db_file(args)
+    except ValueError as e: print(e); return 2
+    try:
+        if args.command == 'create':
+            if not os.path.exists(db_file): print(f"DB '{db_file}' not found."); return 1
+            start = time.perf_counter(); path = create_snapshot(db_file, args.dir)
+            print(f"Snapshot {path} ({_size(path)}, {time.perf_counter() - start:.1f}s, integrity ok).")
+            if not args.no_prune:
+                for gone in prune_snapshots(db_file, args.dir, args.daily, args.weekly): print(f"Pruned {gone}")
+        elif args.command == 'list':
+            snapshots = list_snapshots(db_file, args.dir)
+            if not snapshots: print(f"No snapshots of {db_file} in {snapshot_dir(db_file, args.dir)}."); return 0
+            for path, created in snapshots: print(f"{created:%Y-%m-%d %H:%M:%S}  {_size(path):>9}  {path}")
+            print(f"{len(snapshots)} snapshot(s); pre-restore copies are kept until deleted by hand.")
+        elif args.command == 'verify':
+            paths = args.snapshots or [p for p, _ in list_snapshots(db_file, args.dir)]; bad = 0
+            for path in paths:
+                problems = verify_snapshot(path); bad += bool(problems)
+                print(f"{'ok    ' if not problems else 'FAILED'} {path}" + (f": {'; '.join('; '.join(problems).splitlines()[:3])}" if problems else ""))
+            return 1 if bad else 0
+        elif args.command == 'prune':
+            gone = prune_snapshots(db_file, args.dir, args.daily, args.weekly)
+            for path in gone: print(f"Pruned {path}")
+            print(f"{len(gone)} snapshot(s) pruned.")
+        else:
+            if not os.path.exists(args.snapshot): print(f"Snapshot '{args.snapshot}' not found."); return 1
+            if not args.yes and input(f"Replace the contents of {db_file} with {args.snapshot}? (y/n): ").strip().lower() != 'y':
+                print("Restore cancelled."); return 0
+            safety = restore_snapshot(args.snapshot, db_file, args.dir)
+            print(f"Restored {db_file} from {args.snapshot}." + (f" Previous contents saved as {safety}." if safety else ""))
+    except ValueError as e: print(e); return 1
+    except (sqlite3.Error, OSError) as e: print(f"Backup error: {e}"); return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,3 @@
+# benchmarks/__init__.py
+# Performance benchmarks for DoDoFin
+# Run with: python -m benchmarks.run --help
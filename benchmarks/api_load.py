@@ -0,0 +1,105 @@
+# benchmarks/api_load.py
+# Load test for api_server.py: requests/sec and latency under concurrent keep-alive clients
+# Usage: python -m benchmarks.api_load [--transactions 100000] [--concurrency 1 --concurrency 16] [--seconds 5] [--no-cache]
+# The server runs in its own process (as it would in use); clients share one event loop here
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks import synthetic
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CONCURRENCY = (1, 4, 16, 64)
+# Request mix: mostly dashboard reads, a few heavier reports and simulations
+READ_MIX = ['/summary', '/summary', '/spending', '/spending', '/budgets', '/debts', '/spending/months?months=12', '/simulate?strategy=avalanche&payment={payment}']
+
+async def _request(reader, writer, method, target, body=b''):
+    writer.write(f"{method} {target} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1]); length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''): break
+        if line.lower().startswith(b'content-length:'): length = int(line.split(b':')[1])
+    await reader.readexactly(length)
+    return status
+
+async def _client(port, deadline, targets, offset, write_every, latencies, errors):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        i = offset
+        while time.perf_counter() < deadline:
+            i += 1; start = time.perf_counter()
+            if write_every and i % write_every == 0: # A budget edit: invalidates every cached response
+                status = await _request(reader, writer, 'POST', '/budgets', json.dumps({'category_id': 1, 'monthly_limit': str(100 + i % 50)}).encode())
+            else: status = await _request(reader, writer, 'GET', targets[i % len(targets)])
+            latencies.append(time.perf_counter() - start)
+            if status >= 400: errors.append(status)
+    finally:
+        writer.close()
+
+async def run_level(port, concurrency, seconds, targets, write_every):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds; start = time.perf_counter()
+    await asyncio.gather(*(_client(port, deadline, targets, n * 7, write_every, latencies, errors) for n in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {'concurrency': concurrency, 'requests': len(latencies), 'errors': len(errors), 'rps': len(latencies) / elapsed,
+            'p50_ms': statistics.median(latencies) * 1000, 'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000}
+
+def start_server(db_file, readers, cache):
+    """ Starts api_server.py on a free port. Returns (process, port). """
+    cmd = [sys.executable, '-u', 'api_server.py', '--db', db_file, '--port', '0', '--readers', str(readers)] + ([] if cache else ['--no-cache'])
+    proc = subprocess.Popen(cmd, cwd=REPO_DIR, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    line = proc.stdout.readline()
+    m = re.search(r':(\d+) \(', line)
+    if not m: proc.kill(); raise RuntimeError(f"API server did not start: {line}{proc.stdout.read()}")
+    return proc, int(m.group(1))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the DoDoFin JSON API.")
+    parser.add_argument('--transactions', type=int, default=100000, help="Synthetic ledger size (default: 100000)")
+    parser.add_argument('--db', help="Use this database instead of generating one (a copy is not made: writes go to it)")
+    parser.add_argument('--concurrency', type=int, action='append', help=f"Concurrent clients (repeatable; default: {' '.join(map(str, DEFAULT_CONCURRENCY))})")
+    parser.add_argument('--seconds', type=float, default=5, help="Duration per concurrency level (default: 5)")
+    parser.add_argument('--readers', type=int, default=4, help="Server read connections (default: 4)")
+    parser.add_argument('--write-every', type=int, default=0, help="Make every Nth request of each client a budget write (default: 0, reads only)")
+    parser.add_argument('--payment', type=int, default=3000, help="Monthly payment for /simulate (default: 3000)")
+    parser.add_argument('--no-cache', action='store_true', help="Run the server without its response cache")
+    parser.add_argument('--out', help="Write results JSON here")
+    args = parser.parse_args(argv)
+
+    db_file = args.db
+    if not db_file:
+        db_file = os.path.join(tempfile.mkdtemp(prefix='dodofin-api-'), 'ledger.db')
+        print(f"Generating ledger: {args.transactions} transactions...")
+        synthetic.generate_ledger(db_file, args.transactions, end_date=datetime.date.today())
+    targets = [t.format(payment=args.payment) for t in READ_MIX]
+    proc, port = start_server(db_file, args.readers, not args.no_cache)
+    results = []
+    try:
+        print(f"\n{'Clients':>8} | {'Requests':>9} | {'Req/s':>9} | {'p50 (ms)':>9} | {'p95 (ms)':>9} | {'Errors':>6}")
+        print("-" * 66)
+        for level in args.concurrency or DEFAULT_CONCURRENCY:
+            r = asyncio.run(run_level(port, level, args.seconds, targets, args.write_every)); results.append(r)
+            print(f"{r['concurrency']:>8} | {r['requests']:>9} | {r['rps']:>9.0f} | {r['p50_ms']:>9.2f} | {r['p95_ms']:>9.2f} | {r['errors']:>6}")
+        print("-" * 66)
+    finally:
+        proc.terminate(); proc.wait()
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'transactions': None if args.db else args.transactions, 'cache': not args.no_cache, 'readers': args.readers,
+                       'write_every': args.write_every, 'levels': results}, f, indent=2)
+        print(f"Results written to {args.out}")
+    return 1 if any(r['errors'] for r in results) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
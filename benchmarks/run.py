@@ -0,0 +1,126 @@
+# benchmarks/run.py
+# Runs the benchmark scenarios against a synthetic ledger and compares with a baseline
+# Usage: python -m benchmarks.run --transactions 100000 --repeat 5 --out results.json [--baseline base.json]
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks import synthetic
+from benchmarks.scenarios import SCENARIOS, Context
+
+DEFAULT_THRESHOLD = 0.25 # A scenario regresses when its median is this much slower than the baseline's
+
+def environment_info():
+    """ Machine and library details recorded next to the timings. """
+    info = {'python': platform.python_version(), 'implementation': platform.python_implementation(), 'platform': platform.platform(),
+            'machine': platform.machine(), 'processor': platform.processor(), 'cpu_count': os.cpu_count(), 'sqlite': sqlite3.sqlite_version}
+    for module in ('pandas', 'numpy'):
+        try: info[module] = __import__(module).__version__
+        except ImportError: info[module] = None
+    try: info['git_commit'] = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError): info['git_commit'] = None
+    return info
+
+def time_scenario(name, ctx, repeat, warmup=1):
+    """ Runs one scenario warmup + repeat times. Returns timing stats in seconds. """
+    description, setup, run, teardown = SCENARIOS[name]
+    times = []
+    for i in range(warmup + repeat):
+        state = setup(ctx)
+        try:
+            start = time.perf_counter()
+            run(state)
+            elapsed = time.perf_counter() - start
+        finally:
+            if teardown: teardown(state)
+        if i >= warmup: times.append(elapsed)
+    return {'description': description, 'runs': len(times), 'min': min(times), 'median': statistics.median(times),
+            'mean': statistics.fmean(times), 'max': max(times), 'times': times}
+
+def compare(results, baseline, threshold):
+    """ Returns [(name, baseline_median, median, ratio)] for scenarios slower than baseline by more than threshold. """
+    regressions = []
+    for name, stats in results['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if not base or not base.get('median'): continue
+        ratio = stats['median'] / base['median']
+        if ratio > 1 + threshold: regressions.append((name, base['median'], stats['median'], ratio))
+    return regressions
+
+def print_results(results, baseline=None):
+    print("\n{:<24} | {:>10} | {:>10} | {:>10}".format("Scenario", "Min (ms)", "Median (ms)", "vs Base"))
+    print("-" * 64)
+    for name, stats in results['scenarios'].items():
+        base = (baseline or {}).get('scenarios', {}).get(name)
+        vs = f"{stats['median'] / base['median']:.2f}x" if base and base.get('median') else "-"
+        print("{:<24} | {:>10.2f} | {:>10.2f} | {:>10}".format(name, stats['min'] * 1000, stats['median'] * 1000, vs))
+    print("-" * 64)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run DoDoFin benchmarks against a synthetic ledger.")
+    parser.add_argument('--transactions', type=int, default=100000, help="Ledger size (default: 100000)")
+    parser.add_argument('--categories', type=int, default=40, help="Number of categories (default: 40)")
+    parser.add_argument('--years', type=int, default=3, help="Years of history (default: 3)")
+    parser.add_argument('--debts', type=int, default=5, help="Number of debts (default: 5)")
+    parser.add_argument('--import-rows', type=int, default=10000, help="Rows in the import CSV (default: 10000)")
+    parser.add_argument('--seed', type=int, default=1, help="Generator seed (default: 1)")
+    parser.add_argument('--end-date', type=datetime.date.fromisoformat, default=datetime.date.today(), help="Last ledger date, YYYY-MM-DD (default: today, so current-month reports have data)")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per scenario (default: 5)")
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help="Run only this scenario (repeatable)")
+    parser.add_argument('--work-dir', help="Where to keep the generated ledger and CSV (default: a temp dir)")
+    parser.add_argument('--out', help="Write results JSON here")
+    parser.add_argument('--baseline', help="Results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown vs baseline median (default: 0.25 = 25%%)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='dodofin-bench-')
+    os.makedirs(work_dir, exist_ok=True)
+    params = {'transactions': args.transactions, 'categories': args.categories, 'years': args.years, 'debts': args.debts,
+              'import_rows': args.import_rows, 'seed': args.seed, 'end_date': args.end_date.isoformat()}
+
+    db_file = os.path.join(work_dir, 'ledger.db'); csv_file = os.path.join(work_dir, 'import.csv')
+    print(f"Generating ledger: {args.transactions} transactions in {work_dir}...")
+    start = time.perf_counter()
+    synthetic.generate_ledger(db_file, args.transactions, args.categories, args.years, args.debts, args.seed, end_date=args.end_date)
+    synthetic.write_import_csv(csv_file, args.import_rows, seed=args.seed + 1, end_date=args.end_date)
+    print(f"Generated in {time.perf_counter() - start:.1f}s.")
+
+    ctx = Context(db_file, csv_file, work_dir, args.end_date.year, args.end_date.month)
+    results = {'created': datetime.datetime.now().isoformat(timespec='seconds'), 'environment': environment_info(),
+               'params': params, 'repeat': args.repeat, 'scenarios': {}}
+    for name in args.scenario or SCENARIOS:
+        print(f"Running {name}...")
+        results['scenarios'][name] = time_scenario(name, ctx, args.repeat)
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, encoding='utf-8') as f: baseline = json.load(f)
+        except (OSError, ValueError) as e: print(f"Error reading baseline {args.baseline}: {e}"); return 2
+        if baseline.get('params') != params: print("Warning: baseline was recorded with different ledger parameters.")
+    print_results(results, baseline)
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f: json.dump(results, f, indent=2)
+        print(f"Results written to {args.out}")
+
+    if baseline:
+        regressions = compare(results, baseline, args.threshold)
+        for name, base, now, ratio in regressions:
+            print(f"REGRESSION: {name} median {base * 1000:.2f}ms -> {now * 1000:.2f}ms ({ratio:.2f}x)")
+        if regressions: return 1
+        print(f"No regressions beyond {args.threshold:.0%}.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+# benchmarks/scenarios.py
+# Benchmark scenarios over a synthetic ledger
+# Each scenario is setup(ctx) -> state, run(state) and optional teardown(state);
+# only run() is timed. App functions print a lot, so stdout is discarded while they run.
+
+import contextlib
+import io
+import os
+import shutil
+import db_utils
+import columnar_cache
+from csv_importer import import_csv
+from budget_manager import view_spending_summary, build_spending_report
+from debt_manager import simulate_payoff
+
+class Context:
+    """ Shared inputs for all scenarios: the ledger path, an import CSV and the ledger's last month. """
+    def __init__(self, db_file, csv_file, work_dir, year, month):
+        self.db_file = db_file
+        self.csv_file = csv_file
+        self.work_dir = work_dir
+        self.year = year
+        self.month = month
+
+    def connect(self):
+        return db_utils.create_connection(self.db_file)
+
+def quiet():
+    return contextlib.redirect_stdout(io.StringIO())
+
+def _close(state):
+    conn = state['conn'] if isinstance(state, dict) else state
+    if conn: conn.close()
+
+# --- Import ---
+def _setup_import(ctx):
+    target = os.path.join(ctx.work_dir, 'import_target.db')
+    shutil.copyfile(ctx.db_file, target) # Every run imports into an untouched copy
+    return {'conn': db_utils.create_connection(target), 'csv': ctx.csv_file}
+
+def _run_import(state):
+    with quiet(): return import_csv(state['conn'], state['csv'], backend='pandas')
+
+def _run_import_stream(state):
+    with quiet(): return import_csv(state['conn'], state['csv'], backend='stream')
+
+# --- Reports ---
+def _run_spending_for_month(state):
+    conn, ctx = state
+    return db_utils.get_spending_for_month(conn, ctx.year, ctx.month)
+
+def _run_average_spend(conn):
+    with quiet(): return db_utils.calculate_average_monthly_spend(conn)
+
+def _run_spending_summary(conn):
+    with quiet(): view_spending_summary(conn)
+
+def _run_spending_report(state):
+    conn, ctx = state
+    return build_spending_report(conn, 12, ctx.year, ctx.month)
+
+def _setup_columnar(ctx):
+    columnar_cache.enable()
+    conn, ctx = _setup_with_ctx(ctx)
+    columnar_cache.get_store(conn) # Load the columns outside the timed runs
+    return conn, ctx
+
+def _teardown_columnar(state):
+    columnar_cache.disable()
+    state[0].close()
+
+def _setup_simulation(ctx):
+    conn = ctx.connect()
+    total_min = db_utils.get_total_minimum_debt_payments(conn)
+    return {'conn': conn, 'payment': total_min + 500}
+
+def _run_simulation(state):
+    with quiet(): return simulate_payoff(state['conn'], 'avalanche', state['payment'])
+
+# --- Categorization ---
+def _run_categorization_lookups(conn):
+    """ Walks the whole uncategorized queue by keyset and resolves a category name per page. """
+    after, pages = None, 0
+    while True:
+        rows = db_utils.get_uncategorized_batch(conn, after=after, limit=50)
+        db_utils.find_category_id_by_name(conn, 'Groceries')
+        pages += 1
+        if len(rows) < 50: return pages
+        after = (rows[-1]['transaction_date'], rows[-1]['id'])
+
+# --- Dashboard ---
+def _run_dashboard_cold(ctx):
+    conn = ctx.connect() # New connection each run, so nothing is cached
+    try: return db_utils.get_dashboard_snapshot(conn, ctx.year, ctx.month)
+    finally: conn.close()
+
+def _run_dashboard_cached(state):
+    conn, ctx = state
+    return db_utils.get_dashboard_snapshot(conn, ctx.year, ctx.month)
+
+def _setup_with_ctx(ctx):
+    conn = ctx.connect()
+    db_utils.get_dashboard_snapshot(conn, ctx.year, ctx.month) # Warm the cache for the cached scenario
+    return conn, ctx
+
+# name -> (description, setup, run, teardown)
+SCENARIOS = {
+    'import_csv': ("Import the synthetic CSV into a fresh copy of the ledger", _setup_import, _run_import, _close),
+    'import_csv_stream': ("Same import with the streaming csv-module backend", _setup_import, _run_import_stream, _close),
+    'spending_for_month': ("get_spending_for_month for the ledger's last month", _setup_with_ctx, _run_spending_for_month, lambda s: s[0].close()),
+    'average_monthly_spend': ("calculate_average_monthly_spend over the full history", lambda ctx: ctx.connect(), _run_average_spend, _close),
+    'spending_summary': ("view_spending_summary for the current month", lambda ctx: ctx.connect(), _run_spending_summary, _close),
+    'spending_report_12m': ("12-month category x month spending report", _setup_with_ctx, _run_spending_report, lambda s: s[0].close()),
+    'spending_report_columnar': ("Same report served by the in-memory columnar cache", _setup_columnar, _run_spending_report, _teardown_columnar),
+    'simulate_payoff': ("Avalanche payoff simulation with minimums + $500", _setup_simulation, _run_simulation, _close),
+    'categorization_lookups': ("Page through every uncategorized row by keyset", lambda ctx: ctx.connect(), _run_categorization_lookups, _close),
+    'dashboard_cold': ("Dashboard snapshot on a new connection", lambda ctx: ctx, _run_dashboard_cold, None),
+    'dashboard_cached': ("Dashboard snapshot served from the data_version cache", _setup_with_ctx, _run_dashboard_cached, lambda s: s[0].close()),
+}
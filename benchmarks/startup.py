@@ -0,0 +1,86 @@
+# benchmarks/startup.py
+# Startup-time regression check based on `python -X importtime`
+# Usage: python -m benchmarks.startup [--repeat 5] [--out startup.json] [--baseline startup.json]
+# Fails when an entry point imports a heavy module at load time or misses its import-time target
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry point -> import-time target in milliseconds (cumulative, as reported by -X importtime)
+TARGETS_MS = {'main': 150, 'gui': 250, 'list_transactions': 100}
+# Modules that must only load when the feature that needs them is used
+HEAVY_MODULES = ('pandas', 'numpy', 'dateutil', 'pyarrow')
+DEFAULT_THRESHOLD = 0.25
+
+_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+def measure_import(module):
+    """ Imports module in a fresh interpreter. Returns (cumulative ms, set of top-level packages loaded). """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"], cwd=REPO_DIR, capture_output=True, text=True)
+    if proc.returncode != 0: raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    total_us, loaded = None, set()
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if not m: continue
+        name = m.group(4)
+        loaded.add(name.split('.')[0])
+        if name == module and len(m.group(3)) == 1: total_us = int(m.group(2)) # Top-level line for the module itself
+    return (total_us or 0) / 1000, loaded
+
+def check(modules, repeat):
+    """ Returns {module: {'median_ms', 'min_ms', 'target_ms', 'heavy': [...]}} """
+    results = {}
+    for module in modules:
+        times, heavy = [], set()
+        for _ in range(repeat):
+            ms, loaded = measure_import(module)
+            times.append(ms); heavy |= loaded.intersection(HEAVY_MODULES)
+        results[module] = {'median_ms': statistics.median(times), 'min_ms': min(times), 'target_ms': TARGETS_MS.get(module), 'heavy': sorted(heavy)}
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check DoDoFin entry-point import times.")
+    parser.add_argument('--module', action='append', help="Entry point to check (repeatable; default: all)")
+    parser.add_argument('--repeat', type=int, default=5, help="Fresh interpreters per entry point (default: 5)")
+    parser.add_argument('--out', help="Write results JSON here")
+    parser.add_argument('--baseline', help="Results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown vs baseline median (default: 0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.baseline:
+        try:
+            with open(args.baseline, encoding='utf-8') as f: baseline = json.load(f)
+        except (OSError, ValueError) as e: print(f"Error reading baseline {args.baseline}: {e}"); return 2
+
+    try: results = check(args.module or list(TARGETS_MS), args.repeat)
+    except RuntimeError as e: print(f"Error: {e}"); return 2
+
+    failures = []
+    print("\n{:<20} | {:>10} | {:>10} | {:>10} | {}".format("Entry point", "Median ms", "Target ms", "vs Base", "Heavy imports"))
+    print("-" * 75)
+    for module, r in results.items():
+        base = baseline.get(module, {}).get('median_ms')
+        vs = f"{r['median_ms'] / base:.2f}x" if base else "-"
+        print("{:<20} | {:>10.1f} | {:>10} | {:>10} | {}".format(module, r['median_ms'], r['target_ms'] or "-", vs, ", ".join(r['heavy']) or "none"))
+        if r['heavy']: failures.append(f"{module} imports {', '.join(r['heavy'])} at startup")
+        if r['target_ms'] and r['median_ms'] > r['target_ms']: failures.append(f"{module} took {r['median_ms']:.1f}ms (target {r['target_ms']}ms)")
+        if base and r['median_ms'] > base * (1 + args.threshold): failures.append(f"{module} is {r['median_ms'] / base:.2f}x its baseline")
+    print("-" * 75)
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f: json.dump(results, f, indent=2)
+        print(f"Results written to {args.out}")
+    for failure in failures: print(f"FAIL: {failure}")
+    if not failures: print("Startup checks passed.")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# benchmarks/synthetic.py
+# Deterministic synthetic ledger generator for benchmarks
+# Same seed and sizes always produce the same database and CSV files
+
+import csv
+import datetime
+import io
+import contextlib
+import os
+import random
+import sqlite3
+import database_setup
+
+DEFAULT_END_DATE = datetime.date(2025, 12, 31)
+
+# Merchant templates per category; {n} is a store number, {city} a city/state suffix
+MERCHANTS = {
+    'Groceries': ['KROGER #{n} {city}', 'WHOLEFDS MKT {n} {city}', "TRADER JOE'S #{n} {city}", 'SAFEWAY STORE {n} {city}', 'ALDI {n} {city}'],
+    'Shopping': ['AMAZON MKTPLACE PMTS AMZN.COM/BILL WA', 'TARGET T-{n} {city}', 'WALMART SUPERCENTER #{n} {city}', 'COSTCO WHSE #{n} {city}'],
+    'Restaurants': ['CHIPOTLE {n} {city}', 'OLIVE GARDEN {n} {city}', 'SQ *LOCAL BISTRO {city}', 'TST* THE DINER {n} {city}'],
+    'Fast Food': ["MCDONALD'S F{n} {city}", 'TACO BELL #{n} {city}', 'WENDYS #{n} {city}', 'CHICK-FIL-A #{n} {city}'],
+    'Coffee Shops': ['STARBUCKS STORE {n} {city}', 'DUNKIN #{n} {city}', 'SQ *BLUE BOTTLE {city}'],
+    'Entertainment': ['NETFLIX.COM 866-579-7172 CA', 'AMC {n} ONLINE {city}', 'STEAMGAMES.COM 4259522985 WA', 'TICKETMASTER {city}'],
+    'Rent/Mortgage': ['ACH DEBIT PROPERTY MGMT RENT {n}', 'MORTGAGE SERVICING PMT {n}'],
+    'Utilities': ['CITY WATER UTIL {n} {city}', 'DUKE ENERGY PAYMENT {n}', 'PG&E WEB ONLINE {n}'],
+    'Gas': ['SHELL OIL {n} {city}', 'CHEVRON {n} {city}', 'EXXONMOBIL {n} {city}', 'SPEEDWAY {n} {city}'],
+    'Auto Insurance': ['GEICO *AUTO {n}', 'PROGRESSIVE INS {n}'],
+    'Pharmacy': ['CVS/PHARMACY #{n} {city}', 'WALGREENS #{n} {city}'],
+    'Mobile Phone': ['VERIZON WRLS {n} ONLINE', 'T-MOBILE AUTOPAY {n}'],
+    'Internet': ['COMCAST CABLE COMM {n}', 'SPECTRUM {n} ONLINE'],
+    'Subscriptions': ['SPOTIFY USA {n}', 'APPLE.COM/BILL 866-712-7753 CA', 'HULU {n} HULU.COM CA'],
+    'Gym': ['PLANET FITNESS {n} {city}', 'LA FITNESS {n} {city}'],
+    'Travel': ['DELTA AIR {n} ATLANTA GA', 'MARRIOTT {n} {city}', 'UBER *TRIP {n}', 'LYFT *RIDE {n}'],
+    'Personal Care': ['GREAT CLIPS #{n} {city}', 'ULTA BEAUTY {n} {city}'],
+    'Pets': ['PETSMART #{n} {city}', 'CHEWY.COM {n}'],
+    'Clothing': ['OLD NAVY {n} {city}', 'H&M {n} {city}', 'NORDSTROM RACK {n} {city}'],
+    'Books': ['BARNES & NOBLE #{n} {city}', 'AUDIBLE {n} AMZN.COM/BILL'],
+    'Alcohol & Bars': ['TOTAL WINE {n} {city}', 'SQ *CORNER PUB {city}'],
+    'Home Repair': ['THE HOME DEPOT #{n} {city}', "LOWE'S #{n} {city}"],
+    'Credit Card Payment': ['PAYMENT THANK YOU {n}', 'ONLINE PAYMENT - CARD {n}'],
+    'Transfer': ['ONLINE TRANSFER TO SAV {n}', 'ZELLE TO {n}'],
+}
+INCOME_MERCHANTS = ['PAYROLL DIRECT DEP ACME CORP {n}', 'DIRECT DEPOSIT EMPLOYER {n}', 'MOBILE DEPOSIT REF {n}']
+CITIES = ['SEATTLE WA', 'AUSTIN TX', 'DENVER CO', 'CHICAGO IL', 'BOSTON MA', 'PORTLAND OR', 'ATLANTA GA', 'MIAMI FL']
+# Typical (low, high) expense amount per category
+AMOUNT_RANGES = {'Rent/Mortgage': (1200, 2400), 'Utilities': (40, 220), 'Auto Insurance': (80, 200), 'Travel': (20, 600), 'Home Repair': (10, 500),
+                 'Credit Card Payment': (100, 2000), 'Transfer': (50, 1500), 'Groceries': (15, 250), 'Shopping': (5, 300)}
+
+def _merchant(rng, category):
+    template = rng.choice(MERCHANTS.get(category, ['{category} VENDOR {n} {city}']))
+    return template.format(n=rng.randrange(1, 9999), city=rng.choice(CITIES), category=category.upper())
+
+def _amount(rng, category):
+    low, high = AMOUNT_RANGES.get(category, (3, 120))
+    return round(rng.uniform(low, high), 2)
+
+def generate_rows(n_transactions, categories, years=3, seed=1, end_date=None, uncategorized_share=0.05):
+    """
+    Yields (date_str, description, signed_amount, category_name) tuples in date order.
+    Roughly one in twelve rows is a paycheck. A share of the expenses has an empty
+    category so the categorization paths have work to do.
+    """
+    rng = random.Random(seed)
+    end_date = end_date or DEFAULT_END_DATE
+    start = end_date - datetime.timedelta(days=365 * years)
+    span = (end_date - start).days
+    expense_cats = [c for c in categories if c.lower() not in ('income', 'paycheck', 'uncategorized')]
+    weights = [8 if c in MERCHANTS else 1 for c in expense_cats]
+    days = sorted(rng.randrange(span + 1) for _ in range(n_transactions))
+    for i, day in enumerate(days):
+        date_str = (start + datetime.timedelta(days=day)).strftime('%Y-%m-%d')
+        if rng.random() < 1 / 12:
+            yield date_str, rng.choice(INCOME_MERCHANTS).format(n=i), round(rng.uniform(1500, 3500), 2), 'Paycheck'
+            continue
+        category = rng.choices(expense_cats, weights)[0]
+        name = '' if rng.random() < uncategorized_share else category
+        yield date_str, f"{_merchant(rng, category)} {i:07d}", -_amount(rng, category), name
+
+def category_names(n_categories):
+    """ The default categories, padded with synthetic ones up to n_categories. """
+    defaults = ['Uncategorized', 'Income', 'Paycheck'] + list(MERCHANTS)
+    return (defaults + [f"Custom Category {i}" for i in range(n_categories)])[:max(n_categories, len(defaults))]
+
+def generate_ledger(db_file, n_transactions=100000, n_categories=40, years=3, n_debts=5, seed=1, end_date=None):
+    """ Creates a fresh database at db_file filled with a deterministic synthetic ledger ending on end_date. """
+    if os.path.exists(db_file): os.remove(db_file)
+    with contextlib.redirect_stdout(io.StringIO()): database_setup.setup_database(db_file)
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_file)
+    try:
+        names = category_names(n_categories)
+        conn.executemany("INSERT OR IGNORE INTO categories(name) VALUES (?)", [(n,) for n in names])
+        cat_ids = {name.lower(): cid for cid, name in conn.execute("SELECT id, name FROM categories")}
+        rows = ((d, desc, abs(a), cat_ids.get(c.lower()) if c else None, int(a > 0))
+                for d, desc, a, c in generate_rows(n_transactions, names, years=years, seed=seed, end_date=end_date))
+        conn.executemany("INSERT OR IGNORE INTO transactions (transaction_date, description, amount, category_id, is_income) VALUES (?, ?, ?, ?, ?)", rows)
+        budgetable = [n for n in names if n in MERCHANTS and n not in ('Credit Card Payment', 'Transfer')]
+        conn.executemany("INSERT OR REPLACE INTO budget_simple (category_id, monthly_limit) VALUES (?, ?)",
+                         [(cat_ids[n.lower()], round(rng.uniform(50, 800), 2)) for n in budgetable])
+        debts = []
+        for i in range(n_debts):
+            balance = round(rng.uniform(500, 30000), 2)
+            debts.append((f"Debt {i + 1}", rng.choice(['Bank A', 'Card Co', 'Auto Lender', 'Student Loans']), balance,
+                          round(rng.uniform(2, 28), 2), round(max(25, balance * rng.uniform(0.015, 0.03)), 2), (end_date or DEFAULT_END_DATE).isoformat()))
+        conn.executemany("INSERT INTO debts (name, lender, current_balance, interest_rate, minimum_payment, last_updated) VALUES (?, ?, ?, ?, ?, ?)", debts)
+        conn.commit()
+    finally:
+        conn.close()
+    return db_file
+
+def write_import_csv(csv_path, n_rows=10000, seed=2, years=1, end_date=None):
+    """ Writes a CSV in the importer's format (Date, Description, Amount, Category) with bank-style formatting. """
+    names = category_names(0)
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Date', 'Description', 'Amount', 'Category'])
+        for d, desc, amount, category in generate_rows(n_rows, names, years=years, seed=seed, end_date=end_date):
+            month, day, year = d[5:7], d[8:10], d[0:4]
+            sign = '-' if amount < 0 else ''
+            writer.writerow([f"{month}/{day}/{year}", desc, f"{sign}${abs(amount):,.2f}", category or 'Category Pending'])
+    return csv_path
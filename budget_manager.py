@@ -3,17 +3,23 @@
 # Added view_spending_summary function
 
 import sqlite3 # For exception handling if needed
+import csv
 import datetime
-from dateutil.relativedelta import relativedelta
 from decimal import Decimal, ROUND_HALF_UP
 # Import necessary functions from db_utils
 from db_utils import ( get_budgets, set_budget, remove_budget, get_categories,
                        get_min_monthly_spend, calculate_average_monthly_spend,
-                       get_spending_for_month #<-- Import needed for summary
+                       AVERAGE_ESTIMATORS, DEFAULT_AVERAGE_MONTHS,
+                       get_spending_for_month, #<-- Import needed for summary
+                       get_spending_matrix, CATEGORY_FLAGS, set_category_flag
                      )
-from utils import get_string_input, get_decimal_input
+from utils import get_string_input, get_decimal_input, parse_month
+from forecasting import forecast_month
+from profiling import timed
 
 ZERO_THRESHOLD = Decimal('0.005') # Define threshold if not globally available
+# Discretionary categories the minimum-spend auto-budget applies to
+MINIMUM_BUDGET_CATEGORIES = ['Entertainment', 'Fast Food', 'Restaurants', 'Shopping', 'Coffee Shops', 'Alcohol & Bars', 'Books', 'Clothing']
 
 # --- Budget Management Menu ---
 def manage_budget_menu(conn):
@@ -39,7 +45,7 @@ def manage_budget_menu(conn):
         if choice == 'b':
             break
         elif choice == 's':
-            cats_to_budget_rows = [c for c in all_cats if c['name'].lower() not in ('income','transfer','credit card payment','paycheck','uncategorized','returned purchase','gifts & donations','atm fee')]
+            cats_to_budget_rows = [c for c in all_cats if c['budgetable'] and not c['exclude_spending']]
             if not cats_to_budget_rows:
                 print("No categories available for budgeting.")
                 continue
@@ -94,11 +100,44 @@ def manage_budget_menu(conn):
         else:
             print("Invalid choice.")
 
+# --- Category Settings Menu ---
+def manage_category_flags_menu(conn):
+    """ UI for toggling the category attributes that decide what counts as spending, income and budgetable. """
+    flags = list(CATEGORY_FLAGS)
+    while True:
+        print("\n--- Category Settings ---")
+        print("Flags: " + "  ".join(f"{i}={CATEGORY_FLAGS[f]}" for i, f in enumerate(flags, 1)))
+        cats = get_categories(conn)
+        for i, c in enumerate(cats, 1):
+            on = [str(j) for j, f in enumerate(flags, 1) if c[f]]
+            print(f"  {i:>3}: {c['name']:<28} [{','.join(on) or '-'}]")
+        choice = input("\nCategory number to edit (b to go back): ").strip().lower()
+        if choice == 'b': break
+        if not choice.isdigit() or not 1 <= int(choice) <= len(cats): print("Invalid category number."); continue
+        cat = cats[int(choice) - 1]
+        flag_s = input(f"Flag number to toggle for '{cat['name']}': ").strip()
+        if not flag_s.isdigit() or not 1 <= int(flag_s) <= len(flags): print("Invalid flag number."); continue
+        flag = flags[int(flag_s) - 1]
+        if set_category_flag(conn, cat['id'], flag, not cat[flag]):
+            print(f"'{cat['name']}': {CATEGORY_FLAGS[flag]} is now {'on' if not cat[flag] else 'off'}.")
+
 # --- Auto-Budget Wrappers ---
+@timed
 def set_budgets_from_averages_wrapper(conn):
     """ Wrapper to confirm and call set_budgets_from_averages logic using db_utils function. """
     if input("This will overwrite existing budgets with calculated averages. Continue? (y/n): ").lower() == 'y':
-        avgs = calculate_average_monthly_spend(conn) # From db_utils
+        names = list(AVERAGE_ESTIMATORS)
+        print("\nHow should the average be calculated?")
+        for i, name in enumerate(names, 1): print(f"{i}: {AVERAGE_ESTIMATORS[name]}")
+        choice = input(f"Choose estimator (1-{len(names)}, default 1): ").strip() or '1'
+        if not choice.isdigit() or not 1 <= int(choice) <= len(names): print("Invalid choice."); return
+        estimator, months = names[int(choice) - 1], DEFAULT_AVERAGE_MONTHS
+        if estimator != 'all':
+            months_s = input(f"Months of history to use (default {DEFAULT_AVERAGE_MONTHS}): ").strip()
+            if months_s:
+                if not months_s.isdigit() or int(months_s) < 1: print("Invalid number of months."); return
+                months = int(months_s)
+        avgs = calculate_average_monthly_spend(conn, estimator, months) # From db_utils
         if avgs is None: print("Cannot set budgets from averages (calculation failed)."); return
         if not avgs: print("No average spending data found to set budgets."); return
         print("\nSetting budgets based on averages..."); count = 0
@@ -107,9 +146,10 @@ def set_budgets_from_averages_wrapper(conn):
         print(f"\n--- Auto-Budget Complete: Set/updated {count} limits based on averages. ---")
     else: print("Cancelled.")
 
+@timed
 def set_budgets_to_minimums_wrapper(conn):
     """ Wrapper to confirm and call set_budgets_to_minimums logic using db_utils function. """
-    target_cats = ['Entertainment', 'Fast Food', 'Restaurants', 'Shopping', 'Coffee Shops', 'Alcohol & Bars', 'Books', 'Clothing']
+    target_cats = MINIMUM_BUDGET_CATEGORIES
     print("\nSet budgets for minimum spend in: " + ", ".join(target_cats))
     if input("Are you sure? This might be very strict. (y/n): ").lower() == 'y':
         print("\nSetting budgets to minimum historical monthly spend...")
@@ -131,6 +171,7 @@ def set_budgets_to_minimums_wrapper(conn):
     else: print("Cancelled.")
 
 # --- NEW: Spending Summary Function ---
+@timed
 def view_spending_summary(conn):
     """ Displays spending vs budget summary for the current month. """
     today = datetime.date.today()
@@ -142,17 +183,18 @@ def view_spending_summary(conn):
     budgets_list = get_budgets(conn) # Returns list of dicts with Decimals
     budgets = {b['id']: b['monthly_limit'] for b in budgets_list} # Convert to dict {id: Decimal}
 
-    # Define excluded categories for summary view consistency
-    exclude = ('transfer','credit card payment','income','uncategorized','paycheck','returned purchase','gifts & donations','atm fee')
+    # Only budgetable spending categories are listed (same rule as the budget menu)
     all_cats_rows = get_categories(conn) # List of Row objects
-    all_cats = {c['id']: c['name'] for c in all_cats_rows if c['name'].lower() not in exclude}
+    all_cats = {c['id']: c['name'] for c in all_cats_rows if c['budgetable'] and not c['exclude_spending']}
+
+    forecast = forecast_month(conn, as_of=today) or {} # End-of-month projection from the learned daily curves, over month-to-date report spending
 
-    print("\n{:<25} | {:>12} | {:>12} | {:>15}".format("Category", "Spent", "Budget", "Remaining/Over"))
-    print("-" * 70)
+    print("\n{:<25} | {:>12} | {:>12} | {:>15} | {:>12} | {:>6}".format("Category", "Spent", "Budget", "Remaining/Over", "Projected", "Over %"))
+    print("-" * 95)
 
     # Combine keys from spending and budgets, filtering by allowed categories
     relevant_category_ids = (set(spending.keys()) | set(budgets.keys())) & set(all_cats.keys())
-    total_s, total_b, over_c = Decimal('0.00'), Decimal('0.00'), 0
+    total_s, total_b, total_p, over_c, likely_c = Decimal('0.00'), Decimal('0.00'), Decimal('0.00'), 0, 0
     # Sort by category name for consistent display
     sorted_ids = sorted(list(relevant_category_ids), key=lambda i: all_cats.get(i, "ZZZ")) # Use ZZZ to put missing names last
 
@@ -174,14 +216,108 @@ def view_spending_summary(conn):
         else:
             rem_s, bud_s = "N/A", "N/A" # No budget set
 
+        f = forecast.get(cid)
+        proj = f['projected'] if f else spent; total_p += proj
+        p_s = f"{f['p_over']:.0%}" if f and f['p_over'] is not None else "-"
+        likely_c += bool(f and budget is not None and spent <= budget and (f['p_over'] or 0) >= 0.5)
+
         # Print formatted line
-        print("{:<25} | ${:>11.2f} | {:>12} | {:>15}".format(name, spent, bud_s, rem_s))
+        print("{:<25} | ${:>11.2f} | {:>12} | {:>15} | ${:>11.2f} | {:>6}".format(name, spent, bud_s, rem_s, proj, p_s))
 
     # Print Totals
-    print("-" * 70)
+    print("-" * 95)
     rem_o = total_b - total_s
     rem_o_s = f"${rem_o:.2f}" if rem_o >= 0 else f"(${abs(rem_o):.2f})"
-    print("{:<25} | ${:>11.2f} | ${:>11.2f} | {:>15}".format("OVERALL TOTALS", total_s, total_b, rem_o_s))
-    print("-" * 70)
+    print("{:<25} | ${:>11.2f} | ${:>11.2f} | {:>15} | ${:>11.2f} | {:>6}".format("OVERALL TOTALS", total_s, total_b, rem_o_s, total_p, ""))
+    print("-" * 95)
     if over_c > 0:
-        print(f"Attention: Over budget in {over_c} categories.")
\ No newline at end of file
+        print(f"Attention: Over budget in {over_c} categories.")
+    if likely_c > 0:
+        print(f"Heads up: {likely_c} more categories are likely to go over budget by month end.")
+    from analytics import get_anomalies, format_anomaly, DEFAULT_WINDOW # Loads NumPy on first use
+    anomalies = get_anomalies(conn)
+    if anomalies:
+        print(f"\nUnusual spending (well above the previous {DEFAULT_WINDOW['month']} months):")
+        for a in anomalies: print(f"  - {format_anomaly(a)}")
+
+# --- Multi-Month Spending Report ---
+def _money(value):
+    """ $1.00 / ($1.00) formatting used by the summary tables. """
+    return f"${value:.2f}" if value >= 0 else f"(${abs(value):.2f})"
+
+@timed
+def build_spending_report(conn, months=12, end_year=None, end_month=None):
+    """
+    Category x month spending matrix with per-category total, average and
+    budget variance (budget - average; negative means over budget).
+    Returns a dict, or None if the data could not be loaded.
+    """
+    matrix = get_spending_matrix(conn, months, end_year, end_month)
+    if matrix is None: return None
+    budgets = {b['id']: b['monthly_limit'] for b in get_budgets(conn)}
+    names = {c['id']: c['name'] for c in get_categories(conn)}
+    n = Decimal(len(matrix['months']))
+    rows = []
+    for cid in set(matrix['totals']) | (set(budgets) & set(names)):
+        monthly = matrix['totals'].get(cid, [Decimal('0.00')] * len(matrix['months']))
+        total = sum(monthly, Decimal('0.00'))
+        average = (total / n).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        budget = budgets.get(cid)
+        rows.append({'category_id': cid, 'name': names.get(cid, f"ID {cid}"), 'monthly': monthly, 'total': total, 'average': average,
+                     'budget': budget, 'variance': budget - average if budget is not None else None})
+    rows.sort(key=lambda r: r['name'].lower())
+    column_totals = [sum((r['monthly'][i] for r in rows), Decimal('0.00')) for i in range(len(matrix['months']))]
+    grand_total = sum(column_totals, Decimal('0.00'))
+    budget_total = sum((r['budget'] for r in rows if r['budget'] is not None), Decimal('0.00'))
+    grand_average = (grand_total / n).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    return {'months': matrix['months'], 'rows': rows, 'column_totals': column_totals, 'grand_total': grand_total,
+            'grand_average': grand_average, 'budget_total': budget_total, 'variance_total': budget_total - grand_average}
+
+def print_spending_report(report):
+    """ Prints the report as a table: one row per category, one column per month. """
+    labels = [datetime.date(int(m[:4]), int(m[5:]), 1).strftime('%b %y') for m in report['months']]
+    fmt = "{:<22} | " + " | ".join(["{:>9}"] * len(labels)) + " | {:>11} | {:>10} | {:>10} | {:>11}"
+    header = fmt.format("Category", *labels, "Total", "Avg", "Budget", "Avg vs Bud.")
+    print(f"\n--- Spending Report: {labels[0]} - {labels[-1]} ---")
+    print(header); print("-" * len(header))
+    for r in report['rows']:
+        print(fmt.format(r['name'][:22], *(f"{v:.2f}" for v in r['monthly']), f"{r['total']:.2f}", f"{r['average']:.2f}",
+                         f"{r['budget']:.2f}" if r['budget'] is not None else "N/A", _money(r['variance']) if r['variance'] is not None else "N/A"))
+    print("-" * len(header))
+    print(fmt.format("TOTALS", *(f"{v:.2f}" for v in report['column_totals']), f"{report['grand_total']:.2f}", f"{report['grand_average']:.2f}",
+                     f"{report['budget_total']:.2f}", _money(report['variance_total'])))
+    print("-" * len(header))
+    over = [r['name'] for r in report['rows'] if r['variance'] is not None and r['variance'] < 0]
+    if over: print(f"Average over budget in {len(over)} categories: {', '.join(over)}")
+
+def export_spending_report_csv(report, csv_path):
+    """ Writes the report to csv_path (one row per category plus a totals row). Returns True on success. """
+    try:
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Category', *report['months'], 'Total', 'Average', 'Budget', 'Budget Variance'])
+            for r in report['rows']:
+                writer.writerow([r['name'], *r['monthly'], r['total'], r['average'], '' if r['budget'] is None else r['budget'], '' if r['variance'] is None else r['variance']])
+            writer.writerow(['TOTALS', *report['column_totals'], report['grand_total'], report['grand_average'], report['budget_total'], report['variance_total']])
+        return True
+    except OSError as e:
+        print(f"Error writing report to {csv_path}: {e}")
+        return False
+
+def view_spending_report(conn):
+    """ UI for the multi-month report: pick a range, print it, optionally export to CSV. """
+    today = datetime.date.today()
+    months_str = input("Number of months (Enter for 12): ").strip()
+    end_str = input(f"Last month YYYY-MM (Enter for {today.strftime('%Y-%m')}): ").strip()
+    try:
+        months = int(months_str) if months_str else 12
+        if months < 1: raise ValueError
+        end_year, end_month = parse_month(end_str) if end_str else (today.year, today.month)
+    except ValueError:
+        print("Invalid months or date."); return
+    report = build_spending_report(conn, months, end_year, end_month)
+    if report is None: print("Could not build the report."); return
+    if not report['rows']: print("No spending or budgets in that range."); return
+    print_spending_report(report)
+    path = input("\nExport to CSV file (Enter to skip): ").strip()
+    if path and export_spending_report_csv(report, path): print(f"Report written to {path}.")
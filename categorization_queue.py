@@ -0,0 +1,63 @@
+# categorization_queue.py
+# Prefetching queue over uncategorized transactions
+# Walks rows with a keyset cursor and writes assignments back in batches
+
+from collections import deque
+from db_utils import get_uncategorized_batch, update_transaction_categories, record_points_events
+
+DEFAULT_BATCH_SIZE = 50
+
+class UncategorizedQueue:
+    """
+    Serves uncategorized transactions oldest first, fetching them in batches of
+    `batch_size` by keyset (transaction_date, id) instead of re-querying per row.
+    Skips are kept in memory and never re-queried. Assignments are buffered and
+    written, together with their points, in one transaction per batch.
+    """
+    def __init__(self, conn, batch_size=DEFAULT_BATCH_SIZE, points_per_assignment=1):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.points_per_assignment = points_per_assignment
+        self.buffer = deque()
+        self.last_key = None
+        self.exhausted = False
+        self.skipped_ids = set()
+        self.pending = {} # transaction id -> category id
+        self.assigned_count = 0
+
+    def _prefetch(self):
+        rows = get_uncategorized_batch(self.conn, after=self.last_key, limit=self.batch_size)
+        if len(rows) < self.batch_size: self.exhausted = True
+        if rows: self.last_key = (rows[-1]['transaction_date'], rows[-1]['id'])
+        self.buffer.extend(r for r in rows if r['id'] not in self.pending and r['id'] not in self.skipped_ids)
+
+    def next(self):
+        """ Returns the next transaction Row to categorize, or None when the queue is empty. """
+        while not self.buffer and not self.exhausted: self._prefetch()
+        return self.buffer.popleft() if self.buffer else None
+
+    def assign(self, tx, category_id):
+        """ Buffers an assignment; a full batch is flushed immediately. """
+        self.pending[tx['id']] = category_id
+        if len(self.pending) >= self.batch_size: return self.flush()
+        return True
+
+    def skip(self, tx):
+        self.skipped_ids.add(tx['id'])
+
+    def flush(self):
+        """ Writes buffered assignments and their points in one transaction. Returns success. """
+        if not self.pending: return True
+        try:
+            updated = update_transaction_categories(self.conn, self.pending.items(), commit=False)
+            if updated is None: return False
+            if self.points_per_assignment and not record_points_events(self.conn, [('categorize', self.points_per_assignment, tx_id) for tx_id in self.pending], commit=False):
+                self.conn.rollback(); return False
+            self.conn.commit()
+        except Exception as e:
+            print(f"Error saving categorizations: {e}")
+            self.conn.rollback()
+            return False
+        self.assigned_count += updated
+        self.pending.clear()
+        return True
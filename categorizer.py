@@ -2,14 +2,19 @@
 # Handles the manual transaction categorization workflow
 
 import sqlite3 # Needed only for exception type hinting if desired
-from db_utils import get_categories, add_category, update_transaction_category, add_gamification_points, get_gamification_points
+from db_utils import get_categories, add_category, get_gamification_points
+from categorization_queue import UncategorizedQueue, DEFAULT_BATCH_SIZE
 
-def categorize_transactions(conn):
-    """ Guides the user through categorizing uncategorized transactions. """
+def categorize_transactions(conn, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Guides the user through categorizing uncategorized transactions. Assignments are
+    collected by an UncategorizedQueue and saved with their points in one transaction
+    per batch, and again on quit or when the list runs out.
+    """
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT id, transaction_date, description, amount, is_income FROM transactions WHERE category_id IS NULL ORDER BY transaction_date")
-        uncat = cursor.fetchall()
+        cursor.execute("SELECT COUNT(*) FROM transactions WHERE category_id IS NULL")
+        total = cursor.fetchone()[0]
     except sqlite3.Error as e:
         print(f"DB Error fetching uncategorized transactions: {e}")
         cursor.close()
@@ -17,16 +22,18 @@ def categorize_transactions(conn):
     # Close cursor after fetch before starting loop
     cursor.close()
 
-    if not uncat:
+    if not total:
         print("\n🎉 No transactions waiting to be categorized.")
         return
 
-    print(f"\nFound {len(uncat)} transactions to categorize.")
-    cat_c, pts_e = 0, 0
+    print(f"\nFound {total} transactions to categorize.")
+    queue = UncategorizedQueue(conn, batch_size=batch_size)
     categories = get_categories(conn) # Fetch initial list
+    i = 0
 
-    for i, tx in enumerate(uncat):
-        print(f"\n--- Tx {i+1}/{len(uncat)} ---")
+    while (tx := queue.next()) is not None:
+        i += 1
+        print(f"\n--- Tx {i}/{total} ---")
         tx_type = "Income" if tx['is_income'] else "Expense"
         print(f"Date: {tx['transaction_date']}, Desc: {tx['description']}, Amt: ${tx['amount']:.2f} ({tx_type})")
         print("--- Categories ---")
@@ -38,21 +45,19 @@ def categorize_transactions(conn):
             choice = input("Choice: ").strip().lower()
             if choice == 'q':
                 print("Quitting categorization.")
-                conn.commit() # Save any progress made
+                _finish(conn, queue, total) # Save any progress made
                 return # Exit function
             if choice == 's':
                 print("Skipping.")
+                queue.skip(tx)
                 break # Exit inner loop, go to next transaction
             if choice == 'a':
                 n_cat = input("New category name: ").strip()
                 if n_cat:
                     n_id = add_category(conn, n_cat) # Handles commit/cursor
-                    if n_id and update_transaction_category(conn, tx['id'], n_id): # Handles commit/cursor
+                    if n_id and queue.assign(tx, n_id): # Saved with its point when the batch is flushed
                         print(f"Categorized as '{n_cat}'.")
                         categories = get_categories(conn) # Refresh list
-                        cat_c += 1
-                        add_gamification_points(conn, 1) # Handles commit/cursor
-                        pts_e += 1
                         break # Exit inner loop
                     else:
                         print("Failed to add category or update transaction.")
@@ -63,11 +68,8 @@ def categorize_transactions(conn):
                     choice_idx = int(choice) - 1
                     if 0 <= choice_idx < len(categories):
                         category_to_assign = categories[choice_idx]
-                        if update_transaction_category(conn, tx['id'], category_to_assign['id']): # Handles commit/cursor
+                        if queue.assign(tx, category_to_assign['id']): # Saved with its point when the batch is flushed
                             print(f"Categorized as '{category_to_assign['name']}'.")
-                            cat_c += 1
-                            add_gamification_points(conn, 1) # Handles commit/cursor
-                            pts_e += 1
                             break
                         else:
                             print("Failed to update transaction category.")
@@ -76,9 +78,15 @@ def categorize_transactions(conn):
                 except ValueError:
                     print("Invalid input. Please enter a number, 'a', 's', or 'q'.")
     # After loop
-    conn.commit() # Final commit (though most ops commit themselves now)
+    _finish(conn, queue, total)
+
+def _finish(conn, queue, total):
+    """ Writes the assignments still buffered and prints the summary. """
+    if not queue.flush():
+        print(f"Failed to save the last {len(queue.pending)} categorizations.")
+    cat_c = queue.assigned_count
     print("\n--- Categorization Summary ---")
-    print(f"Categorized: {cat_c}, Points earned: {pts_e}, Total points: {get_gamification_points(conn)}")
-    rem = len(uncat) - cat_c
+    print(f"Categorized: {cat_c}, Points earned: {cat_c * queue.points_per_assignment}, Total points: {get_gamification_points(conn)}")
+    rem = total - cat_c
     if rem > 0:
         print(f"{rem} transactions still need categorization.")
\ No newline at end of file
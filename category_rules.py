@@ -0,0 +1,89 @@
+# category_rules.py
+# Non-interactive categorization of uncategorized transactions
+# Explicit rules (description contains a pattern) win; otherwise a description whose
+# normalized form was consistently given one category before gets that category again
+
+import sqlite3
+from db_utils import update_transaction_categories
+from duplicates import normalize_description
+from profiling import timed
+
+HISTORY_MIN_COUNT = 2     # Past categorized transactions needed before history is trusted
+HISTORY_MIN_SHARE = 0.8   # Share of those that must agree on one category
+
+def get_rules(conn):
+    """ Rules with their category names, longest pattern first (the order they are applied in). """
+    cursor = conn.cursor(); rules = []
+    try:
+        cursor.execute("""
+            SELECT r.id, r.pattern, r.category_id, c.name AS category FROM category_rules r JOIN categories c ON c.id = r.category_id
+            ORDER BY length(r.pattern) DESC, r.id;
+        """)
+        rules = cursor.fetchall()
+    except sqlite3.Error as e: print(f"DB error fetching category rules: {e}")
+    finally:
+        if cursor: cursor.close()
+    return rules
+
+def add_rule(conn, pattern, category_id, commit=True):
+    """ Adds or re-targets the rule for pattern. Returns the rule ID, or None on error. """
+    pattern = (pattern or '').strip()
+    if not pattern: print("Rule pattern cannot be empty."); return None
+    cursor = conn.cursor(); rule_id = None
+    try:
+        cursor.execute("INSERT INTO category_rules (pattern, category_id) VALUES (?, ?) ON CONFLICT(pattern) DO UPDATE SET category_id = excluded.category_id", (pattern, category_id))
+        cursor.execute("SELECT id FROM category_rules WHERE pattern = ?", (pattern,)); rule_id = cursor.fetchone()[0]
+        if commit: conn.commit()
+    except sqlite3.Error as e: print(f"DB error adding rule '{pattern}': {e}")
+    finally:
+        if cursor: cursor.close()
+    return rule_id
+
+def remove_rule(conn, rule_id):
+    """ Deletes a rule. Returns success. """
+    cursor = conn.cursor(); success = False
+    try: cursor.execute("DELETE FROM category_rules WHERE id = ?", (rule_id,)); conn.commit(); success = cursor.rowcount > 0
+    except sqlite3.Error as e: print(f"DB error removing rule {rule_id}: {e}")
+    finally:
+        if cursor: cursor.close()
+    return success
+
+def _history_map(cursor, min_count, min_share):
+    """ {normalized description: category_id} where categorized history agrees strongly enough. """
+    cursor.execute("SELECT description, category_id, COUNT(*) AS n FROM transactions WHERE category_id IS NOT NULL GROUP BY description, category_id")
+    counts = {}
+    for r in cursor.fetchall():
+        key = normalize_description(r['description'])
+        if key: by_cat = counts.setdefault(key, {}); by_cat[r['category_id']] = by_cat.get(r['category_id'], 0) + r['n']
+    learned = {}
+    for key, by_cat in counts.items():
+        total = sum(by_cat.values()); cid, n = max(by_cat.items(), key=lambda kv: kv[1])
+        if total >= min_count and n / total >= min_share: learned[key] = cid
+    return learned
+
+@timed
+def apply_rules(conn, use_history=True, dry_run=False, commit=True, min_count=HISTORY_MIN_COUNT, min_share=HISTORY_MIN_SHARE):
+    """
+    Categorizes uncategorized transactions by rules, then by history. All updates are written with
+    one executemany (committed unless commit=False or dry_run). Auto-assignments earn no points.
+    Returns {'checked', 'by_rule', 'by_history', 'assignments': [(transaction_id, category_id)]}, or None on error.
+    """
+    rules = [(r['pattern'].upper(), r['category_id']) for r in get_rules(conn)]
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id, description FROM transactions WHERE category_id IS NULL")
+        uncategorized = cursor.fetchall()
+        learned = _history_map(cursor, min_count, min_share) if use_history and uncategorized else {}
+    except sqlite3.Error as e: print(f"DB error reading transactions for rules: {e}"); return None
+    finally:
+        if cursor: cursor.close()
+    assignments = []; by_rule = 0
+    for tx in uncategorized:
+        desc = (tx['description'] or '').upper()
+        cid = next((c for pattern, c in rules if pattern in desc), None)
+        if cid is not None: by_rule += 1
+        else: cid = learned.get(normalize_description(desc))
+        if cid is not None: assignments.append((tx['id'], cid))
+    if assignments and not dry_run:
+        if update_transaction_categories(conn, assignments, commit=commit) is None: return None
+    return {'checked': len(uncategorized), 'by_rule': by_rule, 'by_history': len(assignments) - by_rule, 'assignments': assignments}
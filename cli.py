@@ -0,0 +1,205 @@
+# cli.py
+# Non-interactive command line for scripts and nightly jobs
+# One tuned connection per run; each command's writes commit together; library chatter goes
+# to stderr so stdout carries only the result (--json for machine-readable output)
+# Usage: python cli.py [--ledger NAME | --db FILE] [--json] COMMAND ...
+#   import PATH... [--backend stream|pandas] [--apply-rules]
+#   apply-rules [--no-history] [--dry-run]      rules | add-rule PATTERN CATEGORY [--create] | remove-rule ID
+#   summary [--month YYYY-MM]                   autobudget --strategy NAME [--months N] [--dry-run]
+#   simulate --strategy avalanche|snowball --payment AMOUNT [--schedule]
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import sqlite3
+import sys
+from decimal import Decimal, InvalidOperation
+import db_utils
+import profiling
+import columnar_cache
+from database_setup import ensure_schema
+from ledgers import add_source_arguments, resolve_db_file
+from utils import json_default, parse_month
+
+# Exit codes
+EXIT_OK, EXIT_ERROR, EXIT_USAGE, EXIT_PARTIAL = 0, 1, 2, 3 # Partial: some files failed or rows were skipped
+
+class CliError(Exception):
+    def __init__(self, message, code=EXIT_ERROR):
+        super().__init__(message); self.code = code
+
+def _month_arg(value):
+    try: return parse_month(value)
+    except ValueError: raise argparse.ArgumentTypeError("expected YYYY-MM")
+
+def _money_arg(value):
+    try: amount = Decimal(value)
+    except InvalidOperation: raise argparse.ArgumentTypeError("expected an amount")
+    if not amount.is_finite() or amount <= 0: raise argparse.ArgumentTypeError("expected a positive amount")
+    return amount
+
+def _find_category(conn, name, create=False):
+    cid = db_utils.find_category_id_by_name(conn, name)
+    if cid is None and create: cid = db_utils.add_category(conn, name, commit=False)
+    if cid is None: raise CliError(f"No category named '{name}' (use --create to add it).", EXIT_USAGE)
+    return cid
+
+# --- Commands: (conn, args) -> (result dict, exit code, human-readable lines) ---
+def cmd_import(conn, args):
+    from csv_importer import import_csv, default_backend, DatabaseBusyError
+    backend = args.backend or default_backend(conn); files = []
+    for path in args.paths:
+        if not os.path.isfile(path): files.append({'path': path, 'ok': False, 'error': 'not found', 'imported': 0, 'skipped': 0}); continue
+        try: outcome = import_csv(conn, path, backend=backend) # Each file commits once, as a whole
+        except DatabaseBusyError: files.append({'path': path, 'ok': False, 'error': 'database locked', 'imported': 0, 'skipped': 0}); continue
+        if outcome is None: files.append({'path': path, 'ok': False, 'error': 'import failed', 'imported': 0, 'skipped': 0}); continue
+        imported, updated, skipped = outcome
+        files.append({'path': path, 'ok': imported + updated > 0 or skipped == 0, 'imported': imported + updated, 'skipped': skipped})
+    result = {'backend': backend, 'files': files}
+    if args.apply_rules: result['rules'] = _apply(conn, use_history=True, dry_run=False)
+    failed = sum(not f['ok'] for f in files)
+    code = EXIT_ERROR if failed == len(files) else EXIT_PARTIAL if failed or any(f['skipped'] for f in files) else EXIT_OK
+    lines = [f"{f['path']}: " + (f"{f['imported']} imported, {f['skipped']} skipped" if f['ok'] else f"FAILED ({f.get('error', 'see log')})") for f in files]
+    if 'rules' in result: lines.append(f"Rules categorized {result['rules']['by_rule'] + result['rules']['by_history']} transactions.")
+    return result, code, lines
+
+def _apply(conn, use_history, dry_run):
+    from category_rules import apply_rules
+    outcome = apply_rules(conn, use_history=use_history, dry_run=dry_run)
+    if outcome is None: raise CliError("Applying rules failed.")
+    return {k: outcome[k] for k in ('checked', 'by_rule', 'by_history')}
+
+def cmd_apply_rules(conn, args):
+    r = _apply(conn, use_history=not args.no_history, dry_run=args.dry_run)
+    verb = "Would categorize" if args.dry_run else "Categorized"
+    return {**r, 'dry_run': args.dry_run}, EXIT_OK, [f"{verb} {r['by_rule'] + r['by_history']} of {r['checked']} uncategorized transactions ({r['by_rule']} by rule, {r['by_history']} by history)."]
+
+def cmd_rules(conn, args):
+    from category_rules import get_rules
+    rules = [{'id': r['id'], 'pattern': r['pattern'], 'category_id': r['category_id'], 'category': r['category']} for r in get_rules(conn)]
+    return {'rules': rules}, EXIT_OK, [f"{r['id']:>4}: '{r['pattern']}' -> {r['category']}" for r in rules] or ["No rules."]
+
+def cmd_add_rule(conn, args):
+    from category_rules import add_rule
+    cid = _find_category(conn, args.category, args.create)
+    rule_id = add_rule(conn, args.pattern, cid, commit=False)
+    if rule_id is None: raise CliError("Could not add rule.")
+    return {'id': rule_id, 'pattern': args.pattern.strip(), 'category_id': cid}, EXIT_OK, [f"Rule {rule_id}: '{args.pattern.strip()}' -> {args.category}"]
+
+def cmd_remove_rule(conn, args):
+    from category_rules import remove_rule
+    if not remove_rule(conn, args.id): raise CliError(f"No rule {args.id}.")
+    return {'removed': args.id}, EXIT_OK, [f"Rule {args.id} removed."]
+
+def cmd_summary(conn, args):
+    today = datetime.date.today()
+    year, month = args.month or (today.year, today.month)
+    snapshot = db_utils.get_dashboard_snapshot(conn, year, month)
+    if snapshot is None: raise CliError("Could not compute the summary.")
+    names = {c['id']: c['name'] for c in db_utils.get_categories(conn)}
+    budgets = {b['id']: b['monthly_limit'] for b in db_utils.get_budgets(conn)}
+    spending = db_utils.get_spending_for_month(conn, year, month)
+    forecast = {}
+    if (year, month) == (today.year, today.month): # Projections only make sense for the month in progress
+        from forecasting import forecast_month
+        forecast = forecast_month(conn, today) or {}
+    categories = []
+    for cid in sorted(set(spending) | set(budgets), key=lambda c: -spending.get(c, 0)):
+        row = {'category_id': cid, 'category': names.get(cid), 'spent': spending.get(cid, Decimal('0.00')), 'budget': budgets.get(cid)}
+        if cid in forecast: row['projected'] = forecast[cid]['projected']; row['p_over'] = forecast[cid]['p_over']
+        categories.append(row)
+    result = {**snapshot, 'categories': categories}
+    lines = [f"{year:04d}-{month:02d}: income {snapshot['income']:,.2f}, spending {snapshot['spending']:,.2f}, cash flow {snapshot['cash_flow']:,.2f}",
+             f"{'Category':<25} {'Spent':>10} {'Budget':>10} {'Projected':>10}"]
+    for r in categories:
+        budget, projected = (f"{v:,.2f}" if v is not None else '-' for v in (r['budget'], r.get('projected')))
+        lines.append(f"{(r['category'] or '?')[:25]:<25} {r['spent']:>10,.2f} {budget:>10} {projected:>10}")
+    return result, EXIT_OK, lines
+
+def cmd_autobudget(conn, args):
+    limits = {}
+    if args.strategy == 'minimum':
+        from budget_manager import MINIMUM_BUDGET_CATEGORIES
+        cats = {c['name'].lower(): c['id'] for c in db_utils.get_categories(conn)}
+        for name in MINIMUM_BUDGET_CATEGORIES:
+            cid = cats.get(name.lower())
+            if cid is None: continue
+            minimum = db_utils.get_min_monthly_spend(conn, cid)
+            if minimum: limits[cid] = minimum
+    else:
+        limits = db_utils.calculate_average_monthly_spend(conn, args.strategy, args.months)
+        if limits is None: raise CliError("Average calculation failed.")
+    if not limits: raise CliError("No spending history to budget from.")
+    if not args.dry_run:
+        if not all(db_utils.set_budget(conn, cid, limit, commit=False) for cid, limit in limits.items()): raise CliError("Saving budgets failed; nothing was changed.")
+    names = {c['id']: c['name'] for c in db_utils.get_categories(conn)}
+    budgets = [{'category_id': cid, 'category': names.get(cid), 'monthly_limit': limit} for cid, limit in sorted(limits.items(), key=lambda kv: names.get(kv[0], ''))]
+    verb = "Would set" if args.dry_run else "Set"
+    return {'strategy': args.strategy, 'dry_run': args.dry_run, 'budgets': budgets}, EXIT_OK, [f"{verb} {len(budgets)} budgets ({args.strategy}):"] + [f"  {b['category']}: {b['monthly_limit']:,.2f}" for b in budgets]
+
+def cmd_simulate(conn, args):
+    from debt_manager import simulate_payoff
+    schedule, stats = simulate_payoff(conn, args.strategy, args.payment)
+    if schedule is None: raise CliError("Simulation failed: no debts, or the payment does not cover the minimums.")
+    result = {'strategy': args.strategy, 'payment': args.payment, **stats}
+    if args.schedule:
+        result['schedule'] = [{'month': m['month'], 'interest': m['interest_paid'], 'paid': sum(m['payments'].values(), Decimal('0.00')),
+                               'balance': sum(m['balances_after'].values(), Decimal('0.00'))} for m in schedule]
+    return result, EXIT_OK, [f"{args.strategy.title()}: debt-free in {stats['total_months']} months, interest {stats['total_interest']:,.2f}, total paid {stats['total_paid']:,.2f}"]
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="DoDoFin batch commands.")
+    add_source_arguments(parser)
+    parser.add_argument('--json', action='store_true', help="Print the result as JSON")
+    parser.add_argument('--profile', action='store_true', help="Print a timing profile to stderr on exit")
+    parser.add_argument('--columnar', action='store_true', help="Run analytics on the in-memory columnar store")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('import', help="Import CSV files"); p.set_defaults(func=cmd_import)
+    p.add_argument('paths', nargs='+'); p.add_argument('--backend', choices=['pandas', 'stream']); p.add_argument('--apply-rules', action='store_true', help="Categorize afterwards")
+    p = sub.add_parser('apply-rules', help="Categorize uncategorized transactions by rules and history"); p.set_defaults(func=cmd_apply_rules)
+    p.add_argument('--no-history', action='store_true', help="Use only explicit rules"); p.add_argument('--dry-run', action='store_true')
+    p = sub.add_parser('rules', help="List categorization rules"); p.set_defaults(func=cmd_rules)
+    p = sub.add_parser('add-rule', help="Add a rule: descriptions containing PATTERN get CATEGORY"); p.set_defaults(func=cmd_add_rule)
+    p.add_argument('pattern'); p.add_argument('category'); p.add_argument('--create', action='store_true', help="Create the category if missing")
+    p = sub.add_parser('remove-rule', help="Delete a rule"); p.set_defaults(func=cmd_remove_rule); p.add_argument('id', type=int)
+    p = sub.add_parser('summary', help="Income, spending and budgets for a month"); p.set_defaults(func=cmd_summary)
+    p.add_argument('--month', type=_month_arg, help="YYYY-MM (default: current month, with projections)")
+    p = sub.add_parser('autobudget', help="Set budgets from spending history"); p.set_defaults(func=cmd_autobudget)
+    p.add_argument('--strategy', required=True, choices=list(db_utils.AVERAGE_ESTIMATORS) + ['minimum'])
+    p.add_argument('--months', type=int, default=db_utils.DEFAULT_AVERAGE_MONTHS, help=f"History months for windowed estimators (default: {db_utils.DEFAULT_AVERAGE_MONTHS})")
+    p.add_argument('--dry-run', action='store_true')
+    p = sub.add_parser('simulate', help="Debt payoff simulation"); p.set_defaults(func=cmd_simulate)
+    p.add_argument('--strategy', choices=['avalanche', 'snowball'], default='avalanche'); p.add_argument('--payment', type=_money_arg, required=True)
+    p.add_argument('--schedule', action='store_true', help="Include the month-by-month schedule")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv) # Exits with EXIT_USAGE on bad arguments
+    if args.profile: profiling.enable()
+    if args.columnar: columnar_cache.enable()
+    try: db_file = resolve_db_file(args)
+    except ValueError as e: print(e, file=sys.stderr); return EXIT_USAGE
+    if not os.path.exists(db_file): print(f"DB '{db_file}' not found.", file=sys.stderr); return EXIT_ERROR
+    conn = db_utils.create_connection(db_file)
+    if conn is None: return EXIT_ERROR
+    try:
+        db_utils.tune_connection(conn)
+        with contextlib.redirect_stdout(sys.stderr): # Keep stdout for the result
+            if not ensure_schema(conn): raise CliError("Database schema could not be updated.")
+            result, code, lines = args.func(conn, args)
+            conn.commit()
+    except CliError as e:
+        conn.rollback(); result, code, lines = {'error': str(e)}, e.code, None
+    except sqlite3.Error as e:
+        conn.rollback(); result, code, lines = {'error': f"Database error: {e}"}, EXIT_ERROR, None
+    finally:
+        conn.close()
+    if args.json: print(json.dumps({'command': args.command, 'exit_code': code, **result}, default=json_default, indent=2))
+    elif lines is None: print(result['error'], file=sys.stderr)
+    else: print("\n".join(lines))
+    return code
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+# columnar_cache.py
+# Optional in-process columnar copy of the transactions table for analytics
+# Enable with `python main.py --columnar` or DODOFIN_COLUMNAR=1; spending, averages,
+# minima and trend queries then run as NumPy group-bys instead of SQLite round-trips
+
+import os
+import threading
+import sqlite3
+import weakref
+
+ENV_VAR = 'DODOFIN_COLUMNAR'
+
+_enabled = False
+_stores = {}            # database file -> ColumnarStore
+_stores_lock = threading.Lock()
+
+def enable():
+    global _enabled
+    _enabled = True
+
+def disable():
+    """ Stops routing queries to the stores; loaded stores are kept for a later enable(). """
+    global _enabled
+    _enabled = False
+
+def is_enabled():
+    return _enabled
+
+def enabled_from_env():
+    return os.environ.get(ENV_VAR, '').strip().lower() not in ('', '0', 'false', 'no')
+
+# Rows are loaded with the same expressions the checksum query sums, so both sides agree exactly
+_SELECT_ROWS = """
+    SELECT id, COALESCE(CAST(julianday(transaction_date) - 2440587.5 AS INTEGER), 0), CAST(ROUND(amount * 100) AS INTEGER),
+           COALESCE(category_id, -1), is_income, description
+    FROM transactions WHERE id > ? ORDER BY id;
+"""
+# Amounts and dates are also summed weighted by id, so swapping them between rows changes the checksum.
+# Those sums use integer SUM, which is exact (TOTAL's float would round them and never match NumPy's int64 sums)
+_CHECKSUM = """
+    SELECT COUNT(*), TOTAL(CAST(ROUND(amount * 100) AS INTEGER)), TOTAL(id * (COALESCE(category_id, -1) + 2)),
+           TOTAL(id * is_income), TOTAL(COALESCE(CAST(julianday(transaction_date) - 2440587.5 AS INTEGER), 0)),
+           COALESCE(SUM(id * CAST(ROUND(amount * 100) AS INTEGER)), 0),
+           COALESCE(SUM(id * COALESCE(CAST(julianday(transaction_date) - 2440587.5 AS INTEGER), 0)), 0)
+    FROM transactions WHERE id <= ?;
+"""
+
+# Bumped by triggers on every UPDATE and DELETE of transactions (see database_setup); None when the ledger predates them
+_MODIFIED = "SELECT COALESCE((SELECT modified FROM table_changes WHERE name = 'transactions'), 0);"
+
+class Columns:
+    """
+    One immutable snapshot of the columns: id, day (days since 1970-01-01), month (months since 1970-01),
+    cents, category (-1 when uncategorized), income flag and a dictionary-encoded description, plus the
+    spending / report category ids. A sync builds a new snapshot and swaps it in; readers keep the one
+    they got, so a concurrent write can never mix old and new arrays within one query.
+    """
+    __slots__ = ('id', 'day', 'month', 'cents', 'category', 'income', 'desc_code', 'descriptions', 'spending_ids', 'report_ids')
+
+    def __init__(self, **columns):
+        for name in self.__slots__: object.__setattr__(self, name, columns[name])
+
+    def __setattr__(self, name, value): raise AttributeError("Columns snapshots are immutable")
+
+    @classmethod
+    def empty(cls):
+        import numpy as np
+        return cls(id=np.zeros(0, np.int64), day=np.zeros(0, np.int32), month=np.zeros(0, np.int32), cents=np.zeros(0, np.int64),
+                   category=np.zeros(0, np.int64), income=np.zeros(0, bool), desc_code=np.zeros(0, np.int32), descriptions=(),
+                   spending_ids=np.zeros(0, np.int64), report_ids=np.zeros(0, np.int64))
+
+    def replace(self, **changes):
+        return Columns(**{name: changes.get(name, getattr(self, name)) for name in self.__slots__})
+
+    @property
+    def max_id(self):
+        return int(self.id[-1]) if len(self.id) else 0
+
+    # --- Vectorized group-bys (amounts in cents) ---
+    def _expenses(self, category_ids):
+        import numpy as np
+        return (~self.income) & np.isin(self.category, category_ids)
+
+    def totals_by_category(self, start_day, end_day, category_ids):
+        """ {category_id: cents} for expenses with start_day <= day < end_day. """
+        import numpy as np
+        mask = self._expenses(category_ids) & (self.day >= start_day) & (self.day < end_day)
+        ids, inverse = np.unique(self.category[mask], return_inverse=True)
+        sums = np.bincount(inverse, weights=self.cents[mask], minlength=len(ids))
+        return {int(c): int(s) for c, s in zip(ids, sums)}
+
+    def totals_by_period(self, edges, category_ids, key='month'):
+        """
+        Expense cents per category per period, where period i is edges[i] <= key < edges[i+1]
+        (key 'month': months since 1970-01, 'day': days since 1970-01-01). Returns (category_ids, matrix).
+        """
+        import numpy as np
+        values = self.month if key == 'month' else self.day
+        mask = self._expenses(category_ids) & (values >= edges[0]) & (values < edges[-1])
+        ids, row = np.unique(self.category[mask], return_inverse=True)
+        col = np.searchsorted(edges, values[mask], side='right') - 1
+        matrix = np.zeros((len(ids), len(edges) - 1), np.int64); np.add.at(matrix, (row, col), self.cents[mask])
+        return [int(c) for c in ids], matrix
+
+    def min_month_total(self, category_id):
+        """ Smallest positive monthly total (cents) of positive expenses in a category, or None. """
+        import numpy as np
+        mask = (~self.income) & (self.category == category_id) & (self.cents > 0)
+        if not mask.any(): return None
+        months, inverse = np.unique(self.month[mask], return_inverse=True)
+        sums = np.bincount(inverse, weights=self.cents[mask])
+        sums = sums[sums > 0]
+        return int(sums.min()) if len(sums) else None
+
+class ColumnarStore:
+    """
+    Keeps the Columns snapshot for one database file in step with it. Synced lazily: new rows (id above
+    the last seen max; ids are AUTOINCREMENT) are appended. Updates and deletes bump a trigger-kept
+    counter, and only then is the checksum over the rows already held computed; a mismatch reloads all.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.columns = Columns.empty()
+        self.modified = None # table_changes counter at the last sync
+        self._desc_index = {}
+        self._tokens = weakref.WeakKeyDictionary()   # conn -> data_version token seen at the last sync; dropped with the connection
+        self.reloads = 0; self.appends = 0; self.checksums = 0
+
+    # --- Sync ---
+    def sync(self, conn):
+        """ Brings the snapshot up to date with conn's view of the database and returns it. Cheap when nothing changed. """
+        cursor = conn.cursor()
+        try:
+            cursor.execute("PRAGMA data_version"); token = (cursor.fetchone()[0], conn.total_changes)
+            with self.lock:
+                try: seen = self._tokens.get(conn)
+                except TypeError: seen = None # A plain sqlite3.Connection cannot be weakly referenced; it is re-checked every time
+                if seen == token: return self.columns
+                try: cursor.execute(_MODIFIED); modified = cursor.fetchone()[0]
+                except sqlite3.OperationalError: modified = None # No change counter yet: fall back to the checksum
+                columns = self.columns
+                if len(columns.id) and (modified is None or modified != self.modified):
+                    self.checksums += 1
+                    if not self._unchanged(cursor, columns): columns = Columns.empty(); self._desc_index = {}; self.reloads += 1
+                columns = self._append(cursor, columns)
+                self.columns = self._load_categories(cursor, columns) # The one assignment readers can observe
+                self.modified = modified
+                try: self._tokens[conn] = token
+                except TypeError: pass
+                return self.columns
+        finally:
+            cursor.close()
+
+    def _unchanged(self, cursor, c):
+        import numpy as np
+        cursor.execute(_CHECKSUM, (c.max_id,)); db = tuple(int(v) for v in cursor.fetchone())
+        mine = (len(c.id), int(c.cents.sum()), int((c.id * (c.category + 2)).sum()), int(c.id[c.income].sum()), int(c.day.sum(dtype=np.int64)),
+                int((c.id * c.cents).sum()), int((c.id * c.day).sum()))
+        return db == mine
+
+    def _append(self, cursor, c):
+        import numpy as np
+        cursor.execute(_SELECT_ROWS, (c.max_id,)); rows = cursor.fetchall()
+        if not rows: return c
+        ids, days, cents, cats, incomes, descs = zip(*rows)
+        index = self._desc_index; descriptions = list(c.descriptions); codes = []
+        for d in descs:
+            code = index.get(d)
+            if code is None: code = index[d] = len(descriptions); descriptions.append(d)
+            codes.append(code)
+        day = np.array(days, np.int32); self.appends += 1
+        return c.replace(id=np.concatenate((c.id, np.array(ids, np.int64))), day=np.concatenate((c.day, day)),
+                         month=np.concatenate((c.month, day.astype('datetime64[D]').astype('datetime64[M]').astype(np.int32))),
+                         cents=np.concatenate((c.cents, np.array(cents, np.int64))), category=np.concatenate((c.category, np.array(cats, np.int64))),
+                         income=np.concatenate((c.income, np.array(incomes, bool))), desc_code=np.concatenate((c.desc_code, np.array(codes, np.int32))),
+                         descriptions=tuple(descriptions))
+
+    def _load_categories(self, cursor, c):
+        import numpy as np
+        from db_utils import SPENDING_FILTER, REPORT_FILTER
+        cursor.execute(f"SELECT c.id FROM categories c WHERE {SPENDING_FILTER}"); spending_ids = np.array([r[0] for r in cursor.fetchall()], np.int64)
+        cursor.execute(f"SELECT c.id FROM categories c WHERE {REPORT_FILTER}"); report_ids = np.array([r[0] for r in cursor.fetchall()], np.int64)
+        return c.replace(spending_ids=spending_ids, report_ids=report_ids)
+
+def _db_file(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("PRAGMA database_list")
+        return next((r[2] for r in cursor.fetchall() if r[1] == 'main'), '') or f":memory:{id(conn)}"
+    finally:
+        cursor.close()
+
+def get_store(conn):
+    """
+    The synced Columns snapshot for conn's database file (one store is shared by every connection to it),
+    or None when NumPy is missing or the read fails. Take it once per query and use only that snapshot.
+    """
+    try:
+        key = _db_file(conn)
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None: store = _stores[key] = ColumnarStore()
+        return store.sync(conn)
+    except ImportError: return None
+    except sqlite3.Error as e: print(f"Columnar cache unavailable: {e}"); return None
+
+def month_number(year, month):
+    """ Months since 1970-01, the store's month key. """
+    return (year - 1970) * 12 + month - 1
+
+if enabled_from_env(): enable()
@@ -2,13 +2,61 @@
 # Handles importing transactions from CSV files
 # Updated to use UPSERT (ON CONFLICT...DO UPDATE)
 
-import pandas as pd
+import csv
 import os
 import datetime
+import importlib.util
+import itertools
+import math
 import sqlite3 # Needed for exception type hinting if desired
-from db_utils import get_categories, add_category # Import needed functions
+from db_utils import get_categories, add_category, get_setting, record_import # Import needed functions
+from forecasting import update_spend_curves
+from profiling import timed
 
-def import_csv(conn, csv_filepath):
+PROGRESS_EVERY = 500 # Rows between progress_callback calls / cancel checks
+BATCH_SIZE = 500 # Rows per executemany in the streaming backend
+IMPORT_BACKENDS = ('pandas', 'stream')
+
+# Configuration (Update if your bank format changes)
+DATE_COL, DESC_COL, AMOUNT_COL, CATEGORY_COL = 'Date', 'Description', 'Amount', 'Category'
+MANUAL_REVIEW_CATEGORIES = {'', 'category pending', 'uncategorized'} # Imported with no category
+DATE_FORMATS = ('%m/%d/%Y', '%Y-%m-%d', '%m/%d/%y', '%m-%d-%Y', '%Y/%m/%d', '%d-%b-%Y', '%b %d, %Y', '%m/%d/%Y %H:%M:%S', '%Y-%m-%d %H:%M:%S')
+
+# The WHERE clause in DO UPDATE makes it conditional: only update if category or income flag differs
+SQL_UPSERT = """
+INSERT INTO transactions (transaction_date, description, amount, is_income, category_id)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(transaction_date, description, amount) DO UPDATE SET
+  category_id = excluded.category_id,
+  is_income = excluded.is_income,
+  -- Update import timestamp to reflect when it was last seen/updated
+  import_timestamp = CURRENT_TIMESTAMP
+WHERE
+  transactions.category_id IS NOT excluded.category_id OR transactions.is_income IS NOT excluded.is_income;
+"""
+
+class DatabaseBusyError(sqlite3.OperationalError):
+    """ Another connection held the write lock past the busy timeout. The import was rolled back; retry it later. """
+
+def _is_busy(e):
+    """ True if e is SQLITE_BUSY / SQLITE_LOCKED (lock contention) rather than a problem with the data. """
+    code = getattr(e, 'sqlite_errorcode', None)
+    if code is None: return isinstance(e, sqlite3.OperationalError) and 'locked' in str(e)
+    return code & 0xff in (5, 6) # Primary codes SQLITE_BUSY, SQLITE_LOCKED; extended codes keep them in the low byte
+
+def _busy(conn, e):
+    """ Rolls back and returns the DatabaseBusyError to raise for lock contention e. """
+    conn.rollback(); print(f"Import Error: {e}; nothing was written.")
+    return DatabaseBusyError(str(e))
+
+def default_backend(conn=None):
+    """ The 'import_backend' setting if set, else pandas when it is installed, else the streaming backend. """
+    saved = get_setting(conn, 'import_backend') if conn is not None else None
+    if saved in IMPORT_BACKENDS: return saved
+    return 'pandas' if importlib.util.find_spec('pandas') else 'stream'
+
+@timed
+def import_csv(conn, csv_filepath, progress_callback=None, cancel_event=None, backend=None):
     """
     Imports transaction data from CSV. If a transaction with the same
     date, description, and amount exists, it updates the existing
@@ -16,17 +64,29 @@ def import_csv(conn, csv_filepath):
 
     :param conn: Database connection object
     :param csv_filepath: Path to the CSV file
-    :return: Tuple (imported_count, updated_count, skipped_count)
+    :param progress_callback: Optional callable(done, total) invoked while rows are written
+    :param cancel_event: Optional threading.Event; when set, the import stops and is rolled back
+    :param backend: 'pandas' or 'stream' (csv module, constant memory); None uses default_backend()
+    :return: Tuple (imported_count, updated_count, skipped_count), or None if the file could not be
+             imported (missing file or column, unparseable dates, cancelled, ...) and nothing was written
+    :raises DatabaseBusyError: if another connection kept the database locked; nothing was written
     """
     if not os.path.exists(csv_filepath):
         print(f"Error: File not found: {csv_filepath}")
-        return 0, 0, 0 # Imported, Updated, Skipped
+        return None
+    backend = backend or default_backend(conn)
+    if backend not in IMPORT_BACKENDS: print(f"Error: Unknown import backend '{backend}'."); return None
 
-    print(f"\n--- Importing: {csv_filepath} ---")
+    print(f"\n--- Importing: {csv_filepath} ({backend}) ---")
+    if backend == 'stream': return _import_csv_stream(conn, csv_filepath, progress_callback, cancel_event)
+    return _import_csv_pandas(conn, csv_filepath, progress_callback, cancel_event)
+
+def _import_csv_pandas(conn, csv_filepath, progress_callback=None, cancel_event=None):
+    """ Loads the whole file into a DataFrame, then upserts row by row. """
+    import pandas as pd # Only this backend needs pandas
     print("Importing/Updating transactions based on CSV...")
     try:
-        # Configuration (Update if your bank format changes)
-        date_col, desc_col, amount_col, category_col = 'Date', 'Description', 'Amount', 'Category'
+        date_col, desc_col, amount_col, category_col = DATE_COL, DESC_COL, AMOUNT_COL, CATEGORY_COL
         try:
             df = pd.read_csv(csv_filepath, encoding='utf-8', keep_default_na=False)
         except UnicodeDecodeError:
@@ -39,7 +99,7 @@ def import_csv(conn, csv_filepath):
         required_cols_map = {date_col: 'std_date', desc_col: 'std_description', amount_col: 'std_amount'}
         for k, v in required_cols_map.items():
             if k in df.columns: rename_map[k] = v
-            else: print(f"Error: Column '{k}' not found!"); return 0, 0, 0
+            else: print(f"Error: Column '{k}' not found!"); return None
         if category_col in df.columns: rename_map[category_col] = 'std_category_name'
         else: print(f"Warning: Column '{category_col}' not found."); df['std_category_name'] = ''
         df.rename(columns=rename_map, inplace=True)
@@ -47,13 +107,13 @@ def import_csv(conn, csv_filepath):
         try:
             df['std_date'] = pd.to_datetime(df['std_date'])
             df['std_date_str'] = df['std_date'].dt.strftime('%Y-%m-%d')
-        except Exception as e: print(f"Error converting date: {e}"); return 0, 0, 0
+        except Exception as e: print(f"Error converting date: {e}"); return None
         try:
             if df['std_amount'].dtype == 'object': df['std_amount'] = df['std_amount'].astype(str).str.replace(r'[$,]', '', regex=True)
             df['std_amount'] = pd.to_numeric(df['std_amount'], errors='coerce');
             nan_count = df['std_amount'].isnull().sum()
             if nan_count > 0: print(f"Warning: {nan_count} Amount values invalid, rows skipped."); df.dropna(subset=['std_amount'], inplace=True)
-        except Exception as e: print(f"Error converting amount: {e}"); return 0, 0, 0
+        except Exception as e: print(f"Error converting amount: {e}"); return None
 
         df['is_income'] = df['std_amount'] > 0
         df['abs_amount'] = df['std_amount'].abs()
@@ -61,7 +121,7 @@ def import_csv(conn, csv_filepath):
         # Prepare Category IDs
         print("Processing categories...")
         existing_cats = {c['name'].lower(): c['id'] for c in get_categories(conn)}
-        manual_review = {'', 'category pending', 'uncategorized'}
+        manual_review = MANUAL_REVIEW_CATEGORIES
         cat_ids = []
         new_cats = set()
         for idx, row in df.iterrows():
@@ -90,25 +150,17 @@ def import_csv(conn, csv_filepath):
         imported_count = 0
         updated_count = 0
         skipped_count = 0 # Count rows skipped due to missing data pre-insert
-        # --- MODIFIED SQL STATEMENT ---
-        sql_upsert = """
-        INSERT INTO transactions (transaction_date, description, amount, is_income, category_id)
-        VALUES (?, ?, ?, ?, ?)
-        ON CONFLICT(transaction_date, description, amount) DO UPDATE SET
-          category_id = excluded.category_id,
-          is_income = excluded.is_income,
-          -- Update import timestamp to reflect when it was last seen/updated
-          import_timestamp = CURRENT_TIMESTAMP
-        WHERE
-          -- Optional: Only update if the category is actually changing?
-          -- Or always update to reflect latest CSV info. Let's always update for now.
-          transactions.category_id IS NOT excluded.category_id OR transactions.is_income IS NOT excluded.is_income;
-        """
-        # The WHERE clause in DO UPDATE makes it conditional: only update if category or income flag differs.
-        # Remove the WHERE clause if you want to always overwrite category/income on conflict.
+        sql_upsert = SQL_UPSERT
 
         print(f"Attempting insert/update for {len(df)} txns...")
-        for idx, row in df.iterrows():
+        total_rows = len(df)
+        for n, (idx, row) in enumerate(df.iterrows()):
+             if n % PROGRESS_EVERY == 0:
+                 if cancel_event is not None and cancel_event.is_set():
+                     conn.rollback(); cursor.close()
+                     print("Import cancelled. No transactions were written.")
+                     return None
+                 if progress_callback: progress_callback(n, total_rows)
              if pd.notna(row['std_date_str']) and pd.notna(row['std_description']) and pd.notna(row['abs_amount']):
                  try:
                      cursor.execute(sql_upsert, (
@@ -123,6 +175,7 @@ def import_csv(conn, csv_filepath):
                      # but for now, let's just commit. We can infer based on changes later if needed.
 
                  except sqlite3.Error as e:
+                     if _is_busy(e): raise # Not this row's fault; the whole import is retried
                      print(f"DB Error row {idx}: {e}")
                      skipped_count += 1 # Count errors as skipped
              else:
@@ -131,11 +184,15 @@ def import_csv(conn, csv_filepath):
 
         # Commit all changes at the end
         conn.commit()
+        record_import(conn)
+        dates = df['std_date_str'].dropna()
+        if not dates.empty: update_spend_curves(conn, since=dates.min()) # Refresh only the months this file touched
+        if progress_callback: progress_callback(total_rows, total_rows)
 
         # Get approximate counts (less accurate without pre-checking)
         # For now, just report success/skips based on processing
         # We need a different approach to accurately count inserts vs updates with ON CONFLICT
-        print(f"\n--- Import complete ---")
+        print("\n--- Import complete ---")
         # print(f"Processed: {len(df) - skipped_count} rows (inserted or updated).") # Approximate
         print(f"Skipped: {skipped_count} rows (due to errors or missing data).")
         # Add a check for remaining uncategorized items
@@ -149,7 +206,151 @@ def import_csv(conn, csv_filepath):
         return len(df) - skipped_count, 0, skipped_count
 
     except Exception as e:
-        print(f"Import Error: {e}")
+        if isinstance(e, sqlite3.Error) and _is_busy(e): raise _busy(conn, e) from e
+        conn.rollback(); print(f"Import Error: {e}")
         import traceback
         traceback.print_exc()
-        return 0, 0, len(df) if 'df' in locals() else 0 # Skip all on major error
\ No newline at end of file
+        return None
+
+# --- Streaming backend (stdlib csv, constant memory) ---
+class ImportAbort(Exception):
+    """ Stops a streaming import; the transaction is rolled back and nothing is written. """
+
+class _ByteCounter:
+    """ Yields decoded lines from a binary file while counting the bytes read, for progress. """
+    def __init__(self, f, encoding):
+        self.f = f; self.encoding = encoding; self.bytes_read = 0
+    def __iter__(self):
+        for line in self.f:
+            self.bytes_read += len(line)
+            yield line.decode(self.encoding)
+
+def _map_columns(reader):
+    """ Reads the header and yields (line_no, date, description, amount, category) strings per row. """
+    header = [h.strip() for h in next(reader, [])]
+    index = {}
+    for col in (DATE_COL, DESC_COL, AMOUNT_COL):
+        if col not in header: raise ImportAbort(f"Error: Column '{col}' not found!")
+        index[col] = header.index(col)
+    cat_i = header.index(CATEGORY_COL) if CATEGORY_COL in header else None
+    if cat_i is None: print(f"Warning: Column '{CATEGORY_COL}' not found.")
+    get = lambda row, i: row[i] if i is not None and i < len(row) else None
+    for line_no, row in enumerate(reader, start=1):
+        if not row: continue # Blank line
+        yield line_no, get(row, index[DATE_COL]), get(row, index[DESC_COL]), get(row, index[AMOUNT_COL]), get(row, cat_i) or ''
+
+def _parse_date(value, fmt_cache):
+    """ Parses value with the last format that worked, then the others. Returns 'YYYY-MM-DD'. """
+    for fmt in fmt_cache + [f for f in DATE_FORMATS if f not in fmt_cache]:
+        try: parsed = datetime.datetime.strptime(value, fmt)
+        except ValueError: continue
+        fmt_cache[:] = [fmt]
+        return parsed.strftime('%Y-%m-%d')
+    try: return datetime.datetime.fromisoformat(value).strftime('%Y-%m-%d')
+    except ValueError: raise ImportAbort(f"Error converting date: could not parse '{value}'")
+
+def _parse_amount(value):
+    """ Strips '$' and ',' like the pandas backend. Returns float, or None when invalid. """
+    try: amount = float(str(value).replace('$', '').replace(',', '').strip())
+    except ValueError: return None
+    return amount if math.isfinite(amount) else None
+
+def _parse_rows(rows, stats):
+    """ Yields (line_no, date_str, description, abs_amount, is_income, category_name); counts invalid/missing rows in stats. """
+    fmt_cache = []
+    for line_no, date_s, desc, amount_s, category in rows:
+        amount = _parse_amount(amount_s) if amount_s is not None else None
+        if amount is None: stats['invalid_amounts'] += 1; continue # Dropped before counting, as pandas does
+        date_s = (date_s or '').strip()
+        if not date_s or desc is None: print(f"Skipping row {line_no} due to missing data."); stats['skipped'] += 1; continue
+        date_s = _parse_date(date_s, fmt_cache)
+        if date_s and (stats['min_date'] is None or date_s < stats['min_date']): stats['min_date'] = date_s
+        yield line_no, date_s, desc, abs(amount), int(amount > 0), category.strip()
+
+def _resolve_categories(conn, rows, new_cats):
+    """ Replaces category names with IDs, adding unknown categories inside the import's transaction. """
+    existing_cats = {c['name'].lower(): c['id'] for c in get_categories(conn)}
+    for line_no, date_s, desc, amount, is_income, cat_name in rows:
+        cat_lower = cat_name.lower(); cat_id = None
+        if cat_lower not in MANUAL_REVIEW_CATEGORIES:
+            if cat_lower in existing_cats: cat_id = existing_cats[cat_lower]
+            else:
+                if cat_name not in new_cats: print(f"Adding new category: '{cat_name}'"); new_cats.add(cat_name)
+                new_id = add_category(conn, cat_name, commit=False)
+                if new_id: existing_cats[cat_lower] = new_id; cat_id = new_id
+                else: print(f"Warning: Could not add category '{cat_name}'.")
+        yield line_no, (date_s, desc, amount, is_income, cat_id)
+
+def _write_batches(conn, rows, stats, progress, cancel_event):
+    """ Upserts rows BATCH_SIZE at a time; a failing batch is retried row by row so only bad rows are skipped. """
+    cursor = conn.cursor()
+    try:
+        while True:
+            batch = list(itertools.islice(rows, BATCH_SIZE))
+            if not batch: break
+            if cancel_event is not None and cancel_event.is_set(): raise ImportAbort("Import cancelled. No transactions were written.")
+            try:
+                if not conn.in_transaction: cursor.execute("BEGIN") # Otherwise RELEASE of the outer savepoint would commit
+                cursor.execute("SAVEPOINT import_batch")
+                cursor.executemany(SQL_UPSERT, [params for _, params in batch])
+                cursor.execute("RELEASE import_batch")
+                stats['written'] += len(batch)
+            except sqlite3.Error as e:
+                if _is_busy(e): raise # Retrying row by row would only wait again
+                cursor.execute("ROLLBACK TO import_batch"); cursor.execute("RELEASE import_batch")
+                for line_no, params in batch:
+                    try: cursor.execute(SQL_UPSERT, params); stats['written'] += 1
+                    except sqlite3.Error as e:
+                        if _is_busy(e): raise
+                        print(f"DB Error row {line_no}: {e}"); stats['skipped'] += 1
+            progress()
+    finally:
+        cursor.close()
+
+def _import_csv_stream(conn, csv_filepath, progress_callback=None, cancel_event=None):
+    """
+    Generator pipeline: decode -> map columns -> parse date/amount -> resolve
+    category -> batched executemany. Memory use does not grow with file size.
+    Progress is reported as (bytes read, file size).
+    """
+    print("Importing/Updating transactions based on CSV (streaming)...")
+    total_bytes = os.path.getsize(csv_filepath)
+    for encoding in ('utf-8-sig', 'latin1'):
+        stats = {'written': 0, 'skipped': 0, 'invalid_amounts': 0, 'min_date': None}; new_cats = set()
+        try:
+            with open(csv_filepath, 'rb') as f:
+                lines = _ByteCounter(f, encoding)
+                rows = _resolve_categories(conn, _parse_rows(_map_columns(csv.reader(lines)), stats), new_cats)
+                progress = (lambda: progress_callback(lines.bytes_read, total_bytes)) if progress_callback else (lambda: None)
+                _write_batches(conn, rows, stats, progress, cancel_event)
+            conn.commit()
+            record_import(conn)
+            if stats['min_date']: update_spend_curves(conn, since=stats['min_date'])
+            break
+        except UnicodeDecodeError:
+            conn.rollback()
+            if encoding == 'latin1': raise
+            print("UTF-8 failed, trying latin1...")
+        except ImportAbort as e:
+            conn.rollback(); print(e)
+            return None
+        except Exception as e:
+            if isinstance(e, sqlite3.Error) and _is_busy(e): raise _busy(conn, e) from e
+            conn.rollback(); print(f"Import Error: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
+
+    if progress_callback: progress_callback(total_bytes, total_bytes)
+    if new_cats: print(f"Added {len(new_cats)} new categories.")
+    if stats['invalid_amounts']: print(f"Warning: {stats['invalid_amounts']} Amount values invalid, rows skipped.")
+    print("\n--- Import complete ---")
+    print(f"Skipped: {stats['skipped']} rows (due to errors or missing data).")
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM transactions WHERE category_id IS NULL")
+        needs_cat = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+    if needs_cat > 0: print(f"\nNOTE: {needs_cat} txns need manual categorization (Opt 2).")
+    return stats['written'], 0, stats['skipped']
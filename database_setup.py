@@ -1,8 +1,38 @@
 # database_setup.py
+import contextlib
+import io
 import sqlite3
 import os
 
 DB_FILE = 'finance.db'
+SCHEMA_VERSION = 3 # PRAGMA user_version once apply_schema has run completely; bump it when a table, column or index is added
+
+# Category attribute columns. DEFAULT_CATEGORY_FLAGS is applied once, when a flag column is first added,
+# and to categories created later under one of its names; after that the flags belong to the user and are edited from the CLI/GUI
+CATEGORY_FLAG_COLUMNS = {
+    'exclude_spending': "INTEGER NOT NULL DEFAULT 0",  # Expenses here are not spending (transfers, card payments...)
+    'exclude_income': "INTEGER NOT NULL DEFAULT 0",    # Positive amounts here move money around rather than earn it
+    'budgetable': "INTEGER NOT NULL DEFAULT 1",        # Offered for budgets and shown in per-category spending reports
+    'debt_related': "INTEGER NOT NULL DEFAULT 0",      # Budgets here duplicate minimum payments in the debts table
+    'income_category': "INTEGER NOT NULL DEFAULT 0",   # Holds earnings (paychecks, interest...)
+}
+DEFAULT_CATEGORY_FLAGS = { # flag -> (value, category names)
+    'exclude_spending': (1, ('transfer', 'credit card payment', 'income', 'paycheck', 'returned purchase', 'gifts & donations', 'atm fee')),
+    'exclude_income': (1, ('transfer', 'credit card payment', 'returned purchase')),
+    'budgetable': (0, ('transfer', 'credit card payment', 'income', 'paycheck', 'uncategorized', 'returned purchase', 'gifts & donations', 'atm fee')),
+    'debt_related': (1, ('credit card payment', 'auto payment', 'student loan payment', 'financial')),
+    'income_category': (1, ('income', 'paycheck')),
+}
+
+def default_flags_for(name):
+    """ {flag: value} that DEFAULT_CATEGORY_FLAGS gives a category called name (case-insensitive). """
+    key = name.strip().lower()
+    return {flag: value for flag, (value, names) in DEFAULT_CATEGORY_FLAGS.items() if key in names}
+
+def category_insert_sql(name, or_ignore=False):
+    """ (sql, params) inserting category name together with its default flags. """
+    flags = default_flags_for(name); columns = ['name', *flags]
+    return f"INSERT {'OR IGNORE ' if or_ignore else ''}INTO categories ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", (name, *flags.values())
 
 def create_connection(db_file):
     """ Create a database connection to the SQLite database specified by db_file """
@@ -32,13 +62,84 @@ def create_table(conn, create_table_sql):
 
         cursor.execute(create_table_sql)
         print(f"Table '{table_name}' checked/created successfully.")
+        return True
     except sqlite3.Error as e:
         print(f"Error creating table '{table_name}': {e}")
+        return False
     finally:
          if cursor: cursor.close()
 
 
-def main():
+def add_missing_columns(conn, table, columns):
+    """ ALTER TABLE ADD COLUMN for each of columns ({name: definition}) the table lacks. Returns the names added, or None on error. """
+    cursor = conn.cursor(); added = []
+    try:
+        cursor.execute(f"PRAGMA table_info({table})"); existing = {row[1] for row in cursor.fetchall()}
+        for name, definition in columns.items():
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}"); added.append(name)
+                print(f"Column '{table}.{name}' added.")
+        conn.commit()
+    except sqlite3.Error as e: print(f"Error adding columns to '{table}': {e}"); added = None
+    finally: cursor.close()
+    return added
+
+def seed_category_flags(conn, flags):
+    """ Applies DEFAULT_CATEGORY_FLAGS for the given flag columns to existing categories. Returns success. """
+    cursor = conn.cursor(); success = False
+    try:
+        for flag in flags:
+            value, names = DEFAULT_CATEGORY_FLAGS[flag]
+            cursor.execute(f"UPDATE categories SET {flag} = ? WHERE LOWER(name) IN ({','.join('?'*len(names))})", (value, *names))
+        conn.commit()
+        if flags: print(f"Category flags set: {', '.join(flags)}.")
+        success = True
+    except sqlite3.Error as e: print(f"Error setting category flags: {e}")
+    finally: cursor.close()
+    return success
+
+def enable_incremental_vacuum(conn):
+    """
+    Switches the file to auto_vacuum=INCREMENTAL, so maintenance.py can hand free pages back in
+    small steps. A new file takes the setting before its first table; an existing one keeps its
+    mode until 'python maintenance.py run' rewrites it once (a full VACUUM, never done here). Returns success.
+    """
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2: return True
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2: print("Incremental auto-vacuum enabled.")
+        else: print("Incremental auto-vacuum takes effect after 'python maintenance.py run' rewrites the file once.")
+        return True
+    except sqlite3.Error as e: print(f"Could not enable incremental vacuum: {e}"); return False
+
+def repair_gamification(conn):
+    """
+    Collapses the duplicate gamification rows older versions inserted on every setup run and
+    points award (each later row only saw later awards, so the oldest row holds the full total),
+    adds the unique index that makes INSERT OR IGNORE work, and opens the points_events ledger
+    with the existing total so the two agree. Returns success.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM gamification WHERE id NOT IN (SELECT MIN(id) FROM gamification GROUP BY user_id)")
+        if cursor.rowcount > 0: print(f"Removed {cursor.rowcount} duplicate gamification rows.")
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_gamification_user ON gamification (user_id)")
+        cursor.execute("INSERT OR IGNORE INTO gamification (user_id, points) VALUES (1, 0)")
+        cursor.execute("""
+            INSERT INTO points_events (event, points, ref)
+            SELECT 'opening_balance', points, 'total before the event ledger' FROM gamification
+            WHERE user_id = 1 AND points != 0 AND NOT EXISTS (SELECT 1 FROM points_events);
+        """)
+        conn.commit(); print("Gamification initialized.")
+        return True
+    except sqlite3.Error as e: print(f"Error initializing gamification: {e}"); return False
+    finally: cursor.close()
+
+def apply_schema(conn):
+    """
+    Creates or updates the schema, indexes and default rows through an open connection. Every step is
+    idempotent. Returns True, and stamps the file with SCHEMA_VERSION, only when every step succeeded.
+    """
     # --- Define Table Schemas ---
     sql_create_categories_table = """ CREATE TABLE IF NOT EXISTS categories (...); """ # Keep existing schema
     sql_create_transactions_table = """ CREATE TABLE IF NOT EXISTS transactions (...); """ # Keep existing schema
@@ -61,7 +162,7 @@ def main():
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         name TEXT NOT NULL UNIQUE
     );
-    """
+    """ # Attribute flag columns are added by add_missing_columns (see CATEGORY_FLAG_COLUMNS)
     sql_create_transactions_table = """
     CREATE TABLE IF NOT EXISTS transactions (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -78,6 +179,18 @@ def main():
     CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_transaction
     ON transactions (transaction_date, description, amount);
     """
+    # Browser / aggregate indexes. Every index ends with the implicit rowid, so each also serves ORDER BY <col>, id keyset paging
+    sql_add_browse_indexes = [
+        ("idx_transactions_date", "CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (transaction_date);"),
+        ("idx_transactions_description", "CREATE INDEX IF NOT EXISTS idx_transactions_description ON transactions (description);"),
+        ("idx_transactions_category_date", "CREATE INDEX IF NOT EXISTS idx_transactions_category_date ON transactions (category_id, transaction_date);"),
+        ("idx_transactions_amount_date", "CREATE INDEX IF NOT EXISTS idx_transactions_amount_date ON transactions (amount, transaction_date);"), # Amount sort, and duplicate detection: same amount within a date window
+    ]
+    # Partial index: the categorization queue walks only uncategorized rows in (date, id) order
+    sql_add_uncategorized_index = """
+    CREATE INDEX IF NOT EXISTS idx_transactions_uncategorized
+    ON transactions (transaction_date, id) WHERE category_id IS NULL;
+    """
     sql_create_budget_simple_table = """
     CREATE TABLE IF NOT EXISTS budget_simple (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -107,43 +220,170 @@ def main():
     );
     """
 
+    # Intra-month forecasting: cumulative daily spend per category per complete month, and the curves aggregated from it
+    sql_create_spend_curve_months_table = """
+    CREATE TABLE IF NOT EXISTS spend_curve_months (
+        category_id INTEGER NOT NULL,
+        month TEXT NOT NULL,        -- 'YYYY-MM'
+        day INTEGER NOT NULL,       -- 1..31
+        cum_amount REAL NOT NULL,   -- Spent in the month through this day
+        month_total REAL NOT NULL,
+        log_ratio REAL,             -- ln(month_total / cum_amount); NULL while nothing is spent yet
+        PRIMARY KEY (category_id, month, day)
+    ) WITHOUT ROWID;
+    """
+    sql_create_spend_curves_table = """
+    CREATE TABLE IF NOT EXISTS spend_curves (
+        category_id INTEGER NOT NULL,
+        day INTEGER NOT NULL,
+        months INTEGER NOT NULL,      -- History months with spending in this category
+        mean_share REAL,              -- Average share of the month total spent by this day
+        mean_log_ratio REAL,          -- Mean and mean square of ln(total / spent so far)
+        mean_log_ratio_sq REAL,
+        ratio_months INTEGER,         -- Months that had spending by this day
+        mean_remaining REAL,          -- Average spend after this day, over all history months
+        PRIMARY KEY (category_id, day)
+    ) WITHOUT ROWID;
+    """
+
+    # Near-duplicate review queue: one row per candidate pair (tx_a < tx_b)
+    sql_create_duplicate_candidates_table = """
+    CREATE TABLE IF NOT EXISTS duplicate_candidates (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tx_a INTEGER NOT NULL,
+        tx_b INTEGER NOT NULL,
+        score REAL NOT NULL,
+        day_gap INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending', -- pending / merged / ignored
+        detected_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (tx_a, tx_b)
+    );
+    """
+
+    # Auto-categorization rules: descriptions containing `pattern` (case-insensitive) get category_id
+    sql_create_category_rules_table = """
+    CREATE TABLE IF NOT EXISTS category_rules (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        pattern TEXT NOT NULL UNIQUE COLLATE NOCASE,
+        category_id INTEGER NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (category_id) REFERENCES categories (id)
+    );
+    """
+
+    # Files picked up by the drop-folder watcher, so a file seen again (same content) is not re-imported
+    sql_create_imported_files_table = """
+    CREATE TABLE IF NOT EXISTS imported_files (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        sha256 TEXT NOT NULL,
+        status TEXT NOT NULL, -- imported / failed / duplicate
+        imported INTEGER NOT NULL DEFAULT 0,
+        skipped INTEGER NOT NULL DEFAULT 0,
+        processed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    """
+
+    # Append-only points ledger; gamification.points is its running total, updated in the same transaction
+    sql_create_points_events_table = """
+    CREATE TABLE IF NOT EXISTS points_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        event TEXT NOT NULL, -- categorize / import / bonus / opening_balance
+        points INTEGER NOT NULL DEFAULT 0,
+        ref TEXT,
+        created_at DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))
+    );
+    """
+    sql_add_points_events_index = "CREATE INDEX IF NOT EXISTS idx_points_events_event ON points_events (event, created_at);" # Streaks scan only import events
+
+    # Counts UPDATEs and DELETEs per table, so caches can tell a pure append (new ids only) from an edit without rescanning
+    sql_create_table_changes_table = """
+    CREATE TABLE IF NOT EXISTS table_changes (
+        name TEXT PRIMARY KEY,
+        modified INTEGER NOT NULL DEFAULT 0
+    );
+    """
+    sql_add_change_triggers = [(f"trg_transactions_{event.lower()}", f"""
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_{event.lower()} AFTER {event} ON transactions
+    BEGIN
+        INSERT INTO table_changes (name, modified) VALUES ('transactions', 1)
+        ON CONFLICT (name) DO UPDATE SET modified = modified + 1;
+    END;
+    """) for event in ("UPDATE", "DELETE")]
+
     # --- Execution ---
-    conn = create_connection(DB_FILE)
-    if conn is not None:
-        print("\nCreating tables...")
-        create_table(conn, sql_create_categories_table)
-        create_table(conn, sql_create_transactions_table)
-        create_table(conn, sql_create_budget_simple_table)
-        create_table(conn, sql_create_gamification_table)
-        create_table(conn, sql_create_debts_table)
-        create_table(conn, sql_create_app_settings_table) # Create the new table
-
-        print("\nCreating indexes...")
-        cursor = conn.cursor();
-        try: cursor.execute(sql_add_unique_constraint); print("Index 'idx_unique_transaction' checked/created.")
-        except sqlite3.Error as e: print(f"Index creation error: {e}")
-        finally: cursor.close()
-
-        # Add default categories (using executemany for efficiency)
-        print("\nAdding default categories...")
-        cursor = conn.cursor();
-        try:
-            default_categories = [ ('Uncategorized',), ('Income',), ('Paycheck',), ('Groceries',), ('Shopping',), ('Restaurants',), ('Fast Food',), ('Coffee Shops',), ('Entertainment',), ('Rent/Mortgage',), ('Utilities',), ('Gas',), ('Auto Payment',), ('Auto Insurance',), ('Service & Parts',), ('Health Insurance',), ('Doctor',), ('Pharmacy',), ('Gym',), ('Mobile Phone',), ('Internet',), ('Subscriptions',), ('Transfer',), ('Credit Card Payment',), ('Student Loan Payment',), ('Gifts & Donations',), ('Personal Care',), ('Home Repair',), ('Pets',), ('Travel',), ('Clothing',), ('Books',), ('Electronics & Software',), ('Alcohol & Bars',), ('Financial',) ]
-            cursor.executemany('INSERT OR IGNORE INTO categories(name) VALUES(?)', default_categories); conn.commit(); print("Default categories checked/added.")
-        except sqlite3.Error as e: print(f"Error adding default categories: {e}")
-        finally: cursor.close()
-
-        # Initialize gamification
-        print("\nInitializing gamification...")
-        cursor = conn.cursor();
-        try: cursor.execute("INSERT OR IGNORE INTO gamification (user_id, points) VALUES (1, 0)"); conn.commit(); print("Gamification initialized.")
-        except sqlite3.Error as e: print(f"Error initializing gamification: {e}")
-        finally: cursor.close()
+    ok = enable_incremental_vacuum(conn) # Before any table, so a new file never needs the VACUUM
+    print("\nCreating tables...")
+    for table_sql in (sql_create_categories_table, sql_create_transactions_table, sql_create_budget_simple_table, sql_create_gamification_table,
+                      sql_create_debts_table, sql_create_app_settings_table, sql_create_spend_curve_months_table, sql_create_spend_curves_table,
+                      sql_create_duplicate_candidates_table, sql_create_category_rules_table, sql_create_imported_files_table, sql_create_points_events_table,
+                      sql_create_table_changes_table):
+        ok = create_table(conn, table_sql) and ok
+    new_flags = add_missing_columns(conn, 'categories', CATEGORY_FLAG_COLUMNS); ok = new_flags is not None and ok
+
+    print("\nCreating indexes...")
+    cursor = conn.cursor();
+    try:
+        cursor.execute(sql_add_unique_constraint); print("Index 'idx_unique_transaction' checked/created.")
+        cursor.execute(sql_add_uncategorized_index); print("Index 'idx_transactions_uncategorized' checked/created.")
+        cursor.execute(sql_add_points_events_index); print("Index 'idx_points_events_event' checked/created.")
+        for index_name, index_sql in sql_add_browse_indexes:
+            cursor.execute(index_sql); print(f"Index '{index_name}' checked/created.")
+        cursor.execute("DROP INDEX IF EXISTS idx_transactions_amount") # Superseded by idx_transactions_amount_date
+        for trigger_name, trigger_sql in sql_add_change_triggers:
+            cursor.execute(trigger_sql); print(f"Trigger '{trigger_name}' checked/created.")
+    except sqlite3.Error as e: print(f"Index creation error: {e}"); ok = False
+    finally: cursor.close()
+
+    # Add default categories (using executemany for efficiency)
+    print("\nAdding default categories...")
+    cursor = conn.cursor();
+    try:
+        default_categories = [ ('Uncategorized',), ('Income',), ('Paycheck',), ('Groceries',), ('Shopping',), ('Restaurants',), ('Fast Food',), ('Coffee Shops',), ('Entertainment',), ('Rent/Mortgage',), ('Utilities',), ('Gas',), ('Auto Payment',), ('Auto Insurance',), ('Service & Parts',), ('Health Insurance',), ('Doctor',), ('Pharmacy',), ('Gym',), ('Mobile Phone',), ('Internet',), ('Subscriptions',), ('Transfer',), ('Credit Card Payment',), ('Student Loan Payment',), ('Gifts & Donations',), ('Personal Care',), ('Home Repair',), ('Pets',), ('Travel',), ('Clothing',), ('Books',), ('Electronics & Software',), ('Alcohol & Bars',), ('Financial',) ]
+        for (name,) in default_categories: cursor.execute(*category_insert_sql(name, or_ignore=True)) # With flags, also when added to an existing ledger
+        conn.commit(); print("Default categories checked/added.")
+    except sqlite3.Error as e: print(f"Error adding default categories: {e}"); ok = False
+    finally: cursor.close()
+    ok = seed_category_flags(conn, new_flags or []) and ok # Only flags that did not exist yet, so user edits survive re-running setup
+
+    # Initialize gamification
+    print("\nInitializing gamification...")
+    ok = repair_gamification(conn) and ok
+
+    if ok:
+        try: conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}"); conn.commit()
+        except sqlite3.Error as e: print(f"Error recording schema version: {e}"); ok = False
+    return ok
 
+def setup_database(db_file=DB_FILE):
+    """ Creates or updates the schema, indexes and default rows in db_file. """
+    conn = create_connection(db_file)
+    if conn is not None:
+        ok = apply_schema(conn)
         conn.close()
-        print("\nDatabase setup/update complete. Connection closed.")
+        print("\nDatabase setup/update complete. Connection closed." if ok else "\nDatabase setup/update finished with errors (see above). Connection closed.")
     else:
         print("Error! Cannot create the database connection.")
 
+def ensure_schema(conn):
+    """
+    Brings a file from an older version up to date when an entry point connects, so nobody has to rerun
+    setup by hand. Costs one PRAGMA once the file's user_version has reached SCHEMA_VERSION; the
+    step-by-step setup output is shown only if a step fails. Returns True when the schema is current.
+    """
+    try:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION: return True
+    except sqlite3.Error as e: print(f"Error reading schema version: {e}"); return False
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output): ok = apply_schema(conn)
+    if ok: print(f"Database schema updated to version {SCHEMA_VERSION}.")
+    else: print(output.getvalue().strip() + "\nDatabase schema update failed; run 'python database_setup.py' to retry.")
+    return ok
+
+def main():
+    setup_database(DB_FILE)
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -4,31 +4,109 @@
 
 import sqlite3
 import datetime
-from dateutil.relativedelta import relativedelta
 from decimal import Decimal, ROUND_HALF_UP
 import math
+import pathlib
+import statistics
+import weakref
+import profiling
+import columnar_cache
+from profiling import timed
+from database_setup import category_insert_sql
 
 DB_FILE = 'finance.db'
 
+# Category attribute flags (columns on categories, see database_setup) -> label shown when editing them
+CATEGORY_FLAGS = {
+    'exclude_spending': "Excluded from spending",
+    'exclude_income': "Excluded from income",
+    'budgetable': "Budgetable",
+    'debt_related': "Debt-related",
+    'income_category': "Income",
+}
+
+# WHERE fragments over the flags of the categories table aliased `c`
+SPENDING_FILTER = "c.exclude_spending = 0"                       # Expenses counted as spending
+REPORT_FILTER = "c.exclude_spending = 0 AND c.budgetable = 1"    # Categories in per-category reports and budgets
+
+# Per-connection results cache: {conn: {name: (token, value)}}; entries go away with their connection
+_query_cache = weakref.WeakKeyDictionary()
+
 # --- Connection ---
 def create_connection(db_file=DB_FILE):
     """ Create a database connection to the SQLite database """
     conn = None
     try:
-        conn = sqlite3.connect(db_file)
+        conn = sqlite3.connect(db_file, factory=profiling.connection_factory()) # Traced connection only when profiling is on
         conn.row_factory = sqlite3.Row
         return conn
     except sqlite3.Error as e:
         print(f"Error connecting to database: {e}")
         return None
 
+def file_uri(db_file, readonly=False):
+    """ SQLite file: URI for db_file (absolute, with '?', '#' and '%' in the name escaped), read-only if asked. """
+    return pathlib.Path(db_file).resolve().as_uri() + ("?mode=ro" if readonly else "")
+
+BUSY_TIMEOUT_MS = 5000 # How long a tuned connection waits on another process's lock before failing
+
+def tune_connection(conn, busy_timeout_ms=BUSY_TIMEOUT_MS):
+    """
+    Settings for processes that share the file with a running GUI or menu: WAL (readers and one
+    writer no longer block each other; stored in the file), a busy timeout instead of an immediate
+    'database is locked', and synchronous=NORMAL, which is durable enough under WAL.
+    """
+    conn.execute("PRAGMA journal_mode = WAL").fetchone()
+    conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+# --- Data Version / Caching ---
+def get_data_version(conn):
+    """ Returns a token that changes whenever this or any other connection writes to the database. """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("PRAGMA data_version")
+        return (cursor.fetchone()[0], conn.total_changes)
+    finally:
+        cursor.close()
+
+def _cached(conn, name, compute, *key, token=None):
+    """ Returns compute() for this connection, reusing the last result while data (or the given token) and key are unchanged. """
+    token = (get_data_version(conn) if token is None else token,) + key
+    try: entries = _query_cache.setdefault(conn, {})
+    except TypeError: return compute() # A plain sqlite3.Connection cannot be weakly referenced, so it is not cached
+    entry = entries.get(name)
+    if entry and entry[0] == token:
+        return entry[1]
+    value = compute()
+    entries[name] = (token, value)
+    return value
+
+def get_import_version(conn):
+    """ Counter bumped by every completed CSV import. """
+    return get_setting(conn, 'import_version', '0')
+
+def record_import(conn):
+    """ Called by csv_importer once an import has committed. """
+    try: version = int(get_import_version(conn) or 0)
+    except ValueError: version = 0
+    if not set_setting(conn, 'import_version', version + 1): return False
+    _record_import_event(conn, version + 1)
+    return True
+
+def cached_until_import(conn, name, compute, *key):
+    """ Like the data_version cache, but only the next import invalidates it (recategorizing does not recompute). """
+    return _cached(conn, name, compute, *key, token=('import', get_import_version(conn)))
+
 # --- Category Functions ---
+@timed
 def get_categories(conn):
     """ Fetches all categories from the database, ordered by name. """
     cursor = conn.cursor()
     results = []
     try:
-        cursor.execute("SELECT id, name FROM categories ORDER BY name")
+        cursor.execute(f"SELECT id, name, {', '.join(CATEGORY_FLAGS)} FROM categories ORDER BY name")
         results = cursor.fetchall()
     except sqlite3.Error as e:
         print(f"DB error fetching categories: {e}")
@@ -36,8 +114,8 @@ def get_categories(conn):
         if cursor: cursor.close()
     return results
 
-def add_category(conn, category_name):
-    """ Adds a new category if it doesn't exist (case-insensitive). Returns ID. """
+def add_category(conn, category_name, commit=True):
+    """ Adds a new category if it doesn't exist (case-insensitive), with DEFAULT_CATEGORY_FLAGS for its name. Returns ID. """
     cat_name = category_name.strip()
     if not cat_name: print("Category name cannot be empty."); return None
     cursor = conn.cursor(); new_id = None
@@ -47,9 +125,8 @@ def add_category(conn, category_name):
         if existing:
             new_id = existing['id']
         else:
-            sql = "INSERT INTO categories (name) VALUES (?)"
-            cursor.execute(sql, (cat_name,))
-            conn.commit()
+            cursor.execute(*category_insert_sql(cat_name)) # 'ATM Fee', 'Returned Purchase'... get their default flags
+            if commit: conn.commit()
             new_id = cursor.lastrowid
             print(f"Category '{cat_name}' added (ID: {new_id}).")
     except sqlite3.Error as e: print(f"DB error adding category '{cat_name}': {e}")
@@ -57,6 +134,32 @@ def add_category(conn, category_name):
         if cursor: cursor.close()
     return new_id
 
+def set_category_flag(conn, category_id, flag, value):
+    """ Sets one of CATEGORY_FLAGS on a category. Returns success. """
+    if flag not in CATEGORY_FLAGS: print(f"Unknown category flag '{flag}'."); return False
+    cursor = conn.cursor(); success = False
+    try:
+        cursor.execute(f"UPDATE categories SET {flag} = ? WHERE id = ?", (int(bool(value)), category_id)); conn.commit(); success = cursor.rowcount > 0
+    except sqlite3.Error as e: print(f"DB error setting {flag} on category {category_id}: {e}")
+    finally:
+        if cursor: cursor.close()
+    return success
+
+@timed
+def update_transaction_categories(conn, assignments, commit=True):
+    """ Applies many (transaction_id, category_id) updates with one executemany. Returns rows updated, or None on error. """
+    rows = [(category_id, transaction_id) for transaction_id, category_id in assignments]
+    if not rows: return 0
+    cursor = conn.cursor(); updated = 0
+    try:
+        cursor.executemany("UPDATE transactions SET category_id = ? WHERE id = ?", rows)
+        updated = cursor.rowcount
+        if commit: conn.commit()
+    except sqlite3.Error as e: print(f"DB error updating {len(rows)} transaction categories: {e}"); conn.rollback(); updated = None
+    finally:
+        if cursor: cursor.close()
+    return updated
+
 def update_transaction_category(conn, transaction_id, category_id):
     """ Updates the category for a single transaction. """
     sql = "UPDATE transactions SET category_id = ? WHERE id = ?"; cursor = conn.cursor(); success = False
@@ -68,28 +171,31 @@ def update_transaction_category(conn, transaction_id, category_id):
     return success
 
 # --- Budget Functions ---
+@timed
 def get_budgets(conn):
     """ Fetches categories with currently set budget limits. Returns list of dicts with Decimals. """
-    sql = "SELECT c.id, c.name, b.monthly_limit FROM categories c JOIN budget_simple b ON c.id = b.category_id ORDER BY c.name;"
+    sql = "SELECT c.id, c.name, c.debt_related, b.monthly_limit FROM categories c JOIN budget_simple b ON c.id = b.category_id ORDER BY c.name;"
     cursor = conn.cursor(); budgets = []
     try:
         cursor.execute(sql)
         for row in cursor.fetchall():
              try: limit = Decimal(str(row['monthly_limit'])).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
              except Exception: limit = Decimal('0.00')
-             budgets.append({'id': row['id'], 'name': row['name'], 'monthly_limit': limit})
+             budgets.append({'id': row['id'], 'name': row['name'], 'monthly_limit': limit, 'debt_related': bool(row['debt_related'])})
     except sqlite3.Error as e: print(f"DB error fetching budgets: {e}")
     except Exception as e: print(f"Error converting budget data: {e}")
     finally:
         if cursor: cursor.close()
     return budgets
 
-def set_budget(conn, category_id, limit_amount):
-    """ Sets or updates a budget limit. Expects Decimal, stores as float. """
+def set_budget(conn, category_id, limit_amount, commit=True):
+    """ Sets or updates a budget limit. Expects Decimal, stores as float. Pass commit=False to join a larger transaction. """
     try: limit = max(0.0, float(Decimal(str(limit_amount)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)))
     except Exception: limit = 0.0
     sql = "INSERT OR REPLACE INTO budget_simple (category_id, monthly_limit) VALUES (?, ?);"; cursor = conn.cursor(); success = False
-    try: cursor.execute(sql, (category_id, limit)); conn.commit(); success = True
+    try:
+        cursor.execute(sql, (category_id, limit)); success = True
+        if commit: conn.commit()
     except sqlite3.Error as e: print(f"DB error set budget cat {category_id}: {e}")
     finally:
         if cursor: cursor.close()
@@ -126,7 +232,24 @@ def get_total_minimum_debt_payments(conn):
     for d in debts: total += d['minimum_payment']
     return total
 
+@timed
+def estimate_monthly_surplus(conn, monthly_income):
+    """ Income minus budgeted expenses and minimum debt payments, without counting debt-category budgets twice. """
+    budgets = get_budgets(conn)
+    total_budgeted = sum((b['monthly_limit'] for b in budgets), Decimal('0.00'))
+    overlapping = [b for b in budgets if b['debt_related']]
+    overlap_total = sum((b['monthly_limit'] for b in overlapping), Decimal('0.00'))
+    adjusted = max(Decimal('0.00'), total_budgeted - overlap_total)
+    total_min_debt = get_total_minimum_debt_payments(conn)
+    return {
+        'income': monthly_income, 'total_budgeted': total_budgeted,
+        'overlapping_budgets': overlapping, 'overlap_total': overlap_total,
+        'adjusted_budgeted': adjusted, 'total_min_debt': total_min_debt,
+        'surplus': monthly_income - adjusted - total_min_debt,
+    }
+
 # --- Debt Functions ---
+@timed
 def get_debts(conn):
     """ Fetches all debt records, converting amounts to Decimal, ordered by name. """
     sql = "SELECT id, name, lender, current_balance, interest_rate, minimum_payment, last_updated FROM debts ORDER BY name;"
@@ -242,20 +365,34 @@ def remove_debt(conn, debt_id):
     return success
 
 # --- Gamification Functions ---
-def add_gamification_points(conn, points_to_add):
-    """ Adds points to the user's score (user_id=1 assumed). """
-    cursor = conn.cursor()
+STREAK_EPOCH = datetime.date(1970, 1, 5) # A Monday: import streaks count consecutive Monday-to-Sunday weeks
+
+def record_points_events(conn, events, commit=True):
+    """
+    Appends (event, points, ref) rows to points_events and adds their sum to the running total in
+    gamification (user_id=1 assumed): one executemany and one UPDATE however many events there are.
+    Pass commit=False to write them with the surrounding work. Returns success.
+    """
+    rows = [(event, int(points), None if ref is None else str(ref)) for event, points, ref in events]
+    if not rows: return True
+    cursor = conn.cursor(); success = False
     try:
-        cursor.execute("INSERT OR IGNORE INTO gamification (user_id, points) VALUES (1, 0)")
-        sql = "UPDATE gamification SET points = points + ? WHERE user_id = ?"
-        cursor.execute(sql, (points_to_add, 1))
-        conn.commit()
-    except sqlite3.Error as e: print(f"DB error adding points: {e}")
+        cursor.executemany("INSERT INTO points_events (event, points, ref) VALUES (?, ?, ?)", rows)
+        cursor.execute("UPDATE gamification SET points = points + ? WHERE user_id = 1", (sum(r[1] for r in rows),))
+        if cursor.rowcount == 0: cursor.execute("INSERT INTO gamification (user_id, points) VALUES (1, ?)", (sum(r[1] for r in rows),))
+        if commit: conn.commit()
+        success = True
+    except sqlite3.Error as e: print(f"DB error recording points: {e}")
     finally:
         if cursor: cursor.close()
+    return success
+
+def add_gamification_points(conn, points_to_add, commit=True, event='bonus', ref=None):
+    """ Records one points event. Pass commit=False to join a larger transaction. """
+    return record_points_events(conn, [(event, points_to_add, ref)], commit)
 
 def get_gamification_points(conn):
-    """ Gets the current points for the user (user_id=1 assumed). """
+    """ Gets the current points total (user_id=1 assumed), kept up to date by record_points_events. """
     cursor = conn.cursor(); points = 0
     try:
         cursor.execute("SELECT points FROM gamification WHERE user_id = ?", (1,))
@@ -265,44 +402,331 @@ def get_gamification_points(conn):
         if cursor: cursor.close()
     return points
 
+def get_upload_streak(conn, today=None):
+    """
+    Returns (streak, last upload date): consecutive weeks with at least one import, counted back from
+    the latest one, from the import events in one gaps-and-islands query. A streak survives until a whole
+    week passes without an import, so it is 0 once the latest import is older than last week.
+    """
+    sql = """
+        WITH imports AS (
+            SELECT date(created_at) AS day, CAST((julianday(date(created_at)) - julianday(?)) / 7 AS INTEGER) AS week
+            FROM points_events WHERE event = 'import'
+        ),
+        runs AS (SELECT week, week - ROW_NUMBER() OVER (ORDER BY week) AS run FROM (SELECT DISTINCT week FROM imports))
+        SELECT (SELECT MAX(day) FROM imports) AS last_day, MAX(week) AS last_week, COUNT(*) AS weeks
+        FROM runs WHERE run = (SELECT run FROM runs ORDER BY week DESC LIMIT 1);
+    """
+    cursor = conn.cursor(); streak, last_day = 0, None
+    try:
+        cursor.execute(sql, (STREAK_EPOCH.isoformat(),)); row = cursor.fetchone()
+        if row and row['last_week'] is not None:
+            this_week = ((today or datetime.date.today()) - STREAK_EPOCH).days // 7
+            last_day = row['last_day']; streak = row['weeks'] if row['last_week'] >= this_week - 1 else 0
+    except sqlite3.Error as e: print(f"DB error computing upload streak: {e}")
+    finally:
+        if cursor: cursor.close()
+    return streak, last_day
+
+def _record_import_event(conn, version):
+    """ Logs the import in points_events and refreshes the streak columns, in one transaction. """
+    if not record_points_events(conn, [('import', 0, f"import {version}")], commit=False): conn.rollback(); return
+    streak, last_day = get_upload_streak(conn)
+    cursor = conn.cursor()
+    try: cursor.execute("UPDATE gamification SET last_upload_date = ?, upload_streak = ? WHERE user_id = 1", (last_day, streak)); conn.commit()
+    except sqlite3.Error as e: print(f"DB error updating upload streak: {e}"); conn.rollback()
+    finally: cursor.close()
+
+# --- Dashboard Snapshot ---
+def _month_bounds(year, month):
+    """ Returns ('YYYY-MM-01', first day of next month) for index-friendly date range filters. """
+    start = datetime.date(year, month, 1)
+    end = datetime.date(year + (month == 12), month % 12 + 1, 1)
+    return start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+
+def _query_dashboard_snapshot(conn, year, month):
+    """ Computes every headline dashboard figure in a single statement (one consistent read). """
+    sql = """
+        WITH month_tx AS (
+            SELECT t.amount, t.is_income, t.category_id, COALESCE(c.exclude_income, 0) AS exclude_income, COALESCE(c.exclude_spending, 0) AS exclude_spending
+            FROM transactions t LEFT JOIN categories c ON c.id = t.category_id
+            WHERE t.transaction_date >= ? AND t.transaction_date < ?
+        )
+        SELECT
+            (SELECT TOTAL(amount) FROM month_tx WHERE is_income = 1 AND exclude_income = 0) AS income,
+            (SELECT TOTAL(amount) FROM month_tx WHERE is_income = 0 AND category_id IS NOT NULL AND exclude_spending = 0) AS spending,
+            (SELECT TOTAL(b.monthly_limit) FROM budget_simple b JOIN categories c ON c.id = b.category_id) AS budget_total,
+            (SELECT TOTAL(b.monthly_limit) FROM budget_simple b JOIN categories c ON c.id = b.category_id WHERE c.debt_related = 1) AS debt_budget_overlap,
+            (SELECT TOTAL(CAST(current_balance AS REAL)) FROM debts) AS debt_total,
+            (SELECT TOTAL(CAST(minimum_payment AS REAL)) FROM debts) AS min_debt_total,
+            (SELECT points FROM gamification WHERE user_id = 1 LIMIT 1) AS points;
+    """
+    cursor = conn.cursor(); snapshot = None
+    try:
+        cursor.execute(sql, _month_bounds(year, month))
+        row = cursor.fetchone()
+        q = lambda v: Decimal(str(v)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        snapshot = {k: q(row[k]) for k in ('income', 'spending', 'budget_total', 'debt_budget_overlap', 'debt_total', 'min_debt_total')}
+        snapshot['points'] = row['points'] or 0
+        snapshot['cash_flow'] = snapshot['income'] - snapshot['spending']
+        snapshot['budget_remaining'] = snapshot['budget_total'] - snapshot['spending']
+        snapshot['year'], snapshot['month'] = year, month
+    except sqlite3.Error as e: print(f"DB error loading dashboard snapshot: {e}")
+    finally:
+        if cursor: cursor.close()
+    return snapshot
+
+@timed
+def get_dashboard_snapshot(conn, year=None, month=None):
+    """
+    Returns the dashboard's headline figures (Decimals) for a month, defaulting to the current one.
+    The result is cached per connection and reused until PRAGMA data_version (or this
+    connection's own change count) shows a write, so repeated refreshes are nearly free.
+    """
+    if year is None or month is None:
+        today = datetime.date.today(); year, month = today.year, today.month
+    return _cached(conn, 'dashboard', lambda: _query_dashboard_snapshot(conn, year, month), (year, month))
+
 # --- Transaction / Spending / Analysis Functions ---
+def _columnar(conn):
+    """ The synced in-memory columnar store when it is enabled (see columnar_cache), else None. """
+    return columnar_cache.get_store(conn) if columnar_cache.is_enabled() else None
+
+def _cents(value):
+    return (Decimal(int(value)) / 100).quantize(Decimal('0.01'))
+
+def _month_key(number):
+    """ 'YYYY-MM' for a columnar_cache month number. """
+    return f"{1970 + number // 12:04d}-{number % 12 + 1:02d}"
+
+@timed
 def get_spending_for_month(conn, year, month):
     """ Calculates total spending per category (as Decimal) for a given month/year, excluding certain types. """
-    m_str = f"{year:04d}-{month:02d}"; exclude = ('transfer', 'credit card payment', 'income', 'paycheck', 'returned purchase', 'gifts & donations', 'atm fee'); ph = ','.join('?'*len(exclude)); cursor = conn.cursor(); results = {}
+    store = _columnar(conn)
+    if store is not None:
+        epoch = datetime.date(1970, 1, 1); start, end = ((datetime.date.fromisoformat(d) - epoch).days for d in _month_bounds(year, month))
+        return {cid: _cents(c) for cid, c in store.totals_by_category(start, end, store.spending_ids).items()}
+    m_str = f"{year:04d}-{month:02d}"; cursor = conn.cursor(); results = {}
     try:
-        cursor.execute(f"SELECT id FROM categories WHERE LOWER(name) IN ({ph})", exclude); ex_ids = {r['id'] for r in cursor.fetchall()}
-        id_placeholders = ','.join('?'*len(ex_ids)); not_in_clause = f"AND t.category_id NOT IN ({id_placeholders})" if ex_ids else ""
-        sql = f"SELECT t.category_id, SUM(t.amount) total FROM transactions t WHERE t.is_income=0 AND strftime('%Y-%m', t.transaction_date)=? AND t.category_id IS NOT NULL {not_in_clause} GROUP BY t.category_id;"
-        cursor.execute(sql, (m_str, *tuple(ex_ids)));
+        sql = f"SELECT t.category_id, SUM(t.amount) total FROM transactions t JOIN categories c ON c.id = t.category_id WHERE t.is_income=0 AND t.transaction_date >= ? AND t.transaction_date < ? AND {SPENDING_FILTER} GROUP BY t.category_id;"
+        cursor.execute(sql, _month_bounds(year, month));
         results = {r['category_id']: Decimal(str(r['total'])).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) for r in cursor.fetchall()}
     except sqlite3.Error as e: print(f"DB error get spending {m_str}: {e}")
     finally:
         if cursor: cursor.close()
     return results
 
-def calculate_average_monthly_spend(conn):
-    """ Calculates average monthly spending (as Decimal) for eligible categories. """
-    print("\nCalculating average spending..."); cursor = conn.cursor(); avgs = None
+def month_keys(months, end_year=None, end_month=None):
+    """ The `months` 'YYYY-MM' keys ending at end_year/end_month (default: current month), oldest first. """
+    if end_year is None or end_month is None:
+        today = datetime.date.today(); end_year, end_month = today.year, today.month
+    index = end_year * 12 + end_month - 1
+    return [f"{i // 12:04d}-{i % 12 + 1:02d}" for i in range(index - months + 1, index + 1)]
+
+@timed
+def get_spending_matrix(conn, months=12, end_year=None, end_month=None):
+    """
+    Spending per category per month over a range of months, from one grouped query
+    (a single pass over the date index). Excludes the same categories as the spending summary.
+    Returns {'months': ['YYYY-MM', ...], 'totals': {category_id: [Decimal per month]}}, or None on error.
+    """
+    keys = month_keys(months, end_year, end_month)
+    first_y, first_m = map(int, keys[0].split('-')); last_y, last_m = map(int, keys[-1].split('-'))
+    store = _columnar(conn)
+    if store is not None:
+        first = columnar_cache.month_number(first_y, first_m)
+        ids, matrix = store.totals_by_period(list(range(first, first + len(keys) + 1)), store.report_ids)
+        return {'months': keys, 'totals': {cid: [_cents(c) for c in row] for cid, row in zip(ids, matrix)}}
+    sql = f"""
+        SELECT t.category_id, substr(t.transaction_date, 1, 7) AS month, SUM(t.amount) AS total
+        FROM transactions t JOIN categories c ON c.id = t.category_id
+        WHERE t.is_income = 0 AND t.transaction_date >= ? AND t.transaction_date < ? AND {REPORT_FILTER}
+        GROUP BY t.category_id, month;
+    """
+    cursor = conn.cursor(); position = {k: i for i, k in enumerate(keys)}; totals = {}
+    try:
+        cursor.execute(sql, (_month_bounds(first_y, first_m)[0], _month_bounds(last_y, last_m)[1]))
+        for r in cursor.fetchall():
+            row = totals.setdefault(r['category_id'], [Decimal('0.00')] * len(keys))
+            row[position[r['month']]] = Decimal(str(r['total'])).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    except sqlite3.Error as e: print(f"DB error building spending matrix: {e}"); return None
+    finally:
+        if cursor: cursor.close()
+    return {'months': keys, 'totals': totals}
+
+# Estimators offered for auto-budgets: name -> description
+AVERAGE_ESTIMATORS = {
+    'all': "Mean over all history (total / months spanned)",
+    'trailing': "Mean of the last N complete months",
+    'ewma': "Exponentially weighted mean of the last N complete months (recent months count most)",
+    'median': "Median of the last N complete months",
+    'trimmed': "Trimmed mean of the last N complete months (drops the highest and lowest months)",
+}
+DEFAULT_AVERAGE_MONTHS = 12
+TRIM_SHARE = 0.1    # Share of months dropped at each end by the trimmed mean (at least one once there are 5 months)
+
+def _query_category_month_totals(conn, start=None, end=None):
+    """ One grouped pass: {category_id: {'YYYY-MM': float}} for eligible spending categories in [start, end) (month-aligned dates). """
+    store = _columnar(conn)
+    if store is not None:
+        number = lambda d: columnar_cache.month_number(int(d[:4]), int(d[5:7]))
+        if not len(store.month): return {}
+        first = number(start) if start else int(store.month.min()); stop = number(end) if end else int(store.month.max()) + 1
+        ids, matrix = store.totals_by_period(list(range(first, stop + 1)), store.report_ids)
+        return {cid: {_month_key(first + j): c / 100 for j, c in enumerate(row) if c} for cid, row in zip(ids, matrix)}
+    where, params = "", []
+    if start: where += " AND t.transaction_date >= ?"; params.append(start)
+    if end: where += " AND t.transaction_date < ?"; params.append(end)
+    sql = f"""
+        SELECT t.category_id, substr(t.transaction_date, 1, 7) AS month, SUM(t.amount) AS total
+        FROM transactions t JOIN categories c ON c.id = t.category_id
+        WHERE t.is_income = 0{where} AND {REPORT_FILTER}
+        GROUP BY t.category_id, month;
+    """
+    cursor = conn.cursor(); totals = {}
     try:
-        cursor.execute("SELECT MIN(transaction_date), MAX(transaction_date) FROM transactions WHERE is_income = 0"); r = cursor.fetchone()
-        if not r or not r[0] or not r[1]: print("No expense data found."); cursor.close(); return None
-        min_d = datetime.datetime.strptime(r[0], '%Y-%m-%d').date(); max_d = datetime.datetime.strptime(r[1], '%Y-%m-%d').date(); delta = relativedelta(max_d.replace(day=1), min_d.replace(day=1)); months = max(1, delta.years*12 + delta.months + 1)
-        print(f"Data spans {r[0]} to {r[1]} ({months} months)."); exclude = ('transfer', 'credit card payment', 'income', 'uncategorized', 'paycheck', 'returned purchase', 'gifts & donations', 'atm fee'); ph = ','.join('?'*len(exclude)); cursor.execute(f"SELECT id FROM categories WHERE LOWER(name) IN ({ph})", exclude); ex_ids = {row['id'] for row in cursor.fetchall()}; print(f"Excluding IDs: {ex_ids}")
-        id_placeholders = ','.join('?'*len(ex_ids)); not_in_clause = f"AND category_id NOT IN ({id_placeholders})" if ex_ids else ""
-        sql = f"SELECT category_id, SUM(amount) as total FROM transactions WHERE is_income=0 AND category_id IS NOT NULL {not_in_clause} GROUP BY category_id;"
-        cursor.execute(sql, tuple(ex_ids)); totals = cursor.fetchall();
-        if not totals: print("No categorized expense data found (excluding specified categories)."); cursor.close(); return {}
-        avgs = {}; print("\nAverage Monthly Spend:"); cats = {c['id']: c['name'] for c in get_categories(conn)} # Uses get_categories own cursor handling
-        for row in totals:
-            try: avg = (Decimal(str(row['total'])) / Decimal(months)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP); avgs[row['category_id']] = avg; category_name = cats.get(row['category_id'], f"ID {row['category_id']}"); print(f"  - {category_name}: ${avg:.2f}")
-            except Exception as calc_e: print(f"Error calculating average for category ID {row.get('category_id', 'N/A')}: {calc_e}")
-    except Exception as e: print(f"Error during average calculation setup: {e}"); avgs = None
+        cursor.execute(sql, params)
+        for r in cursor.fetchall(): totals.setdefault(r['category_id'], {})[r['month']] = r['total']
     finally:
         if cursor: cursor.close()
+    return totals
+
+def _estimate(values, estimator):
+    """ Applies estimator to one category's monthly totals, oldest first (months without spending are 0). """
+    if estimator == 'median': return statistics.median(values)
+    if estimator == 'trimmed':
+        k = max(int(len(values) * TRIM_SHARE), 1 if len(values) >= 5 else 0)
+        kept = sorted(values)[k:len(values) - k]
+        return sum(kept) / len(kept)
+    if estimator == 'ewma':
+        alpha = 2 / (len(values) + 1) # Same span as the trailing mean
+        weights = [(1 - alpha) ** age for age in range(len(values) - 1, -1, -1)]
+        return sum(w * v for w, v in zip(weights, values)) / sum(weights)
+    return sum(values) / len(values)
+
+def _expense_month_range(conn):
+    """ First and last 'YYYY-MM' with any expense, in any category (the span the all-history mean divides by), or None. """
+    store = _columnar(conn)
+    if store is not None:
+        months = store.month[~store.income]
+        return (_month_key(int(months.min())), _month_key(int(months.max()))) if len(months) else None
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT substr(MIN(transaction_date), 1, 7), substr(MAX(transaction_date), 1, 7) FROM transactions WHERE is_income = 0")
+        r = cursor.fetchone()
+        return (r[0], r[1]) if r and r[0] else None
+    finally:
+        cursor.close()
+
+def _compute_average_spend(conn, estimator, months, today):
+    """ Returns (first month, last month, months used, {category_id: Decimal}); None when there is no expense data. """
+    if estimator == 'all':
+        # Total / months from the first to the last expense of any kind, summed as Decimal, as before the estimators existed
+        months_range = _expense_month_range(conn)
+        totals = _query_category_month_totals(conn) if months_range else {}
+        if not totals: return None
+        (fy, fm), (ly, lm) = (map(int, m.split('-')) for m in months_range)
+        span = month_keys(ly * 12 + lm - fy * 12 - fm + 1, ly, lm)
+        avgs = {cid: (sum((Decimal(str(v)) for v in by_month.values()), Decimal('0')) / Decimal(len(span))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+                for cid, by_month in totals.items()}
+        return span[0], span[-1], len(span), avgs
+    this_month = today.replace(day=1); last_complete = this_month - datetime.timedelta(days=1)
+    span = month_keys(months, last_complete.year, last_complete.month) # The current month is partial, so it is left out
+    totals = _query_category_month_totals(conn, span[0] + '-01', this_month.strftime('%Y-%m-%d'))
+    if not totals: return None
+    avgs = {}
+    for cid, by_month in totals.items():
+        avg = _estimate([by_month.get(m, 0.0) for m in span], estimator)
+        avgs[cid] = Decimal(str(avg)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    return span[0], span[-1], len(span), avgs
+
+@timed
+def calculate_average_monthly_spend(conn, estimator='all', months=DEFAULT_AVERAGE_MONTHS):
+    """
+    Calculates average monthly spending (as Decimal) for eligible categories using one of AVERAGE_ESTIMATORS.
+    All estimators but 'all' use the last `months` complete months. Cached until the data changes.
+    Returns {category_id: Decimal}, {} when there is no eligible spending, or None on error.
+    """
+    if estimator not in AVERAGE_ESTIMATORS: print(f"Unknown estimator '{estimator}'."); return None
+    print(f"\nCalculating average spending ({estimator})...")
+    today = datetime.date.today()
+    try: result = _cached(conn, 'average_spend', lambda: _compute_average_spend(conn, estimator, months, today), estimator, months, today)
+    except (sqlite3.Error, ArithmeticError) as e: print(f"Error during average calculation: {e}"); return None
+    if result is None: print("No categorized expense data found (excluding specified categories)."); return {}
+    first, last, n_months, avgs = result
+    print(f"Using {first} to {last} ({n_months} months)."); cats = {c['id']: c['name'] for c in get_categories(conn)}
+    print("\nAverage Monthly Spend:")
+    for cid, avg in sorted(avgs.items(), key=lambda kv: cats.get(kv[0], "")): print(f"  - {cats.get(cid, f'ID {cid}')}: ${avg:.2f}")
     return avgs
 
+# --- Income Analytics ---
+def _query_monthly_income_totals(conn):
+    """ Runs the grouped income rollup. Returns {'YYYY-MM': Decimal} ordered by month. """
+    sql = """
+        SELECT strftime('%Y-%m', t.transaction_date) AS month, SUM(t.amount) AS total
+        FROM transactions t LEFT JOIN categories c ON c.id = t.category_id
+        WHERE t.is_income = 1 AND COALESCE(c.exclude_income, 0) = 0
+        GROUP BY month ORDER BY month;
+    """
+    cursor = conn.cursor(); totals = {}
+    try:
+        cursor.execute(sql)
+        totals = {r['month']: Decimal(str(r['total'])).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) for r in cursor.fetchall() if r['month']}
+    except sqlite3.Error as e: print(f"DB error fetching monthly income: {e}")
+    finally:
+        if cursor: cursor.close()
+    return totals
+
+@timed
+def get_monthly_income_totals(conn):
+    """ Returns total income per month as {'YYYY-MM': Decimal}, cached until the data or month changes. """
+    today = datetime.date.today()
+    return _cached(conn, 'monthly_income', lambda: _query_monthly_income_totals(conn), (today.year, today.month))
+
+def get_income_total_for_month(conn, year, month):
+    """ Returns total income (as Decimal) for a given month/year. """
+    return get_monthly_income_totals(conn).get(f"{year:04d}-{month:02d}", Decimal('0.00'))
+
+@timed
+def get_income_stats(conn, months=6, as_of=None):
+    """
+    Summarizes income over the trailing `months` complete months before as_of (default today).
+    Months without income inside the window count as zero, but months before the first
+    recorded income are left out. Returns a dict with Decimals, or None if there is no history.
+    """
+    as_of = as_of or datetime.date.today()
+    totals = get_monthly_income_totals(conn)
+    if not totals: return None
+    first_month = next(iter(totals))
+    window = []
+    year, month = as_of.year, as_of.month
+    for _ in range(max(1, months)):
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+        m_str = f"{year:04d}-{month:02d}"
+        if m_str < first_month: break
+        window.append(m_str)
+    window.reverse()
+    if not window: return None
+    values = [totals.get(m, Decimal('0.00')) for m in window]
+    q = lambda v: Decimal(v).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    return {
+        'months': window,
+        'monthly_totals': values,
+        'average': q(sum(values) / len(values)),
+        'median': q(statistics.median(values)),
+        'volatility': q(statistics.pstdev(values)) if len(values) > 1 else Decimal('0.00'),
+        'minimum': min(values),
+        'current_month': totals.get(f"{as_of.year:04d}-{as_of.month:02d}", Decimal('0.00')),
+        'last_income_month': next(reversed(totals)),
+    }
+
+@timed
 def get_min_monthly_spend(conn, category_id):
     """ Finds the minimum non-zero monthly spending sum (as Decimal) for a given category ID. """
+    store = _columnar(conn)
+    if store is not None:
+        cents = store.min_month_total(category_id)
+        return _cents(cents) if cents is not None else Decimal('0.00')
     sql = "SELECT SUM(amount) as total FROM transactions WHERE category_id=? AND is_income=0 AND amount>0 GROUP BY strftime('%Y-%m', transaction_date) HAVING total > 0 ORDER BY total ASC LIMIT 1;"
     cursor = conn.cursor(); min_spend = None
     try:
@@ -334,6 +758,7 @@ def get_one_uncategorized_transaction(conn):
         if cursor: cursor.close()
     return result # Returns Row or None
 
+@timed
 def find_category_id_by_name(conn, category_name):
     """ Helper to find category ID by name (case-insensitive). """
     cursor = conn.cursor()
@@ -385,6 +810,82 @@ def get_next_uncategorized_transaction(conn, exclude_ids=None):
 
 # --- END OF FUNCTION TO ADD ---
 
+@timed
+def get_uncategorized_batch(conn, after=None, limit=50):
+    """
+    Keyset page of uncategorized transactions ordered by (transaction_date, id).
+    Pass the (transaction_date, id) of the last row seen as `after` to get the next page.
+    """
+    sql = """
+        SELECT id, transaction_date, description, amount, is_income
+        FROM transactions
+        WHERE category_id IS NULL AND (transaction_date, id) > (?, ?)
+        ORDER BY transaction_date, id
+        LIMIT ?;
+    """
+    after_date, after_id = after if after else ('', 0)
+    cursor = conn.cursor(); rows = []
+    try:
+        cursor.execute(sql, (after_date, after_id, limit))
+        rows = cursor.fetchall()
+    except sqlite3.Error as e:
+        print(f"DB error fetching uncategorized batch: {e}")
+    finally:
+        if cursor: cursor.close()
+    return rows
+
+# --- Transaction Browsing ---
+# Sortable columns for get_transactions_page; each tuple matches an index whose implicit rowid suffix gives (columns..., id) order
+# (amount ties break on date, so the duplicate detector's (amount, transaction_date) index serves the browser too)
+TRANSACTION_SORT_COLUMNS = {'date': ('t.transaction_date',), 'description': ('t.description',), 'amount': ('t.amount', 't.transaction_date'), 'id': ('t.id',)}
+
+@timed
+def get_transactions_page(conn, sort='date', descending=True, after=None, before=None, limit=200, filters=None):
+    """
+    One keyset page of transactions joined with category names, for the transaction browser.
+    `after` / `before` take the transaction_sort_key of the last / first row already shown and
+    return the page that follows / precedes it, always in display order. Supported filters:
+    text (description substring), category_id (None = any, 0 = uncategorized), date_from,
+    date_to (inclusive 'YYYY-MM-DD') and is_income (0/1).
+    """
+    key_cols = (*TRANSACTION_SORT_COLUMNS.get(sort, TRANSACTION_SORT_COLUMNS['date']), 't.id')
+    filters = filters or {}
+    where, params = [], []
+    if filters.get('text'): where.append("t.description LIKE ? ESCAPE '\\'"); params.append('%' + filters['text'].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+    if filters.get('category_id') == 0: where.append("t.category_id IS NULL")
+    elif filters.get('category_id') is not None: where.append("t.category_id = ?"); params.append(filters['category_id'])
+    if filters.get('date_from'): where.append("t.transaction_date >= ?"); params.append(filters['date_from'])
+    if filters.get('date_to'): where.append("t.transaction_date <= ?"); params.append(filters['date_to'])
+    if filters.get('is_income') is not None: where.append("t.is_income = ?"); params.append(int(filters['is_income']))
+
+    backwards = before is not None # Walk the opposite way, then flip the page back into display order
+    key = before if backwards else after
+    forward_desc = descending != backwards
+    if key is not None:
+        where.append(f"({', '.join(key_cols)}) {'<' if forward_desc else '>'} ({', '.join('?' * len(key_cols))})"); params.extend(key)
+    direction = 'DESC' if forward_desc else 'ASC'
+    sql = f"""
+        SELECT t.id, t.transaction_date, t.description, t.amount, t.is_income, t.category_id, c.name AS category_name
+        FROM transactions t LEFT JOIN categories c ON c.id = t.category_id
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY {', '.join(f'{c} {direction}' for c in key_cols)}
+        LIMIT ?;
+    """
+    cursor = conn.cursor(); rows = []
+    try:
+        cursor.execute(sql, (*params, limit))
+        rows = cursor.fetchall()
+    except sqlite3.Error as e:
+        print(f"DB error fetching transactions page: {e}")
+    finally:
+        if cursor: cursor.close()
+    if backwards: rows.reverse()
+    return rows
+
+def transaction_sort_key(row, sort='date'):
+    """ The (sort values..., id) keyset key of a row returned by get_transactions_page. """
+    return (*(row[c.split('.', 1)[1]] for c in TRANSACTION_SORT_COLUMNS.get(sort, TRANSACTION_SORT_COLUMNS['date'])), row['id'])
+
 # --- ADD THESE FUNCTIONS to db_utils.py ---
 
 def get_setting(conn, key, default=None):
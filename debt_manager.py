@@ -6,48 +6,42 @@ import sqlite3 # For exception handling if needed
 import datetime
 from decimal import Decimal, ROUND_HALF_UP
 # Import necessary functions from db_utils
-from db_utils import get_debts, add_debt, update_debt_details, remove_debt, get_budgets, get_categories, get_total_budgeted_expenses, get_total_minimum_debt_payments
+from db_utils import get_debts, add_debt, update_debt_details, remove_debt, get_income_stats, get_setting, estimate_monthly_surplus
 # Import input helpers
-from utils import get_string_input, get_decimal_input # Use Decimal input helper
+from utils import get_string_input, get_decimal_input, parse_decimal # Use Decimal input helper
+from profiling import timed
 
 ZERO_THRESHOLD = Decimal('0.005')
+INCOME_WINDOW_MONTHS = 6 # Trailing complete months used to derive income
 
 # --- Affordability Check ---
+@timed
 def check_debt_strategy_affordability(conn):
     """ Calculates potential surplus for extra debt payments after accounting for overlaps. """
     print("\n--- Debt Strategy Affordability Check ---")
 
-    est_monthly_income = get_decimal_input("Enter your ESTIMATED average monthly income (after tax): $")
-    total_budgeted = get_total_budgeted_expenses(conn) # From db_utils
+    est_monthly_income = get_history_income_estimate(conn)
+    totals = estimate_monthly_surplus(conn, est_monthly_income) # From db_utils
+    total_budgeted = totals['total_budgeted']
     print(f"Total Budgeted Expenses (sum of all limits): ${total_budgeted:.2f}")
-    total_min_debt_pmt = get_total_minimum_debt_payments(conn) # From db_utils
+    total_min_debt_pmt = totals['total_min_debt']
     print(f"Total Minimum Debt Payments (from Debts list): ${total_min_debt_pmt:.2f}")
 
     # Identify overlap
-    debt_related_category_names_lower = {'credit card payment', 'auto payment', 'student loan payment', 'financial'}
-    all_budgets = get_budgets(conn)
-    overlapping_budget_sum = Decimal('0.00')
     print("Checking for budget overlaps with minimum debt payments...")
-
-    overlapping_cats_found = []
-    for budget_item in all_budgets:
-        if budget_item['name'].lower() in debt_related_category_names_lower:
-            overlap_amount = budget_item['monthly_limit']
-            overlapping_budget_sum += overlap_amount
-            overlapping_cats_found.append(f"{budget_item['name']} (${overlap_amount:.2f})")
-
+    overlapping_cats_found = [f"{b['name']} (${b['monthly_limit']:.2f})" for b in totals['overlapping_budgets']]
     if overlapping_cats_found:
         print(f" -> Found budget limits for debt-related categories: {', '.join(overlapping_cats_found)}")
-        print(f" -> Subtracting this overlapping total (${overlapping_budget_sum:.2f}) from general budgeted expenses.")
+        print(f" -> Subtracting this overlapping total (${totals['overlap_total']:.2f}) from general budgeted expenses.")
     else:
         print(" -> No overlapping budget categories found for adjustment.")
 
-    # Calculate adjusted expenses and surplus
-    adjusted_budgeted_expenses = max(Decimal('0.00'), total_budgeted - overlapping_budget_sum)
-    surplus = est_monthly_income - adjusted_budgeted_expenses - total_min_debt_pmt
+    # Adjusted expenses and surplus
+    adjusted_budgeted_expenses = totals['adjusted_budgeted']
+    surplus = totals['surplus']
 
     print("-" * 40)
-    print(f"Estimated Monthly Income:      ${est_monthly_income:.2f}")
+    print(f"Monthly Income (derived):      ${est_monthly_income:.2f}")
     print(f"Adjusted Budgeted Expenses:    -${adjusted_budgeted_expenses:.2f}")
     print(f"Total Minimum Debt Payments: -${total_min_debt_pmt:.2f}")
     print("----------------------------------------")
@@ -63,8 +57,39 @@ def check_debt_strategy_affordability(conn):
         print("before planning accelerated debt payments.")
     print("-" * 40)
 
+    if surplus > ZERO_THRESHOLD and total_min_debt_pmt > ZERO_THRESHOLD:
+        if input("Run Monte Carlo payoff risk using this surplus as extra payment? (y/n): ").strip().lower() == 'y':
+            run_monte_carlo_risk(conn, default_payment=total_min_debt_pmt + surplus)
+
+
+@timed
+def get_history_income_estimate(conn):
+    """ Derives monthly income from transaction history, letting the user accept or override it. """
+    stats = get_income_stats(conn, months=INCOME_WINDOW_MONTHS)
+    if stats and any(v > ZERO_THRESHOLD for v in stats['monthly_totals']):
+        print(f"Income over the last {len(stats['months'])} complete months ({stats['months'][0]} to {stats['months'][-1]}):")
+        print(f"  Average: ${stats['average']:.2f} | Median: ${stats['median']:.2f} | Lowest: ${stats['minimum']:.2f} | Volatility (std dev): ${stats['volatility']:.2f}")
+        if stats['volatility'] > stats['median'] / 4:
+            print("  Note: income varies a lot month to month; consider planning around the lowest month.")
+        default = stats['median']
+        print(f"Using median monthly income: ${default:.2f}")
+    else:
+        if stats: print(f"No income recorded in the last {INCOME_WINDOW_MONTHS} months (latest income: {stats['last_income_month']}).")
+        else: print("No income history found.")
+        default = parse_decimal(get_setting(conn, 'monthly_income_estimate') or '')
+        if default is None:
+            return get_decimal_input("Enter your ESTIMATED average monthly income (after tax): $")
+        print(f"Using saved income estimate: ${default:.2f}")
+    override = input("Press Enter to accept, or type a different monthly income: $").strip()
+    value = parse_decimal(override, default)
+    if value is None or value < 0:
+        print("Invalid amount, keeping the derived income.")
+        value = default
+    return value
+
 
 # --- Debt Payoff Simulation ---
+@timed
 def simulate_payoff(conn, strategy, total_monthly_payment):
     """ Simulates debt payoff using Snowball or Avalanche method. """
     total_monthly_payment = Decimal(str(total_monthly_payment)) # Ensure Decimal
@@ -180,6 +205,7 @@ def display_payoff_schedule(schedule, summary_stats, debts_info):
         print("-" * 78)
 
 # --- REWRITTEN show_debt_payoff_strategies_and_schedule function ---
+@timed
 def show_debt_payoff_strategies_and_schedule(conn):
     """ UI Wrapper for showing strategies AND simulating payoff """
     print("\n--- Debt Payoff Strategy Planner ---")
@@ -256,6 +282,51 @@ def show_debt_payoff_strategies_and_schedule(conn):
 # --- END REWRITTEN show_debt_payoff_strategies_and_schedule function ---
 
 
+# --- Monte Carlo Payoff Risk ---
+@timed
+def run_monte_carlo_risk(conn, default_payment=None):
+    """ UI wrapper for the Monte Carlo payoff risk engine. """
+    from payoff_monte_carlo import simulate_payoff_monte_carlo, display_monte_carlo_results, DEFAULT_PATHS, DEFAULT_SEED # Loads NumPy
+    print("\n--- Monte Carlo Payoff Risk ---")
+    debts = get_debts(conn)
+    if not debts:
+        print("No debts entered yet.")
+        return
+
+    total_min_payment = sum(d['minimum_payment'] for d in debts)
+    if default_payment is None:
+        default_payment = total_min_payment
+    print(f"Total Minimum Monthly Payment: ${total_min_payment:.2f}")
+
+    strategy = input("Strategy [snowball/avalanche] (Enter for avalanche): ").strip().lower() or 'avalanche'
+    if strategy not in ('snowball', 'avalanche'):
+        print("Invalid strategy.")
+        return
+    payment_str = input(f"Total monthly payment (Enter for ${default_payment:.2f}): $").strip()
+    total_payment = parse_decimal(payment_str, default_payment)
+    if total_payment is None or total_payment < total_min_payment:
+        print(f"Planned payment must be >= total minimums (${total_min_payment:.2f}).")
+        return
+    paths_str = input(f"Number of paths (Enter for {DEFAULT_PATHS}): ").strip()
+    seed_str = input(f"Random seed (Enter for {DEFAULT_SEED}): ").strip()
+    try:
+        n_paths = int(paths_str) if paths_str else DEFAULT_PATHS
+        seed = int(seed_str) if seed_str else DEFAULT_SEED
+    except ValueError:
+        print("Invalid number.")
+        return
+    if n_paths < 1:
+        print("Number of paths must be positive.")
+        return
+
+    print(f"\nSimulating {n_paths:,} {strategy.title()} paths with ${total_payment:.2f} monthly...")
+    results = simulate_payoff_monte_carlo(conn, strategy, total_payment, n_paths=n_paths, seed=seed)
+    if results:
+        display_monte_carlo_results(results)
+    else:
+        print("Simulation failed or generated no results.")
+
+
 # --- Main Debt Menu ---
 def manage_debts_menu(conn):
     """ UI for managing debt entries and viewing strategies/schedules. """
@@ -266,7 +337,7 @@ def manage_debts_menu(conn):
             print(" ID | {:<25} | {:<15} | {:>13} | {:>7} | {:>13} | {}".format("Name","Lender","Balance","Rate %","Min Payment","Last Updated")); print("-" * 98)
             for d in debts: print("{:3} | {:<25} | {:<15} | ${:>12.2f} | {:>6.2f}% | ${:>12.2f} | {}".format(d['id'],d['name'],d['lender'] or "N/A",d['current_balance'],d['interest_rate'],d['minimum_payment'],d['last_updated'])); print("-" * 98)
         else: print("No debts entered yet.")
-        print("\nOptions: [a] Add | [u] Update | [r] Remove | [s] Plan Payoff Strategy/Schedule | [c] Check Affordability | [b] Back"); choice = input("Choice: ").strip().lower()
+        print("\nOptions: [a] Add | [u] Update | [r] Remove | [s] Plan Payoff Strategy/Schedule | [m] Monte Carlo Risk | [c] Check Affordability | [b] Back"); choice = input("Choice: ").strip().lower()
 
         if choice == 'b': break
         elif choice == 'a':
@@ -296,6 +367,8 @@ def manage_debts_menu(conn):
             except ValueError: print("Invalid ID format.")
         elif choice == 's':
             show_debt_payoff_strategies_and_schedule(conn) # Call corrected function
+        elif choice == 'm':
+            run_monte_carlo_risk(conn)
         elif choice == 'c':
             check_debt_strategy_affordability(conn)
         else: print("Invalid choice.")
\ No newline at end of file
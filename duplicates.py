@@ -0,0 +1,169 @@
+# duplicates.py
+# Cross-source near-duplicate detection and the review queue
+# Candidates are blocked by exact amount and a +/- N day window through the
+# (amount, transaction_date) index, then scored by normalized description similarity
+
+import difflib
+import re
+import sqlite3
+from db_utils import get_setting, set_setting
+from profiling import timed
+
+DEFAULT_WINDOW_DAYS = 3
+MIN_SCORE = 0.6         # Pairs scoring below this are not queued
+DAY_PENALTY = 0.05      # Subtracted from the similarity per day between the two dates
+REVIEW_PAGE = 20
+
+# Words card and bank exports add around the merchant name
+NOISE_WORDS = {'POS', 'PURCHASE', 'DEBIT', 'CREDIT', 'CARD', 'CHECKCARD', 'VISA', 'MASTERCARD', 'ACH', 'ONLINE', 'PAYMENT',
+               'RECURRING', 'PENDING', 'WITHDRAWAL', 'TRANSACTION', 'AUTH', 'PREAUTHORIZED', 'ELECTRONIC', 'THE', 'INC', 'LLC', 'CO', 'COM', 'WWW'}
+
+def normalize_description(description):
+    """ Uppercases, drops punctuation, tokens containing digits (store numbers, dates, references) and NOISE_WORDS. """
+    tokens = re.sub(r'[^A-Z0-9]+', ' ', (description or '').upper()).split()
+    return ' '.join(t for t in tokens if len(t) > 1 and not any(ch.isdigit() for ch in t) and t not in NOISE_WORDS)
+
+def description_similarity(a, b):
+    """ 0..1 similarity of two normalized descriptions: the better of token overlap and character matching. """
+    if not a or not b: return 0.0
+    if a == b: return 1.0
+    ta, tb = set(a.split()), set(b.split())
+    jaccard = len(ta & tb) / len(ta | tb)
+    return max(jaccard, difflib.SequenceMatcher(None, a, b).ratio())
+
+# --- Detection ---
+@timed
+def find_duplicates(conn, window_days=DEFAULT_WINDOW_DAYS, min_score=MIN_SCORE, full=False):
+    """
+    Queues likely duplicate pairs: same amount and income flag, dates at most window_days apart, similar descriptions.
+    Only pairs involving transactions added since the last scan are examined unless full=True; pairs already
+    in the queue (pending, merged or ignored) are not queued again. Returns the number of new candidates, or None on error.
+    """
+    through = 0 if full else int(get_setting(conn, 'duplicates_scanned_through', '0') or 0)
+    cursor = conn.cursor(); found = 0
+    try:
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM transactions"); max_id = cursor.fetchone()[0]
+        # Drive from the newer row of each pair; the older one is found by a range probe on (amount, transaction_date)
+        cursor.execute("""
+            SELECT a.id AS tx_a, b.id AS tx_b, a.description AS desc_a, b.description AS desc_b,
+                   CAST(ABS(julianday(b.transaction_date) - julianday(a.transaction_date)) AS INTEGER) AS day_gap
+            FROM transactions b
+            JOIN transactions a
+              ON a.amount = b.amount
+             AND a.transaction_date BETWEEN date(b.transaction_date, ?) AND date(b.transaction_date, ?)
+             AND a.id < b.id AND a.is_income = b.is_income
+            WHERE b.id > ?
+              AND NOT EXISTS (SELECT 1 FROM duplicate_candidates d WHERE d.tx_a = a.id AND d.tx_b = b.id);
+        """, (f"-{int(window_days)} days", f"+{int(window_days)} days", through))
+        normalized = {}; queued = []
+        for r in cursor.fetchall():
+            na = normalized.get(r['desc_a']) or normalized.setdefault(r['desc_a'], normalize_description(r['desc_a']))
+            nb = normalized.get(r['desc_b']) or normalized.setdefault(r['desc_b'], normalize_description(r['desc_b']))
+            score = description_similarity(na, nb) - DAY_PENALTY * r['day_gap']
+            if score >= min_score: queued.append((r['tx_a'], r['tx_b'], round(score, 3), r['day_gap']))
+        cursor.executemany("INSERT OR IGNORE INTO duplicate_candidates (tx_a, tx_b, score, day_gap) VALUES (?, ?, ?, ?)", queued)
+        found = cursor.rowcount if queued else 0
+        conn.commit()
+    except sqlite3.Error as e: print(f"DB error finding duplicates: {e}"); conn.rollback(); return None
+    finally:
+        if cursor: cursor.close()
+    set_setting(conn, 'duplicates_scanned_through', max_id)
+    return found
+
+# --- Review queue ---
+def get_pending_duplicates(conn, limit=None):
+    """ Pending pairs, best score first, with both transactions' details. """
+    sql = """
+        SELECT d.id, d.score, d.day_gap,
+               a.id AS a_id, a.transaction_date AS a_date, a.description AS a_desc, a.amount, a.category_id AS a_cat, ca.name AS a_cat_name,
+               b.id AS b_id, b.transaction_date AS b_date, b.description AS b_desc, b.category_id AS b_cat, cb.name AS b_cat_name
+        FROM duplicate_candidates d
+        JOIN transactions a ON a.id = d.tx_a JOIN transactions b ON b.id = d.tx_b
+        LEFT JOIN categories ca ON ca.id = a.category_id LEFT JOIN categories cb ON cb.id = b.category_id
+        WHERE d.status = 'pending' ORDER BY d.score DESC, d.id
+    """ + (" LIMIT ?" if limit else "")
+    cursor = conn.cursor(); rows = []
+    try:
+        cursor.execute(sql, (limit,) if limit else ()); rows = cursor.fetchall()
+    except sqlite3.Error as e: print(f"DB error fetching duplicate queue: {e}")
+    finally:
+        if cursor: cursor.close()
+    return rows
+
+def ignore_duplicates(conn, candidate_ids):
+    """ Marks pairs as not duplicates so they are never queued again. Returns rows updated, or None on error. """
+    if not candidate_ids: return 0
+    cursor = conn.cursor(); updated = None
+    try:
+        cursor.executemany("UPDATE duplicate_candidates SET status = 'ignored' WHERE id = ? AND status = 'pending'", [(i,) for i in candidate_ids])
+        updated = cursor.rowcount; conn.commit()
+    except sqlite3.Error as e: print(f"DB error ignoring duplicates: {e}"); conn.rollback()
+    finally:
+        if cursor: cursor.close()
+    return updated
+
+@timed
+def merge_duplicates(conn, candidate_ids):
+    """
+    Keeps the older transaction of each pair and deletes the newer one. The kept row takes the newer
+    row's category when it has none. Other pending pairs involving a deleted row are dropped.
+    All merges run in one transaction. Returns the number of transactions deleted, or None on error.
+    """
+    if not candidate_ids: return 0
+    cursor = conn.cursor(); deleted = 0
+    try:
+        ph = ','.join('?'*len(candidate_ids))
+        cursor.execute(f"SELECT id, tx_a, tx_b FROM duplicate_candidates WHERE id IN ({ph}) AND status = 'pending' ORDER BY id", tuple(candidate_ids))
+        pairs = cursor.fetchall(); gone = set()
+        for p in pairs:
+            keep, drop = p['tx_a'], p['tx_b']
+            if keep in gone or drop in gone: continue # Already merged away through another pair
+            cursor.execute("UPDATE transactions SET category_id = (SELECT category_id FROM transactions WHERE id = ?) WHERE id = ? AND category_id IS NULL", (drop, keep))
+            cursor.execute("DELETE FROM transactions WHERE id = ?", (drop,)); deleted += cursor.rowcount; gone.add(drop)
+            cursor.execute("UPDATE duplicate_candidates SET status = 'merged' WHERE id = ?", (p['id'],))
+        if gone:
+            gph = ','.join('?'*len(gone))
+            cursor.execute(f"DELETE FROM duplicate_candidates WHERE status = 'pending' AND (tx_a IN ({gph}) OR tx_b IN ({gph}))", (*gone, *gone))
+        conn.commit()
+    except sqlite3.Error as e: print(f"DB error merging duplicates: {e}"); conn.rollback(); return None
+    finally:
+        if cursor: cursor.close()
+    return deleted
+
+def _parse_selection(text, count):
+    """ '1,3-5' -> [0, 2, 3, 4]; 'a' -> all. Returns None when invalid. """
+    if text == 'a': return list(range(count))
+    picked = set()
+    for part in text.replace(' ', '').split(','):
+        lo, _, hi = part.partition('-')
+        if not lo.isdigit() or (hi and not hi.isdigit()): return None
+        lo, hi = int(lo), int(hi or lo)
+        if not 1 <= lo <= hi <= count: return None
+        picked.update(range(lo - 1, hi))
+    return sorted(picked)
+
+def review_duplicates(conn):
+    """ UI: scans for new candidates, then pages through the queue with bulk merge/ignore. """
+    found = find_duplicates(conn)
+    if found: print(f"\nFound {found} new possible duplicates.")
+    while True:
+        rows = get_pending_duplicates(conn, REVIEW_PAGE)
+        if not rows: print("\nNo possible duplicates waiting for review."); return
+        print(f"\n--- Possible Duplicates (best {len(rows)}) ---")
+        for i, r in enumerate(rows, 1):
+            print(f"{i:>3}: ${r['amount']:.2f}  score {r['score']:.2f}  {r['day_gap']}d apart")
+            print(f"       keep  #{r['a_id']} {r['a_date']} {r['a_desc'][:45]:<45} [{r['a_cat_name'] or 'Uncategorized'}]")
+            print(f"       drop  #{r['b_id']} {r['b_date']} {r['b_desc'][:45]:<45} [{r['b_cat_name'] or 'Uncategorized'}]")
+        print("\nOptions: [m <list>] Merge | [i <list>] Ignore | [b] Back   (list: 1,3-5 or a for all shown)")
+        choice = input("Choice: ").strip().lower()
+        if choice == 'b': return
+        action, _, selection = choice.partition(' ')
+        picked = _parse_selection(selection.strip(), len(rows)) if action in ('m', 'i') else None
+        if picked is None: print("Invalid choice."); continue
+        ids = [rows[i]['id'] for i in picked]
+        if action == 'm':
+            deleted = merge_duplicates(conn, ids)
+            if deleted is not None: print(f"Merged {len(ids)} pairs ({deleted} transactions removed).")
+        else:
+            updated = ignore_duplicates(conn, ids)
+            if updated is not None: print(f"Ignored {updated} pairs.")
@@ -0,0 +1,139 @@
+# forecasting.py
+# Intra-month spend forecasting against budgets
+# Each category's typical cumulative daily spend curve is learned from complete
+# months and kept in spend_curves; imports refresh only the months they touch
+
+import calendar
+import datetime
+import math
+import sqlite3
+from decimal import Decimal, ROUND_HALF_UP
+from statistics import NormalDist
+from db_utils import REPORT_FILTER, get_setting, set_setting, month_keys, get_budgets
+from profiling import timed
+
+CURVE_MONTHS = 12   # Complete months of history behind the curves
+MIN_MONTHS = 3      # Fewer history months than this falls back to a straight-line projection
+
+def _month_after(key):
+    y, m = map(int, key.split('-'))
+    return f"{y + (m == 12):04d}-{m % 12 + 1:02d}"
+
+def _money(x):
+    return Decimal(str(round(x, 2))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+# --- Curve maintenance ---
+@timed
+def update_spend_curves(conn, since=None, today=None):
+    """
+    Recomputes the per-month curve rows for complete months from `since` ('YYYY-MM[-DD]') up to
+    last month, prunes months that left the window, then re-aggregates spend_curves.
+    Months that have closed since the last update are always included. Returns success.
+    """
+    today = today or datetime.date.today()
+    last_month = today.replace(day=1) - datetime.timedelta(days=1)
+    window = month_keys(CURVE_MONTHS, last_month.year, last_month.month)
+    first, last = window[0], window[-1]
+    through = get_setting(conn, 'spend_curves_through')
+    pending = _month_after(through) if through else first # Months that closed since the last update are always included
+    start = max(min(since[:7], pending) if since else pending, first)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM spend_curve_months WHERE month < ? OR month >= ?", (first, min(start, _month_after(last))))
+        if start <= last:
+            cursor.execute(f"""
+                SELECT t.category_id, substr(t.transaction_date, 1, 7) AS month, CAST(substr(t.transaction_date, 9, 2) AS INTEGER) AS day, SUM(t.amount) AS total
+                FROM transactions t JOIN categories c ON c.id = t.category_id
+                WHERE t.is_income = 0 AND t.transaction_date >= ? AND t.transaction_date < ? AND {REPORT_FILTER}
+                GROUP BY t.category_id, month, day ORDER BY t.category_id, month, day;
+            """, (start + '-01', _month_after(last) + '-01'))
+            daily = {}
+            for r in cursor.fetchall(): daily.setdefault((r['category_id'], r['month']), {})[r['day']] = r['total']
+            rows = []
+            for (cid, month), by_day in daily.items():
+                total = sum(by_day.values())
+                if total <= 0: continue
+                days = calendar.monthrange(*map(int, month.split('-')))[1]; cum = 0.0
+                for day in range(1, days + 1):
+                    cum += by_day.get(day, 0.0)
+                    rows.append((cid, month, day, cum, total, math.log(total / cum) if cum > 0 else None))
+            cursor.executemany("INSERT INTO spend_curve_months (category_id, month, day, cum_amount, month_total, log_ratio) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        # Months in the window that have any data, so sporadic categories average over their empty months too
+        cursor.execute("SELECT COUNT(DISTINCT substr(transaction_date, 1, 7)) FROM transactions WHERE is_income = 0 AND transaction_date >= ? AND transaction_date < ?", (first + '-01', _month_after(last) + '-01'))
+        history_months = max(1, cursor.fetchone()[0])
+        cursor.execute("DELETE FROM spend_curves")
+        cursor.execute("""
+            INSERT INTO spend_curves (category_id, day, months, mean_share, mean_log_ratio, mean_log_ratio_sq, ratio_months, mean_remaining)
+            SELECT category_id, day, COUNT(*), AVG(cum_amount / month_total), AVG(log_ratio), AVG(log_ratio * log_ratio), COUNT(log_ratio), SUM(month_total - cum_amount) / ?
+            FROM spend_curve_months GROUP BY category_id, day;
+        """, (history_months,))
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"DB error updating spend curves: {e}"); conn.rollback(); return False
+    finally:
+        if cursor: cursor.close()
+    return set_setting(conn, 'spend_curves_through', last)
+
+def rebuild_spend_curves(conn, today=None):
+    """ Recomputes every month in the window. """
+    return update_spend_curves(conn, since='0000-00', today=today)
+
+# --- Forecast ---
+def _month_to_date(conn, as_of):
+    """ {category_id: Decimal} spent from the first of as_of's month through as_of, with the curves' exclusions. """
+    cursor = conn.cursor(); results = {}
+    try:
+        cursor.execute(f"""
+            SELECT t.category_id, SUM(t.amount) AS total FROM transactions t JOIN categories c ON c.id = t.category_id
+            WHERE t.is_income = 0 AND t.transaction_date >= ? AND t.transaction_date <= ? AND {REPORT_FILTER}
+            GROUP BY t.category_id;
+        """, (as_of.replace(day=1).isoformat(), as_of.isoformat()))
+        results = {r['category_id']: _money(r['total']) for r in cursor.fetchall()}
+    except sqlite3.Error as e: print(f"DB error fetching month-to-date spending: {e}")
+    finally:
+        if cursor: cursor.close()
+    return results
+
+def _project(mtd, curve, budget, day, days_in_month):
+    """ Returns (projected, p_over, method) for one category. """
+    if day >= days_in_month: return mtd, (1.0 if mtd > budget else 0.0) if budget is not None else None, 'actual'
+    if curve and curve['ratio_months'] and curve['ratio_months'] >= MIN_MONTHS and mtd > 0:
+        n = curve['ratio_months']; mu = curve['mean_log_ratio']
+        sd = math.sqrt(max(0.0, curve['mean_log_ratio_sq'] - mu * mu) * n / (n - 1))
+        projected = mtd * math.exp(mu)
+        if budget is None: p_over = None
+        elif mtd >= budget: p_over = 1.0
+        elif sd == 0: p_over = 1.0 if projected > budget else 0.0
+        else: p_over = 1 - NormalDist(mu, sd).cdf(math.log(budget / mtd))
+        return projected, p_over, 'curve'
+    if curve and curve['months'] >= MIN_MONTHS and mtd == 0:
+        return curve['mean_remaining'], None, 'curve'
+    return mtd * days_in_month / day, None, 'linear'
+
+@timed
+def forecast_month(conn, as_of=None):
+    """
+    Projects end-of-month spend per category from month-to-date spend through as_of (queried with
+    the curves' own filter, so both sides cover the same rows) and the curve for as_of's day of month.
+    Returns {category_id: {'spent', 'projected', 'budget', 'p_over', 'method'}}, or None on error.
+    """
+    as_of = as_of or datetime.date.today()
+    through = get_setting(conn, 'spend_curves_through')
+    last_complete = (as_of.replace(day=1) - datetime.timedelta(days=1)).strftime('%Y-%m')
+    if through != last_complete: update_spend_curves(conn, today=as_of) # A month has closed since the last import; add it
+    spending = _month_to_date(conn, as_of)
+    budgets = {b['id']: b['monthly_limit'] for b in get_budgets(conn)}
+    days_in_month = calendar.monthrange(as_of.year, as_of.month)[1]
+    cursor = conn.cursor(); curves = {}
+    try:
+        cursor.execute("SELECT * FROM spend_curves WHERE day = ?", (as_of.day,))
+        curves = {r['category_id']: r for r in cursor.fetchall()}
+    except sqlite3.Error as e: print(f"DB error reading spend curves: {e}"); return None
+    finally:
+        if cursor: cursor.close()
+    result = {}
+    for cid in set(spending) | set(budgets) | set(curves):
+        spent = spending.get(cid, Decimal('0.00')); budget = budgets.get(cid)
+        projected, p_over, method = _project(float(spent), curves.get(cid), float(budget) if budget is not None else None, as_of.day, days_in_month)
+        result[cid] = {'spent': spent, 'projected': max(spent, _money(projected)), 'budget': budget, 'p_over': p_over, 'method': method}
+    return result
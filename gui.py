@@ -5,32 +5,73 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
 import db_utils
-import csv_importer
+import database_setup
+import debt_manager
+import profiling
+import columnar_cache
+from gui_tasks import TaskRunner
+from categorization_queue import UncategorizedQueue
+from transaction_browser import TransactionBrowser
+from ledgers import db_file_from_argv
+from utils import parse_decimal
 import os
 import sys
+import bisect
 import datetime
 from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
 
 ZERO_THRESHOLD = Decimal('0.005')
 
+# --- Worker-side helpers (run on the background thread's own connection) ---
+def derived_monthly_income(conn):
+    """ Median income of recent complete months, falling back to the saved estimate when there is no history. """
+    stats = db_utils.get_income_stats(conn)
+    if stats and any(v > ZERO_THRESHOLD for v in stats['monthly_totals']): return stats['median']
+    saved = db_utils.get_setting(conn, 'monthly_income_estimate')
+    try: return Decimal(saved) if saved else None
+    except InvalidOperation: return None
+
+def compute_dashboard_figures(conn, task):
+    """ Gathers the headline dashboard numbers from the cached single-query snapshot. """
+    snap = db_utils.get_dashboard_snapshot(conn)
+    if snap is None: raise RuntimeError("Dashboard snapshot failed.")
+    est_inc = derived_monthly_income(conn)
+    sur = est_inc - max(Decimal('0.00'), snap['budget_total'] - snap['debt_budget_overlap']) - snap['min_debt_total'] if est_inc is not None else None
+    import analytics # NumPy loads on the worker; results are cached until the next import
+    return {'income': snap['income'], 'spending': snap['spending'], 'cash_flow': snap['cash_flow'], 'budget': snap['budget_total'], 'budget_surplus': snap['budget_remaining'], 'surplus': sur, 'debt_total': snap['debt_total'], 'points': snap['points'], 'anomalies': analytics.get_anomalies(conn)}
+
+def run_payoff_simulation(conn, task, strategy, payment, monte_carlo=False, n_paths=None):
+    """ Runs the deterministic or Monte Carlo payoff simulation. The Monte Carlo run reports progress and stops when the task is cancelled. """
+    if monte_carlo:
+        import payoff_monte_carlo # NumPy loads on the worker the first time it is needed
+        return payoff_monte_carlo.simulate_payoff_monte_carlo(conn, strategy, payment, n_paths=n_paths or payoff_monte_carlo.DEFAULT_PATHS, cancel_event=task.cancel_event,
+                                                              progress_callback=lambda n, total: task.report_progress(n, total, f"Simulating: {n * 100 // max(total, 1)}% of paths paid off"))
+    schedule, summary = debt_manager.simulate_payoff(conn, strategy, payment)
+    return summary
+
 # --- Main Application Window Class ---
 class FinanceAppGUI:
-    def __init__(self, root):
-        self.root = root
+    def __init__(self, root, db_file=db_utils.DB_FILE):
+        self.root = root; self.db_file = db_file
         self.root.title("DoDoFin - Dashboard")
-        self.root.geometry("500x450") # Adjusted height
+        self.root.geometry("500x580") # Adjusted height
 
         self.db_conn = None
+        self.income_var = tk.StringVar(value="$...")
         self.spending_var = tk.StringVar(value="$...")
+        self.cash_flow_var = tk.StringVar(value="$...")
         self.budget_var = tk.StringVar(value="$...")
+        self.budget_surplus_var = tk.StringVar(value="$...")
         self.surplus_var = tk.StringVar(value="$...")
         self.debt_var = tk.StringVar(value="$...")
         self.points_var = tk.StringVar(value="...")
+        self.anomalies_var = tk.StringVar(value="...")
         self.cat_window = None
         self.current_categorization_tx = None
-        self.skipped_tx_ids_session = set()
+        self.cat_queue = None; self.cat_ids = []
         self.cat_date_label = None; self.cat_desc_label = None; self.cat_amount_label = None; self.cat_listbox = None
         self.budget_sort_col = None; self.budget_sort_reverse = False
+        self.tasks = None; self.active_task = None
         self.style = ttk.Style()
 
         self._setup_styles()
@@ -56,7 +97,9 @@ class FinanceAppGUI:
         ttk.Label(self.dashboard_frame, text="Month Budget Total:", font=('Arial', 10, 'bold')).grid(row=3, column=0, sticky=tk.W, padx=5, pady=3); ttk.Label(self.dashboard_frame, textvariable=self.budget_var, font=('Arial', 10)).grid(row=3, column=1, sticky=tk.E, padx=5, pady=3)
         ttk.Label(self.dashboard_frame, text="Budget Surplus/Deficit:", font=('Arial', 10, 'bold')).grid(row=4, column=0, sticky=tk.W, padx=5, pady=3); self.budget_surplus_label = ttk.Label(self.dashboard_frame, textvariable=self.budget_surplus_var, font=('Arial', 10)); self.budget_surplus_label.grid(row=4, column=1, sticky=tk.E, padx=5, pady=3)
         ttk.Label(self.dashboard_frame, text="Total Debt Balance:", font=('Arial', 10, 'bold')).grid(row=5, column=0, sticky=tk.W, padx=5, pady=3); ttk.Label(self.dashboard_frame, textvariable=self.debt_var, font=('Arial', 10)).grid(row=5, column=1, sticky=tk.E, padx=5, pady=3)
-        ttk.Label(self.dashboard_frame, text="Gamification Points:", font=('Arial', 10, 'bold')).grid(row=6, column=0, sticky=tk.W, padx=5, pady=3); ttk.Label(self.dashboard_frame, textvariable=self.points_var, font=('Arial', 10)).grid(row=6, column=1, sticky=tk.E, padx=5, pady=3)
+        ttk.Label(self.dashboard_frame, text="Est. Monthly Surplus:", font=('Arial', 10, 'bold')).grid(row=6, column=0, sticky=tk.W, padx=5, pady=3); self.surplus_label = ttk.Label(self.dashboard_frame, textvariable=self.surplus_var, font=('Arial', 10)); self.surplus_label.grid(row=6, column=1, sticky=tk.E, padx=5, pady=3)
+        ttk.Label(self.dashboard_frame, text="Gamification Points:", font=('Arial', 10, 'bold')).grid(row=7, column=0, sticky=tk.W, padx=5, pady=3); ttk.Label(self.dashboard_frame, textvariable=self.points_var, font=('Arial', 10)).grid(row=7, column=1, sticky=tk.E, padx=5, pady=3)
+        ttk.Label(self.dashboard_frame, text="Unusual Spending:", font=('Arial', 10, 'bold')).grid(row=8, column=0, sticky=tk.NW, padx=5, pady=3); self.anomalies_label = ttk.Label(self.dashboard_frame, textvariable=self.anomalies_var, font=('Arial', 9), wraplength=260, justify=tk.RIGHT); self.anomalies_label.grid(row=8, column=1, sticky=tk.E, padx=5, pady=3)
         self.action_frame = ttk.LabelFrame(self.main_frame, text="Actions", padding="10"); self.action_frame.pack(fill=tk.X, pady=5, side=tk.BOTTOM); self.action_frame.columnconfigure((0, 1, 2), weight=1)
         self.import_button = ttk.Button(self.action_frame, text="Import CSV", command=self.import_csv_action); self.import_button.grid(row=0, column=0, padx=5, pady=5, sticky="ew")
         self.categorize_button = ttk.Button(self.action_frame, text="Categorize", command=self.open_categorize_window); self.categorize_button.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
@@ -64,37 +107,94 @@ class FinanceAppGUI:
         self.budget_button = ttk.Button(self.action_frame, text="Manage Budgets", command=self.open_budget_window); self.budget_button.grid(row=1, column=0, padx=5, pady=5, sticky="ew")
         self.debt_button = ttk.Button(self.action_frame, text="Manage Debts", command=self.open_debt_window); self.debt_button.grid(row=1, column=1, padx=5, pady=5, sticky="ew")
         self.refresh_button = ttk.Button(self.action_frame, text="Refresh Dashboard", command=self.load_dashboard_data); self.refresh_button.grid(row=1, column=2, padx=5, pady=5, sticky="ew")
-        self.status_bar = ttk.Label(self.root, text=" Ready", relief=tk.SUNKEN, anchor=tk.W); self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.transactions_button = ttk.Button(self.action_frame, text="Transactions", command=self.open_transaction_browser); self.transactions_button.grid(row=2, column=0, padx=5, pady=5, sticky="ew")
+        self.category_button = ttk.Button(self.action_frame, text="Category Settings", command=self.open_category_window); self.category_button.grid(row=2, column=1, padx=5, pady=5, sticky="ew")
+        self.status_frame = ttk.Frame(self.root); self.status_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        self.status_bar = ttk.Label(self.status_frame, text=" Ready", relief=tk.SUNKEN, anchor=tk.W); self.status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.cancel_button = ttk.Button(self.status_frame, text="Cancel", width=8, command=self.cancel_active_task)
+        self.progress_bar = ttk.Progressbar(self.status_frame, orient=tk.HORIZONTAL, length=140, mode='determinate')
 
     def _connect_db_and_load_main(self):
-        self.db_conn = db_utils.create_connection()
-        if self.db_conn: self.set_status("DB connected. Loading dashboard..."); self.load_dashboard_data(); self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
-        else: error_msg = "DB Connection Failed! Run setup."; messagebox.showerror("Error", error_msg); self.set_status(error_msg); buttons=['import_button','categorize_button','budget_button','debt_button','refresh_button','set_income_button']; [getattr(self,n,None).config(state=tk.DISABLED) for n in buttons if hasattr(self,n) and getattr(self,n)]
-
-    def set_status(self, message): self.status_bar.config(text=f" {message}"); self.root.update_idletasks()
+        self.db_conn = db_utils.create_connection(self.db_file)
+        if self.db_conn and not database_setup.ensure_schema(self.db_conn): self.db_conn.close(); self.db_conn = None
+        if self.db_conn: self.tasks = TaskRunner(self.root, self.db_file); self.set_status("DB connected. Loading dashboard..."); self.load_dashboard_data(); self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        else: error_msg = "DB Connection Failed! Run setup."; messagebox.showerror("Error", error_msg); self.set_status(error_msg); buttons=['import_button','categorize_button','budget_button','debt_button','refresh_button','set_income_button','transactions_button','category_button']; [getattr(self,n,None).config(state=tk.DISABLED) for n in buttons if hasattr(self,n) and getattr(self,n)]
+
+    def set_status(self, message): self.status_bar.config(text=f" {message}")
+
+    # --- Background Tasks ---
+    def run_task(self, name, func, *args, on_done=None, on_error=None, on_cancel=None, progress=False, writes=False, compute=False, **kwargs):
+        """ Runs func(conn, task, ...) on a worker thread (the writer for writes=True, the compute thread for compute=True). With progress=True the progress bar and Cancel button are shown. """
+        def finish():
+            if self.active_task is task: self.active_task = None; self.progress_bar.stop(); self.progress_bar.pack_forget(); self.cancel_button.pack_forget()
+        def done(result): finish(); on_done and on_done(result)
+        def error(exc, tb):
+            finish(); print(f"Task '{name}' failed: {exc}\n{tb}")
+            if on_error: on_error(exc)
+            else: self.set_status(f"{name} failed."); messagebox.showerror("Error", f"{name} failed:\n{exc}")
+        def cancelled(): finish(); self.set_status(f"{name} cancelled."); on_cancel and on_cancel()
+        def progressed(done_n, total, message):
+            if total: self.progress_bar.stop(); self.progress_bar.config(mode='determinate', maximum=total, value=done_n)
+            if message: self.set_status(message)
+        task = self.tasks.submit(name, func, *args, on_done=done, on_error=error, on_cancel=cancelled, on_progress=progressed if progress else None, writes=writes, compute=compute, **kwargs)
+        if progress:
+            self.active_task = task; self.progress_bar.config(mode='indeterminate', value=0); self.progress_bar.start(15)
+            self.cancel_button.pack(side=tk.RIGHT, padx=2); self.progress_bar.pack(side=tk.RIGHT, padx=2)
+        return task
+
+    def cancel_active_task(self):
+        if self.active_task: self.active_task.cancel(); self.set_status(f"Cancelling {self.active_task.name}...")
 
     def load_dashboard_data(self):
         if not self.db_conn: print("DB not connected."); return
+        if self.tasks.is_running("Dashboard refresh"): return # A refresh is already on its way
         self.set_status("Loading dashboard data...")
+        self.run_task("Dashboard refresh", compute_dashboard_figures, on_done=self._show_dashboard_data, on_error=self._show_dashboard_error)
+
+    def _show_dashboard_data(self, figures):
         try:
-            today=datetime.date.today(); year, month=today.year, today.month
-            inc = db_utils.get_income_total_for_month(self.db_conn, year, month); sp_dict = db_utils.get_spending_for_month(self.db_conn, year, month); spend = sum(sp_dict.values()); budg = db_utils.get_total_budgeted_expenses(self.db_conn); debts = db_utils.get_debts(self.db_conn); debt_t = sum(d['current_balance'] for d in debts); pts = db_utils.get_gamification_points(self.db_conn); cf = inc - spend; bs = budg - spend
-            self.income_var.set(f"${inc:.2f}"); self.spending_var.set(f"${spend:.2f}"); self.cash_flow_var.set(f"${cf:.2f}"); self.budget_var.set(f"${budg:.2f}"); self.budget_surplus_var.set(f"${bs:.2f}"); self.debt_var.set(f"${debt_t:.2f}"); self.points_var.set(str(pts))
-            try: default_fg=self.style.lookup('TLabel','foreground'); self.cash_flow_label.config(foreground="red" if cf<0 else default_fg); self.budget_surplus_label.config(foreground="red" if bs<0 else default_fg)
-            except tk.TclError: self.cash_flow_label.config(foreground="black" if cf>=0 else "red"); self.budget_surplus_label.config(foreground="black" if bs>=0 else "red")
+            inc, spend, cf, budg, bs, sur, debt_t, pts = (figures[k] for k in ('income', 'spending', 'cash_flow', 'budget', 'budget_surplus', 'surplus', 'debt_total', 'points'))
+            self.income_var.set(f"${inc:.2f}"); self.spending_var.set(f"${spend:.2f}"); self.cash_flow_var.set(f"${cf:.2f}"); self.budget_var.set(f"${budg:.2f}"); self.budget_surplus_var.set(f"${bs:.2f}"); self.surplus_var.set(f"${sur:.2f}" if sur is not None else "N/A (no income data)"); self.debt_var.set(f"${debt_t:.2f}"); self.points_var.set(str(pts))
+            anomalies = figures.get('anomalies') or []; self.anomalies_var.set("\n".join(f"{a['category']} {a['period']}: ${a['amount']:.2f} (typ. ${a['expected']:.2f})" for a in anomalies[:4]) or "None")
+            try: self.anomalies_label.config(foreground="red" if anomalies else self.style.lookup('TLabel','foreground'))
+            except tk.TclError: pass
+            try: default_fg=self.style.lookup('TLabel','foreground'); self.cash_flow_label.config(foreground="red" if cf<0 else default_fg); self.budget_surplus_label.config(foreground="red" if bs<0 else default_fg); self.surplus_label.config(foreground="red" if sur is not None and sur<0 else default_fg)
+            except tk.TclError: self.cash_flow_label.config(foreground="black" if cf>=0 else "red"); self.budget_surplus_label.config(foreground="black" if bs>=0 else "red"); self.surplus_label.config(foreground="red" if sur is not None and sur<0 else "black")
             self.set_status("Dashboard loaded.")
-        except Exception as e: print(f"Error dashboard: {e}"); self.set_status("Error loading dashboard."); self.income_var.set("$ Error"); self.spending_var.set("$ Error"); self.cash_flow_var.set("$ Error"); self.budget_var.set("$ Error"); self.budget_surplus_var.set("$ Error"); self.debt_var.set("$ Error"); self.points_var.set("Error")
+        except Exception as e: self._show_dashboard_error(e)
+
+    def _show_dashboard_error(self, e):
+        print(f"Error dashboard: {e}"); self.set_status("Error loading dashboard."); self.income_var.set("$ Error"); self.spending_var.set("$ Error"); self.cash_flow_var.set("$ Error"); self.budget_var.set("$ Error"); self.budget_surplus_var.set("$ Error"); self.surplus_var.set("$ Error"); self.debt_var.set("$ Error"); self.points_var.set("Error"); self.anomalies_var.set("Error")
+
+    def open_set_income_dialog(self):
+        """ Shows history-derived income and lets the user save a fallback estimate for months without data. """
+        if not self.db_conn: messagebox.showerror("Error", "DB disconnected."); return
+        stats = db_utils.get_income_stats(self.db_conn)
+        if stats: info = f"Last {len(stats['months'])} months ({stats['months'][0]} to {stats['months'][-1]}):\nAverage ${stats['average']:.2f}, Median ${stats['median']:.2f}\nVolatility ${stats['volatility']:.2f}\n\n"
+        else: info = "No income history found.\n\n"
+        saved = db_utils.get_setting(self.db_conn, 'monthly_income_estimate') or ""
+        value = simpledialog.askstring("Income Estimate", info + "Fallback monthly income (used only when there is no recent income history).\nLeave blank to clear:", initialvalue=saved, parent=self.root)
+        if value is None: return
+        value = value.strip().replace('$', '').replace(',', '')
+        if value:
+            try: amount = Decimal(value)
+            except InvalidOperation: messagebox.showerror("Error", "Invalid number."); return
+            if amount < 0: messagebox.showerror("Error", "Income must be non-negative."); return
+            value = str(amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+        db_utils.set_setting(self.db_conn, 'monthly_income_estimate', value); self.load_dashboard_data()
 
     def load_categories(self, listbox_widget):
-        if not self.db_conn or not listbox_widget: return
+        """ Fills the listbox with category names. Returns the category ids in listbox order. """
+        if not self.db_conn or not listbox_widget: return []
         listbox_widget.delete(0, tk.END)
-        try: cats = db_utils.get_categories(self.db_conn); [listbox_widget.insert(tk.END, c['name']) for c in cats] if cats else listbox_widget.insert(tk.END, "(None)")
-        except Exception as e: print(f"Error loading cats: {e}"); listbox_widget.insert(tk.END, "(Error)")
+        try: cats = db_utils.get_categories(self.db_conn); [listbox_widget.insert(tk.END, c['name']) for c in cats] if cats else listbox_widget.insert(tk.END, "(None)"); return [c['id'] for c in cats]
+        except Exception as e: print(f"Error loading cats: {e}"); listbox_widget.insert(tk.END, "(Error)"); return []
 
     def load_debts_into_treeview(self, tree):
         if not self.db_conn or not tree: return
         for i in tree.get_children(): tree.delete(i)
-        try: debts = db_utils.get_debts(self.db_conn)
+        try:
+            debts = db_utils.get_debts(self.db_conn)
             if debts: [tree.insert('',tk.END,iid=d['id'],values=(d['id'],d['name'],d['lender'] or "",f"${d['current_balance']:.2f}",f"{d['interest_rate']:.2f}",f"${d['minimum_payment']:.2f}",d['last_updated'])) for d in debts]
         except Exception as e: print(f"Error loading debts: {e}")
 
@@ -102,81 +202,151 @@ class FinanceAppGUI:
         if not self.db_conn: messagebox.showerror("Error", "DB disconnected."); return
         self.set_status("Select CSV..."); filetypes=(('CSV','*.csv'),('All','*.*')); fp=filedialog.askopenfilename(title='Select CSV',filetypes=filetypes)
         if not fp: self.set_status("Import cancelled."); return
-        self.set_status(f"Importing {os.path.basename(fp)}...")
-        try: p,u,s = csv_importer.import_csv(self.db_conn, fp); msg=f"Import done.\nProcessed: {p}\nSkipped: {s}"; messagebox.showinfo("Import", msg)
-        except Exception as e: msg=f"Import Error:\n{e}"; messagebox.showerror("Error", msg); print(msg); import traceback; traceback.print_exc()
-        finally: self.set_status("Import finished. Refreshing..."); self.load_dashboard_data()
+        if self.tasks.is_running("Import"): messagebox.showinfo("Import", "An import is already running."); return
+        self.set_status(f"Importing {os.path.basename(fp)}..."); self.import_button.config(state=tk.DISABLED)
+        def work(conn, task, path):
+            import csv_importer # pandas loads on the worker, only for the pandas backend
+            return csv_importer.import_csv(conn, path, progress_callback=lambda n, total: task.report_progress(n, total, f"Importing {os.path.basename(path)}: {n * 100 // max(total, 1)}%"), cancel_event=task.cancel_event)
+        def done(result):
+            if result is None: self.import_button.config(state=tk.NORMAL); messagebox.showerror("Import", "Nothing was imported; see the console for the reason."); self.set_status("Import failed."); return
+            p,u,s = result; self.import_button.config(state=tk.NORMAL); messagebox.showinfo("Import", f"Import done.\nProcessed: {p}\nSkipped: {s}"); self.set_status("Import finished. Refreshing..."); self.load_dashboard_data()
+        def failed(e): self.import_button.config(state=tk.NORMAL); messagebox.showerror("Error", f"Import Error:\n{e}"); self.set_status("Import failed.")
+        self.run_task("Import", work, fp, on_done=done, on_error=failed, on_cancel=lambda: self.import_button.config(state=tk.NORMAL), progress=True, writes=True)
 
     def open_categorize_window(self):
         if not self.db_conn: messagebox.showerror("Error", "DB disconnected."); return
-        self.skipped_tx_ids_session=set(); self.current_categorization_tx=db_utils.get_next_uncategorized_transaction(self.db_conn,[])
-        if not self.current_categorization_tx: messagebox.showinfo("Categorize", "🎉 Nothing to categorize!"); return
+        self.cat_queue=UncategorizedQueue(self.db_conn); self.current_categorization_tx=self.cat_queue.next()
+        if not self.current_categorization_tx: self.cat_queue=None; messagebox.showinfo("Categorize", "🎉 Nothing to categorize!"); return
         self.cat_window=tk.Toplevel(self.root); self.cat_window.title("Categorize"); self.cat_window.geometry("500x550"); self.cat_window.transient(self.root); self.cat_window.grab_set(); self.cat_window.protocol("WM_DELETE_WINDOW", lambda: self._on_cat_window_close(self.cat_window))
-        det_fr=ttk.LabelFrame(self.cat_window,t="Details",p="10"); det_fr.pack(p=10,f=tk.X); det_fr.columnconfigure(1,w=1)
-        ttk.Label(det_fr,t="Date:",fo=('Arial',10,'bold')).grid(r=0,c=0,s=tk.W,p=5,py=2); self.cat_date_label=ttk.Label(det_fr,t=""); self.cat_date_label.grid(r=0,c=1,s=tk.W,p=5,py=2)
-        ttk.Label(det_fr,t="Desc:",fo=('Arial',10,'bold')).grid(r=1,c=0,s=tk.W,p=5,py=2); self.cat_desc_label=ttk.Label(det_fr,t="",w=350); self.cat_desc_label.grid(r=1,c=1,s=tk.W,p=5,py=2)
-        ttk.Label(det_fr,t="Amount:",fo=('Arial',10,'bold')).grid(r=2,c=0,s=tk.W,p=5,py=2); self.cat_amount_label=ttk.Label(det_fr,t=""); self.cat_amount_label.grid(r=2,c=1,s=tk.W,p=5,py=2)
-        sel_fr=ttk.LabelFrame(self.cat_window,t="Assign Category",p="10"); sel_fr.pack(p=10,f=tk.BOTH,ex=True)
-        self.cat_listbox=tk.Listbox(sel_fr,h=10,ex=False); sb=ttk.Scrollbar(sel_fr,o=tk.VERTICAL,c=self.cat_listbox.yview); self.cat_listbox.config(y=sb.set); self.cat_listbox.pack(s=tk.LEFT,f=tk.BOTH,ex=True); sb.pack(s=tk.RIGHT,f=tk.Y)
-        act_fr=ttk.Frame(self.cat_window,p="10"); act_fr.pack(f=tk.X,s=tk.BOTTOM,p=5); act_fr.columnconfigure((0,1,2,3),w=1)
-        ttk.Button(act_fr,t="Assign",c=self._cat_assign_action).grid(r=0,c=0,p=5,py=5,s="ew"); ttk.Button(act_fr,t="Add New",c=self._cat_add_new_action).grid(r=0,c=1,p=5,py=5,s="ew"); ttk.Button(act_fr,t="Skip",c=self._cat_skip_action).grid(r=0,c=2,p=5,py=5,s="ew"); ttk.Button(act_fr,t="Quit",c=lambda:self._on_cat_window_close(self.cat_window)).grid(r=0,c=3,p=5,py=5,s="ew")
-        if not self._cat_load_next_tx(): return
-        self.cat_window.lift(); self.cat_window.focus_force()
+        det_fr=ttk.LabelFrame(self.cat_window,text="Details",padding="10"); det_fr.pack(padx=10,fill=tk.X); det_fr.columnconfigure(1,weight=1)
+        ttk.Label(det_fr,text="Date:",font=('Arial',10,'bold')).grid(row=0,column=0,sticky=tk.W,padx=5,pady=2); self.cat_date_label=ttk.Label(det_fr,text=""); self.cat_date_label.grid(row=0,column=1,sticky=tk.W,padx=5,pady=2)
+        ttk.Label(det_fr,text="Desc:",font=('Arial',10,'bold')).grid(row=1,column=0,sticky=tk.W,padx=5,pady=2); self.cat_desc_label=ttk.Label(det_fr,text="",wraplength=350); self.cat_desc_label.grid(row=1,column=1,sticky=tk.W,padx=5,pady=2)
+        ttk.Label(det_fr,text="Amount:",font=('Arial',10,'bold')).grid(row=2,column=0,sticky=tk.W,padx=5,pady=2); self.cat_amount_label=ttk.Label(det_fr,text=""); self.cat_amount_label.grid(row=2,column=1,sticky=tk.W,padx=5,pady=2)
+        sel_fr=ttk.LabelFrame(self.cat_window,text="Assign Category",padding="10"); sel_fr.pack(padx=10,fill=tk.BOTH,expand=True)
+        self.cat_listbox=tk.Listbox(sel_fr,height=10,exportselection=False); sb=ttk.Scrollbar(sel_fr,orient=tk.VERTICAL,command=self.cat_listbox.yview); self.cat_listbox.config(yscrollcommand=sb.set); self.cat_listbox.pack(side=tk.LEFT,fill=tk.BOTH,expand=True); sb.pack(side=tk.RIGHT,fill=tk.Y)
+        act_fr=ttk.Frame(self.cat_window,padding="10"); act_fr.pack(fill=tk.X,side=tk.BOTTOM,padx=5); act_fr.columnconfigure((0,1,2,3),weight=1)
+        ttk.Button(act_fr,text="Assign",command=self._cat_assign_action).grid(row=0,column=0,padx=5,pady=5,sticky="ew"); ttk.Button(act_fr,text="Add New",command=self._cat_add_new_action).grid(row=0,column=1,padx=5,pady=5,sticky="ew"); ttk.Button(act_fr,text="Skip",command=self._cat_skip_action).grid(row=0,column=2,padx=5,pady=5,sticky="ew"); ttk.Button(act_fr,text="Quit",command=lambda:self._on_cat_window_close(self.cat_window)).grid(row=0,column=3,padx=5,pady=5,sticky="ew")
+        self.cat_ids=self.load_categories(listbox_widget=self.cat_listbox) # Populated once; "Add New" inserts in place
+        self._cat_show_tx(); self.cat_window.lift(); self.cat_window.focus_force()
+
+    def _cat_show_tx(self):
+        tx=self.current_categorization_tx
+        self.cat_date_label.config(text=tx['transaction_date']); self.cat_desc_label.config(text=tx['description'])
+        try: amt=Decimal(str(tx['amount'])).quantize(Decimal('0.01')); typ="(Inc)" if tx['is_income'] else "(Exp)"; self.cat_amount_label.config(text=f"${amt:.2f} {typ}")
+        except (InvalidOperation, TypeError): self.cat_amount_label.config(text="Invalid Amt")
 
     def _cat_load_next_tx(self):
         if not self.cat_window or not self.cat_window.winfo_exists(): return False
-        self.current_categorization_tx = db_utils.get_next_uncategorized_transaction(self.db_conn, list(self.skipped_tx_ids_session))
-        if self.current_categorization_tx:
-            self.cat_date_label.config(text=self.current_categorization_tx['transaction_date']); self.cat_desc_label.config(text=self.current_categorization_tx['description'])
-            try: amt=Decimal(str(self.current_categorization_tx['amount'])).q(D('0.01')); typ="(Inc)" if self.current_categorization_tx['is_income'] else "(Exp)"; self.cat_amount_label.config(text=f"${amt:.2f} {typ}")
-            except: self.cat_amount_label.config(text="Invalid Amt")
-            self.load_categories(listbox_widget=self.cat_listbox); self.cat_window.update_idletasks(); return True
+        self.current_categorization_tx = self.cat_queue.next()
+        if self.current_categorization_tx: self._cat_show_tx(); return True
         else: messagebox.showinfo("Done","All categorized!",parent=self.cat_window); self._on_cat_window_close(self.cat_window); return False
 
+    def _cat_assign(self, cat_id):
+        if not self.cat_queue.assign(self.current_categorization_tx, cat_id): messagebox.showerror("Error","Failed to save categorizations.",parent=self.cat_window); return
+        self._cat_load_next_tx()
+
     def _cat_assign_action(self):
         if not self.cat_window or not self.cat_window.winfo_exists(): return
         sel=self.cat_listbox.curselection()
-        if not sel: messagebox.showwarning("Select","Please select category.",parent=self.cat_window); return
-        name=self.cat_listbox.get(sel[0]); cat_id=db_utils.find_category_id_by_name(self.db_conn,name)
-        if cat_id and self.current_categorization_tx:
-            tx_id=self.current_categorization_tx['id'];
-            if db_utils.update_transaction_category(self.db_conn,tx_id,cat_id): db_utils.add_gamification_points(self.db_conn,1); self._cat_load_next_tx()
-            else: messagebox.showerror("Error","Failed update.",parent=self.cat_window)
-        elif not cat_id: messagebox.showerror("Error",f"ID not found for '{name}'.",parent=self.cat_window)
+        if not sel or sel[0] >= len(self.cat_ids): messagebox.showwarning("Select","Please select category.",parent=self.cat_window); return
+        if self.current_categorization_tx: self._cat_assign(self.cat_ids[sel[0]])
 
     def _cat_add_new_action(self):
          if not self.cat_window or not self.cat_window.winfo_exists(): return
          name=simpledialog.askstring("Add Cat","Name:",parent=self.cat_window)
          if name and name.strip():
-             new_id=db_utils.add_category(self.db_conn,name.strip())
-             if new_id and self.current_categorization_tx:
-                  tx_id=self.current_categorization_tx['id'];
-                  if db_utils.update_transaction_category(self.db_conn,tx_id,new_id): db_utils.add_gamification_points(self.db_conn,1); self._cat_load_next_tx()
-                  else: messagebox.showerror("Error","Failed assign new cat.",parent=self.cat_window)
+             name=name.strip(); new_id=db_utils.add_category(self.db_conn,name)
+             if new_id and new_id not in self.cat_ids:
+                  names=[self.cat_listbox.get(i).lower() for i in range(len(self.cat_ids))]; pos=bisect.bisect(names, name.lower())
+                  self.cat_listbox.insert(pos, name); self.cat_ids.insert(pos, new_id)
+             if new_id and self.current_categorization_tx: self._cat_assign(new_id)
              elif not new_id: messagebox.showerror("Error","Failed add category.",parent=self.cat_window)
 
     def _cat_skip_action(self):
         if not self.cat_window or not self.cat_window.winfo_exists(): return
-        if self.current_categorization_tx: self.skipped_tx_ids_session.add(self.current_categorization_tx['id'])
+        if self.current_categorization_tx: self.cat_queue.skip(self.current_categorization_tx)
         self._cat_load_next_tx()
 
     def _on_cat_window_close(self, win):
-        print("Closing categorization window."); self.current_categorization_tx=None; self.skipped_tx_ids_session.clear(); self.cat_window=None; self.cat_date_label=None; self.cat_desc_label=None; self.cat_amount_label=None; self.cat_listbox=None
+        print("Closing categorization window.")
+        if self.cat_queue:
+            if not self.cat_queue.flush(): messagebox.showerror("Error","Failed to save categorizations.",parent=win if win and win.winfo_exists() else self.root)
+            print(f"Categorized: {self.cat_queue.assigned_count}, Skipped: {len(self.cat_queue.skipped_ids)}")
+        self.cat_queue=None; self.current_categorization_tx=None; self.cat_window=None; self.cat_date_label=None; self.cat_desc_label=None; self.cat_amount_label=None; self.cat_listbox=None; self.cat_ids=[]
         if win and win.winfo_exists(): win.destroy()
+        self.load_dashboard_data()
+
+    def open_transaction_browser(self):
+        if not self.db_conn: messagebox.showerror("Error", "DB disconnected."); return
+        TransactionBrowser(self)
+
+    def open_category_window(self):
+        if not self.db_conn: messagebox.showerror("Error", "DB disconnected."); return
+        win = tk.Toplevel(self.root); win.title("Category Settings"); win.geometry("760x450"); win.transient(self.root); win.grab_set()
+        fr = ttk.Frame(win, padding="5"); fr.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        flags = list(db_utils.CATEGORY_FLAGS); cols = ('name',) + tuple(flags); tree = ttk.Treeview(fr, columns=cols, show='headings', height=12)
+        tree.heading('name', text='Category'); tree.column('name', width=200)
+        for f in flags: tree.heading(f, text=db_utils.CATEGORY_FLAGS[f]); tree.column(f, width=105, anchor=tk.CENTER)
+        tree.grid(row=0,column=0,sticky='nsew'); sb = ttk.Scrollbar(fr,orient=tk.VERTICAL,command=tree.yview); sb.grid(row=0,column=1,sticky='ns'); tree.configure(yscrollcommand=sb.set)
+        fr.grid_rowconfigure(0,weight=1); fr.grid_columnconfigure(0,weight=1)
+        def refresh():
+            for i in tree.get_children(): tree.delete(i)
+            for c in db_utils.get_categories(self.db_conn): tree.insert('', tk.END, iid=c['id'], values=(c['name'],) + tuple("Yes" if c[f] else "" for f in flags))
+        def toggle(event):
+            iid, col = tree.identify_row(event.y), tree.identify_column(event.x); idx = int(col[1:]) - 2 if col else -1 # '#1' is the name column
+            if not iid or not 0 <= idx < len(flags): return
+            flag = flags[idx]; on = tree.set(iid, flag) == "Yes"
+            if db_utils.set_category_flag(self.db_conn, int(iid), flag, not on): tree.set(iid, flag, "" if on else "Yes"); self.set_status(f"{tree.set(iid, 'name')}: {db_utils.CATEGORY_FLAGS[flag]} {'off' if on else 'on'}.")
+            else: messagebox.showerror("Error", "Failed to update category.", parent=win)
+        tree.bind('<Double-1>', toggle)
+        bfr = ttk.Frame(win,padding="5"); bfr.pack(fill=tk.X,padx=5)
+        ttk.Label(bfr, text="Double-click a cell to toggle it.").pack(side=tk.LEFT, padx=5); ttk.Button(bfr, text="Close", command=lambda: (win.destroy(), self.load_dashboard_data())).pack(side=tk.RIGHT, padx=5); ttk.Button(bfr, text="Refresh", command=refresh).pack(side=tk.RIGHT, padx=5)
+        refresh(); win.lift(); win.focus_force()
 
     def open_debt_window(self):
         if not self.db_conn: messagebox.showerror("Error", "DB disconnected."); return
         win = tk.Toplevel(self.root); win.title("Manage Debts"); win.geometry("800x450"); win.transient(self.root); win.grab_set()
-        fr = ttk.Frame(win, p="5"); fr.pack(f=tk.BOTH, ex=True, px=5, py=5)
-        cols = ('id','name','lender','balance','rate','min_payment','last_updated'); tree = ttk.Treeview(fr, c=cols, show='h', h=10)
-        tree.heading('id',t='ID'); tree.column('id',w=30,st=tk.NO,a=tk.CENTER); tree.heading('name',t='Name'); tree.column('name',w=170); tree.heading('lender',t='Lender'); tree.column('lender',w=120); tree.heading('balance',t='Balance'); tree.column('balance',w=100,a=tk.E); tree.heading('rate',t='Rate %'); tree.column('rate',w=60,a=tk.E); tree.heading('min_payment',t='Min Pmt'); tree.column('min_payment',w=100,a=tk.E); tree.heading('last_updated',t='Updated'); tree.column('last_updated',w=90,a=tk.CENTER)
-        tree.grid(r=0,c=0,s='nsew'); sb = ttk.Scrollbar(fr,o=tk.VERTICAL,c=tree.yview); sb.grid(r=0,c=1,s='ns'); tree.configure(y=sb.set)
-        fr.grid_rowconfigure(0,w=1); fr.grid_columnconfigure(0,w=1)
+        fr = ttk.Frame(win, padding="5"); fr.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        cols = ('id','name','lender','balance','rate','min_payment','last_updated'); tree = ttk.Treeview(fr, columns=cols, show='headings', height=10)
+        tree.heading('id',text='ID'); tree.column('id',width=30,stretch=tk.NO,anchor=tk.CENTER); tree.heading('name',text='Name'); tree.column('name',width=170); tree.heading('lender',text='Lender'); tree.column('lender',width=120); tree.heading('balance',text='Balance'); tree.column('balance',width=100,anchor=tk.E); tree.heading('rate',text='Rate %'); tree.column('rate',width=60,anchor=tk.E); tree.heading('min_payment',text='Min Pmt'); tree.column('min_payment',width=100,anchor=tk.E); tree.heading('last_updated',text='Updated'); tree.column('last_updated',width=90,anchor=tk.CENTER)
+        tree.grid(row=0,column=0,sticky='nsew'); sb = ttk.Scrollbar(fr,orient=tk.VERTICAL,command=tree.yview); sb.grid(row=0,column=1,sticky='ns'); tree.configure(yscrollcommand=sb.set)
+        fr.grid_rowconfigure(0,weight=1); fr.grid_columnconfigure(0,weight=1)
         def refresh(): self.load_debts_into_treeview(tree)
-        bfr = ttk.Frame(win,p="5"); bfr.pack(f=tk.X,p=5); bfr.columnconfigure((0,1,2,3,4,5),w=1)
-        ttk.Button(bfr, t="Add", c=lambda: self.open_add_debt_dialog(win, refresh)).grid(r=0,c=0,p=2,py=2,s="ew"); ttk.Button(bfr,t="Update",c=lambda: messagebox.showinfo("TODO","Not implemented")).grid(r=0,c=1,p=2,py=2,s="ew"); ttk.Button(bfr,t="Remove",c=lambda: messagebox.showinfo("TODO","Not implemented")).grid(r=0,c=2,p=2,py=2,s="ew"); ttk.Button(bfr,t="Strategy",c=lambda: messagebox.showinfo("TODO","Not implemented")).grid(r=1,c=0,p=2,py=2,s="ew"); ttk.Button(bfr,t="Afford Check",c=lambda: messagebox.showinfo("TODO","Not implemented")).grid(r=1,c=1,p=2,py=2,s="ew"); ttk.Button(bfr,t="Refresh",c=refresh).grid(r=1,c=2,p=2,py=2,s="ew"); ttk.Button(bfr,t="Close",c=win.destroy).grid(r=1,c=5,p=2,py=2,s="ew")
+        bfr = ttk.Frame(win,padding="5"); bfr.pack(fill=tk.X,padx=5); bfr.columnconfigure((0,1,2,3,4,5),weight=1)
+        ttk.Button(bfr, text="Add", command=lambda: self.open_add_debt_dialog(win, refresh)).grid(row=0,column=0,padx=2,pady=2,sticky="ew"); ttk.Button(bfr,text="Update",command=lambda: messagebox.showinfo("TODO","Not implemented")).grid(row=0,column=1,padx=2,pady=2,sticky="ew"); ttk.Button(bfr,text="Remove",command=lambda: messagebox.showinfo("TODO","Not implemented")).grid(row=0,column=2,padx=2,pady=2,sticky="ew"); ttk.Button(bfr,text="Strategy",command=lambda: self.open_simulation_dialog(win)).grid(row=1,column=0,padx=2,pady=2,sticky="ew"); ttk.Button(bfr,text="Afford Check",command=lambda: messagebox.showinfo("TODO","Not implemented")).grid(row=1,column=1,padx=2,pady=2,sticky="ew"); ttk.Button(bfr,text="Refresh",command=refresh).grid(row=1,column=2,padx=2,pady=2,sticky="ew"); ttk.Button(bfr,text="Close",command=win.destroy).grid(row=1,column=5,padx=2,pady=2,sticky="ew")
         refresh(); win.lift(); win.focus_force()
 
+    def open_simulation_dialog(self, parent_window):
+        """ Asks for strategy and payment, then runs the payoff simulation in the background. """
+        debts = db_utils.get_debts(self.db_conn)
+        if not debts: messagebox.showinfo("Strategy", "No debts entered yet.", parent=parent_window); return
+        total_min = sum(d['minimum_payment'] for d in debts)
+        dlg = tk.Toplevel(parent_window); dlg.title("Payoff Simulation"); dlg.geometry("340x200"); dlg.transient(parent_window); dlg.grab_set()
+        fr = ttk.Frame(dlg, padding="15"); fr.pack(fill=tk.BOTH, expand=True); fr.columnconfigure(1, weight=1)
+        strategy_var = tk.StringVar(value='avalanche'); payment_var = tk.StringVar(value=f"{total_min:.2f}"); mc_var = tk.BooleanVar(value=False)
+        ttk.Label(fr, text="Strategy:").grid(row=0, column=0, sticky=tk.W, pady=2); ttk.Combobox(fr, textvariable=strategy_var, values=('avalanche', 'snowball'), state='readonly', width=15).grid(row=0, column=1, sticky=tk.EW, pady=2)
+        ttk.Label(fr, text="Monthly Payment $:").grid(row=1, column=0, sticky=tk.W, pady=2); ttk.Entry(fr, textvariable=payment_var, width=15).grid(row=1, column=1, sticky=tk.EW, pady=2)
+        ttk.Checkbutton(fr, text="Monte Carlo risk analysis", variable=mc_var).grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=2)
+        ttk.Label(fr, text=f"Minimum total: ${total_min:.2f}").grid(row=3, column=0, columnspan=2, sticky=tk.W, pady=2)
+        def run():
+            payment = parse_decimal(payment_var.get())
+            if payment is None: messagebox.showerror("Error", "Invalid payment.", parent=dlg); return
+            if payment < total_min: messagebox.showerror("Error", f"Payment must be >= total minimums (${total_min:.2f}).", parent=dlg); return
+            strategy = strategy_var.get(); monte_carlo = mc_var.get(); dlg.destroy()
+            self.set_status(f"Simulating {strategy} payoff...")
+            self.run_task("Simulation", run_payoff_simulation, strategy, payment, monte_carlo=monte_carlo, on_done=lambda r: self._show_simulation_result(r, monte_carlo, parent_window), progress=True, compute=True)
+        bfr = ttk.Frame(fr); bfr.grid(row=4, column=0, columnspan=2, pady=10); ttk.Button(bfr, text="Run", command=run).pack(side=tk.LEFT, padx=10); ttk.Button(bfr, text="Cancel", command=dlg.destroy).pack(side=tk.LEFT, padx=10)
+
+    def _show_simulation_result(self, result, monte_carlo, parent_window):
+        self.set_status("Simulation finished.")
+        if not result: messagebox.showerror("Simulation", "Simulation failed or generated no results.", parent=parent_window if parent_window.winfo_exists() else self.root); return
+        if monte_carlo:
+            lines = [f"Paths paid off: {result['paid_off_share'] * 100:.1f}%"]
+            lines += [f"P{p}: {result['months_percentiles'][p]} months ({result['payoff_date_percentiles'][p]}), interest ${result['interest_percentiles'][p]:.2f}" for p in result['months_percentiles']]
+        else:
+            lines = [f"Payoff time: {result['total_months']} months", f"Total interest: ${result['total_interest']:.2f}", f"Total paid: ${result['total_paid']:.2f}"]
+        messagebox.showinfo("Payoff Simulation", "\n".join(lines), parent=parent_window if parent_window.winfo_exists() else self.root)
+
     def open_add_debt_dialog(self, parent_window, refresh_callback):
         """ Opens modal dialog to add new debt. Uses standard blocks. """
         add_dialog = tk.Toplevel(parent_window); add_dialog.title("Add New Debt"); add_dialog.geometry("350x250"); add_dialog.transient(parent_window); add_dialog.grab_set()
@@ -270,7 +440,8 @@ class FinanceAppGUI:
         if col==self.budget_sort_col: self.budget_sort_reverse=not self.budget_sort_reverse; rev=self.budget_sort_reverse
         else: self.budget_sort_col=col; self.budget_sort_reverse=False; rev=False
         data = []
-        for iid in tree.get_children(''): v=tree.item(iid,'values');
+        for iid in tree.get_children(''):
+            v=tree.item(iid,'values')
             try: key=int(v[0]) if col=='id' else (str(v[1]).lower() if col=='name' else (Decimal(v[2][1:].replace(',','')) if col=='limit' else v[0])); data.append((key, iid))
             except: data.append((0,iid)) # Fallback
         data.sort(key=lambda x:x[0], reverse=rev); [tree.move(iid,'',idx) for idx,(key,iid) in enumerate(data)]
@@ -286,7 +457,8 @@ class FinanceAppGUI:
         dlg=tk.Toplevel(tree.winfo_toplevel()); dlg.title(f"Set Budget: {name}"); dlg.geometry("300x150"); dlg.transient(tree.winfo_toplevel()); dlg.grab_set()
         fr=ttk.Frame(dlg,p="15"); fr.pack(f=tk.BOTH,ex=True); ttk.Label(fr,t=f"Category: {name}").grid(r=0,c=0,cs=2,s=tk.W,p=5); ttk.Label(fr,t="New Limit $:").grid(r=1,c=0,s=tk.W,p=5); entry=ttk.Entry(fr,w=20); entry.grid(r=1,c=1,s=tk.EW,p=5); entry.insert(0,limit_s); entry.focus_set()
         def save():
-            try: limit_d=Decimal(entry.get().replace('$','').replace(',',''));
+            try:
+                limit_d=Decimal(entry.get().replace('$','').replace(',',''))
                 if limit_d<0: messagebox.showerror("Error","Limit must be non-negative.",parent=dlg); return
             except: messagebox.showerror("Error","Invalid number.",parent=dlg); return
             if db_utils.set_budget(self.db_conn,cat_id,limit_d): messagebox.showinfo("Success",f"Budget set to ${limit_d:.2f}",parent=dlg); dlg.destroy(); refresh_cb()
@@ -298,6 +470,7 @@ class FinanceAppGUI:
 
     def on_closing(self):
         print("Closing...");
+        if self.tasks: self.tasks.shutdown()
         if self.db_conn:
             try: self.db_conn.close(); print("DB closed.")
             except Exception as e: print(f"Error closing DB: {e}")
@@ -305,8 +478,11 @@ class FinanceAppGUI:
 
 # --- Run ---
 if __name__ == "__main__":
-    db_p = db_utils.DB_FILE
+    if '--profile' in sys.argv[1:]: profiling.enable()
+    if '--columnar' in sys.argv[1:]: columnar_cache.enable()
+    try: db_p = db_file_from_argv(sys.argv[1:])
+    except ValueError as e: print(e); sys.exit(1)
     if not os.path.exists(db_p): print(f"DB '{db_p}' not found. Run setup."); sys.exit(1)
     root = tk.Tk()
-    app = FinanceAppGUI(root)
+    app = FinanceAppGUI(root, db_p)
     root.mainloop()
\ No newline at end of file
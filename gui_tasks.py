@@ -0,0 +1,136 @@
+# gui_tasks.py
+# Background task execution for the Tkinter GUI
+# Long operations run on worker threads that own their own SQLite connection;
+# results come back through a queue polled from the Tk main loop with root.after.
+# Writing tasks (imports) have a thread of their own, so reads never wait behind them
+
+import queue
+import sqlite3
+import threading
+import traceback
+import db_utils
+
+class TaskCancelled(Exception):
+    """ Raised inside a task when the user asked to cancel it. """
+
+class BackgroundTask:
+    """ Handle for a submitted task. Tasks use it to report progress and check for cancellation. """
+    def __init__(self, runner, name, func, args, kwargs, callbacks):
+        self.runner = runner
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.callbacks = callbacks
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        """ Requests cooperative cancellation; the task stops at its next progress check. """
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set(): raise TaskCancelled(self.name)
+
+    def report_progress(self, done, total=None, message=None):
+        """ Called from the worker thread to forward progress to the GUI. """
+        self.runner._events.put(('progress', self, (done, total, message)))
+
+class TaskRunner:
+    """
+    Runs callables as func(conn, task, *args, **kwargs) on worker threads.
+    Tasks submitted with writes=True run one at a time on a dedicated writer thread,
+    and those with compute=True on a compute thread; the others share workers - 1
+    reader threads (at least one).
+    on_done(result), on_error(exc, tb_text), on_progress(done, total, message)
+    and on_cancel() are always invoked on the Tk main thread.
+    """
+    def __init__(self, root, db_file=db_utils.DB_FILE, workers=2, poll_ms=100):
+        self.root = root
+        self.db_file = db_file
+        self.poll_ms = poll_ms
+        self._tasks = queue.Queue()   # Reads
+        self._writes = queue.Queue()  # Writes, serialized on their own thread
+        self._compute = queue.Queue() # Long CPU-bound reads (simulations), kept off the reader so refreshes and paging go on
+        self._events = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._threads = [(threading.Thread(target=self._worker, args=(self._writes,), name="dodofin-writer", daemon=True), self._writes)]
+        self._threads.append((threading.Thread(target=self._worker, args=(self._compute,), name="dodofin-compute", daemon=True), self._compute))
+        self._threads += [(threading.Thread(target=self._worker, args=(self._tasks,), name=f"dodofin-worker-{i}", daemon=True), self._tasks) for i in range(max(1, workers - 1))]
+        for t, _ in self._threads: t.start()
+        self._after_id = self.root.after(self.poll_ms, self._poll)
+
+    def submit(self, name, func, *args, on_done=None, on_error=None, on_progress=None, on_cancel=None, writes=False, compute=False, **kwargs):
+        """ Queues func for a worker (the writer thread if writes=True, the compute thread if compute=True) and returns its BackgroundTask handle. """
+        callbacks = {'done': on_done, 'error': on_error, 'progress': on_progress, 'cancel': on_cancel}
+        task = BackgroundTask(self, name, func, args, kwargs, callbacks)
+        with self._lock: self._pending.add(task)
+        (self._writes if writes else self._compute if compute else self._tasks).put(task)
+        return task
+
+    def is_running(self, name):
+        """ True if a task with this name is queued or running. """
+        with self._lock: return any(t.name == name for t in self._pending)
+
+    def cancel_all(self):
+        with self._lock: tasks = list(self._pending)
+        for t in tasks: t.cancel()
+
+    def shutdown(self):
+        """ Cancels outstanding work and stops the workers and the poll loop. """
+        self.cancel_all()
+        for _, tasks in self._threads: tasks.put(None)
+        if self._after_id:
+            try: self.root.after_cancel(self._after_id)
+            except Exception: pass
+            self._after_id = None
+
+    def _worker(self, tasks):
+        conn = db_utils.create_connection(self.db_file) # Connections must stay on the thread that made them
+        try:
+            if conn: db_utils.tune_connection(conn) # WAL, so readers keep going while the writer imports
+        except sqlite3.Error as e: print(f"Worker connection not tuned: {e}")
+        try:
+            while True:
+                task = tasks.get()
+                if task is None: break
+                if task.cancelled: self._events.put(('cancel', task, None)); continue
+                if conn is None: self._events.put(('error', task, (RuntimeError("Worker DB connection failed."), ""))); continue
+                try:
+                    result = task.func(conn, task, *task.args, **task.kwargs)
+                    if task.cancelled: self._events.put(('cancel', task, None))
+                    else: self._events.put(('done', task, result))
+                except TaskCancelled:
+                    try: conn.rollback()
+                    except Exception: pass
+                    self._events.put(('cancel', task, None))
+                except Exception as e:
+                    try: conn.rollback()
+                    except Exception: pass
+                    self._events.put(('error', task, (e, traceback.format_exc())))
+        finally:
+            if conn: conn.close()
+
+    def _poll(self):
+        """ Drains worker events on the main thread and dispatches callbacks. """
+        try:
+            while True:
+                kind, task, payload = self._events.get_nowait()
+                if kind != 'progress':
+                    with self._lock: self._pending.discard(task)
+                callback = task.callbacks.get(kind)
+                try:
+                    if kind == 'done' and callback: callback(payload)
+                    elif kind == 'error':
+                        if callback: callback(*payload)
+                        else: print(f"Background task '{task.name}' failed: {payload[0]}\n{payload[1]}")
+                    elif kind == 'progress' and callback: callback(*payload)
+                    elif kind == 'cancel' and callback: callback()
+                except Exception as e: print(f"Error in callback for task '{task.name}': {e}"); traceback.print_exc()
+        except queue.Empty:
+            pass
+        self._after_id = self.root.after(self.poll_ms, self._poll)
@@ -0,0 +1,159 @@
+# ledgers.py
+# Multiple ledgers (households/accounts), one SQLite file each
+# Every ledger keeps its own tables and indexes, so queries on one ledger never scan
+# another's rows; cross-ledger rollups ATTACH the files read-only into one connection
+# Usage: python ledgers.py list | create NAME | rollup [--month YYYY-MM] [NAME ...]
+
+import argparse
+import datetime
+import os
+import re
+import sqlite3
+import sys
+from decimal import Decimal, ROUND_HALF_UP
+from db_utils import DB_FILE, SPENDING_FILTER, _month_bounds, create_connection, file_uri
+from utils import parse_month
+
+LEDGER_DIR = 'ledgers'
+DEFAULT_LEDGER = 'default'  # The original finance.db
+ATTACH_BATCH = 10           # SQLite's default limit on attached databases per connection
+_NAME_RE = re.compile(r'^[A-Za-z0-9_-]{1,40}$')
+
+def ledger_path(name):
+    """ Database file for a ledger name. Raises ValueError for names that are not safe file names. """
+    if name == DEFAULT_LEDGER: return DB_FILE
+    if not _NAME_RE.match(name or ''): raise ValueError(f"Invalid ledger name '{name}' (letters, digits, '-' and '_' only).")
+    return os.path.join(LEDGER_DIR, f"{name}.db")
+
+def list_ledgers():
+    """ [(name, path)] for the default ledger (when it exists) and every ledger in LEDGER_DIR. """
+    found = [(DEFAULT_LEDGER, DB_FILE)] if os.path.exists(DB_FILE) else []
+    if os.path.isdir(LEDGER_DIR):
+        found += [(f[:-3], os.path.join(LEDGER_DIR, f)) for f in sorted(os.listdir(LEDGER_DIR)) if f.endswith('.db') and _NAME_RE.match(f[:-3])]
+    return found
+
+def create_ledger(name):
+    """ Creates (or updates the schema of) a ledger's database file. Returns its path. """
+    from database_setup import setup_database
+    path = ledger_path(name)
+    if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+    setup_database(path)
+    return path
+
+def add_source_arguments(parser):
+    """ Adds the --ledger NAME / --db FILE choice shared by the command-line tools; resolve it with resolve_db_file. """
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--ledger', help="Ledger name (see ledgers.py)")
+    source.add_argument('--db', default=DB_FILE, help=f"Database file (default: {DB_FILE})")
+    return source
+
+def resolve_db_file(args):
+    """ The database file picked by add_source_arguments' options. Raises ValueError for an invalid ledger name. """
+    return ledger_path(args.ledger) if args.ledger else args.db
+
+def db_file_from_argv(argv):
+    """ Resolves `--ledger NAME` / `--ledger=NAME` in argv to a database file; DB_FILE when absent. """
+    for i, arg in enumerate(argv):
+        if arg == '--ledger' and i + 1 < len(argv): return ledger_path(argv[i + 1])
+        if arg.startswith('--ledger='): return ledger_path(arg.split('=', 1)[1])
+    return DB_FILE
+
+# --- Cross-ledger rollups ---
+def _ensure_schemas(ledgers):
+    """
+    Migrates ledgers from older versions before they are attached read-only, since the rollup reads the
+    category flag columns. Costs one PRAGMA per current ledger. Returns the names that could not be updated.
+    """
+    from database_setup import ensure_schema
+    failed = []
+    for name, path in ledgers:
+        conn = create_connection(path) if os.path.exists(path) else None
+        try: ok = conn is not None and ensure_schema(conn)
+        finally:
+            if conn: conn.close()
+        if not ok: failed.append(name)
+    return failed
+
+def _ledger_sql(alias):
+    """ One ledger's month figures: per-category spending rows plus a '' row carrying income. """
+    return f"""
+        SELECT ? AS ledger, c.name AS category, TOTAL(t.amount) AS spending, 0.0 AS income
+        FROM {alias}.transactions t JOIN {alias}.categories c ON c.id = t.category_id
+        WHERE t.is_income = 0 AND t.transaction_date >= ? AND t.transaction_date < ? AND {SPENDING_FILTER}
+        GROUP BY c.name
+        UNION ALL
+        SELECT ?, '', 0.0, TOTAL(t.amount)
+        FROM {alias}.transactions t LEFT JOIN {alias}.categories c ON c.id = t.category_id
+        WHERE t.is_income = 1 AND t.transaction_date >= ? AND t.transaction_date < ? AND COALESCE(c.exclude_income, 0) = 0
+    """
+
+def rollup_month(ledgers=None, year=None, month=None):
+    """
+    Combines one month across ledgers ([(name, path)], default all) with the same exclusions as the dashboard.
+    Returns {ledger: {'income': Decimal, 'spending': Decimal, 'by_category': {name: Decimal}}}, or None on error.
+    Each ledger's part uses that ledger's own date index. Ledgers from older versions are migrated first,
+    then attached in batches of ATTACH_BATCH.
+    """
+    today = datetime.date.today()
+    bounds = _month_bounds(year or today.year, month or today.month)
+    ledgers = list_ledgers() if ledgers is None else ledgers
+    stale = _ensure_schemas(ledgers)
+    if stale: print(f"Ledger(s) need migrating before a rollup: {', '.join(stale)} (run 'python ledgers.py create NAME')"); return None
+    q = lambda v: Decimal(str(v)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    result = {name: {'income': Decimal('0.00'), 'spending': Decimal('0.00'), 'by_category': {}} for name, _ in ledgers}
+    conn = None
+    try:
+        conn = sqlite3.connect('file::memory:', uri=True); conn.row_factory = sqlite3.Row # uri=True lets ATTACH open the ledgers read-only
+        for b in range(0, len(ledgers), ATTACH_BATCH):
+            batch = ledgers[b:b + ATTACH_BATCH]; parts = []; params = []
+            for i, (name, path) in enumerate(batch):
+                conn.execute(f"ATTACH DATABASE ? AS l{i}", (file_uri(path, readonly=True),))
+                parts.append(_ledger_sql(f"l{i}")); params += [name, *bounds, name, *bounds]
+            try:
+                for r in conn.execute(" UNION ALL ".join(parts), params).fetchall():
+                    entry = result[r['ledger']]
+                    if r['category']: entry['by_category'][r['category']] = q(r['spending']); entry['spending'] += q(r['spending'])
+                    else: entry['income'] = q(r['income'])
+            finally:
+                for i in range(len(batch)): conn.execute(f"DETACH DATABASE l{i}")
+    except sqlite3.Error as e: print(f"DB error building ledger rollup: {e}"); return None
+    finally:
+        if conn: conn.close()
+    return result
+
+def print_rollup(rollup, label):
+    print(f"\n--- Ledger Rollup: {label} ---")
+    print(f"{'Ledger':<20} {'Income':>12} {'Spending':>12} {'Net':>12}")
+    print("-" * 59)
+    total_in = total_out = Decimal('0.00')
+    for name, r in sorted(rollup.items()):
+        print(f"{name:<20} {r['income']:>12,.2f} {r['spending']:>12,.2f} {r['income'] - r['spending']:>12,.2f}")
+        total_in += r['income']; total_out += r['spending']
+    print("-" * 59)
+    print(f"{'All ledgers':<20} {total_in:>12,.2f} {total_out:>12,.2f} {total_in - total_out:>12,.2f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage ledgers and combine them.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help="List ledgers")
+    p = sub.add_parser('create', help="Create a ledger database"); p.add_argument('name')
+    p = sub.add_parser('rollup', help="Income and spending for one month across ledgers")
+    p.add_argument('--month', help="YYYY-MM (default: current month)"); p.add_argument('names', nargs='*', help="Ledgers to include (default: all)")
+    args = parser.parse_args(argv)
+    try:
+        if args.command == 'list':
+            for name, path in list_ledgers(): print(f"{name:<20} {path}")
+        elif args.command == 'create': print(f"Ledger '{args.name}' ready at {create_ledger(args.name)}.")
+        else:
+            year, month = parse_month(args.month) if args.month else (None, None)
+            ledgers = [(n, ledger_path(n)) for n in args.names] if args.names else list_ledgers()
+            missing = [n for n, path in ledgers if not os.path.exists(path)]
+            if missing: print(f"Ledger(s) not found: {', '.join(missing)}"); return 1
+            rollup = rollup_month(ledgers, year, month)
+            if rollup is None: return 1
+            print_rollup(rollup, args.month or datetime.date.today().strftime('%Y-%m'))
+    except ValueError as e: print(e); return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
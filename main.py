@@ -5,37 +5,51 @@
 import os
 import sys
 import sqlite3 # For exception handling during connection
+import profiling
+import columnar_cache
 # Import necessary functions from modules
-from db_utils import create_connection, get_gamification_points
-from csv_importer import import_csv
+from db_utils import create_connection, get_gamification_points, get_upload_streak
 from categorizer import categorize_transactions
 # Import budget functions AND the summary view now
-from budget_manager import manage_budget_menu, set_budgets_from_averages_wrapper, set_budgets_to_minimums_wrapper, view_spending_summary
+from budget_manager import manage_budget_menu, set_budgets_from_averages_wrapper, set_budgets_to_minimums_wrapper, view_spending_summary, view_spending_report, manage_category_flags_menu
 from debt_manager import manage_debts_menu, check_debt_strategy_affordability
+from ledgers import db_file_from_argv
+from database_setup import ensure_schema
 
 DB_FILE = 'finance.db'
 
 # --- Main Execution ---
 if __name__ == '__main__':
-    if not os.path.exists(DB_FILE): print(f"DB '{DB_FILE}' not found. Run 'python database_setup.py'."); sys.exit(1)
+    if '--profile' in sys.argv[1:]: profiling.enable() # Or set DODOFIN_PROFILE=1; summary prints on exit
+    if '--columnar' in sys.argv[1:]: columnar_cache.enable() # Or set DODOFIN_COLUMNAR=1; analytics run on in-memory NumPy columns
+    try: DB_FILE = db_file_from_argv(sys.argv[1:]) # --ledger NAME opens ledgers/NAME.db (create it with 'python ledgers.py create NAME')
+    except ValueError as e: print(e); sys.exit(1)
+    if not os.path.exists(DB_FILE): print(f"DB '{DB_FILE}' not found. Run 'python database_setup.py' or 'python ledgers.py create NAME'."); sys.exit(1)
     db_conn = create_connection(DB_FILE)
+    if db_conn and not ensure_schema(db_conn): db_conn.close(); sys.exit(1) # Files from older versions are migrated here
     if db_conn:
-        print("DB connection ok."); print(f"(Points: {get_gamification_points(db_conn)})")
+        print(f"DB connection ok ({DB_FILE})."); print(f"(Points: {get_gamification_points(db_conn)})")
         while True:
             print("\n--- Main Menu ---")
             print("1: Import CSV        2: Categorize Txns")
             print("3: Manage Budget     4: View Summary") # No longer placeholder
             print("5: Auto-Budget      6: Tighten Budget (Min Spend)")
             print("7: Manage Debts      8: Check Debt Affordability")
-            print("p: Show Points       q: Quit")
+            print("9: Spending Report   p: Show Points")
+            print("c: Category Settings d: Review Duplicates")
+            print("q: Quit")
             choice = input("Enter choice: ").strip().lower()
 
             try: # Wrap menu actions in a general try/except
                 if choice == '1':
                     csv_path = input("Enter CSV file path: ").strip()
                     if csv_path:
-                        imp, upd, skp = import_csv(db_conn, csv_path)
-                        if imp > 0 or upd > 0: # Check if imported OR updated
+                        from csv_importer import import_csv, default_backend, IMPORT_BACKENDS, DatabaseBusyError # pandas itself loads only for the pandas backend
+                        default = default_backend(db_conn)
+                        backend = input(f"Importer [{'/'.join(IMPORT_BACKENDS)}] (Enter for {default}): ").strip().lower() or default
+                        try: result = import_csv(db_conn, csv_path, backend=backend)
+                        except DatabaseBusyError: print("Another program is writing to the database. Try the import again in a moment."); result = None
+                        if result and (result[0] > 0 or result[1] > 0): # Check if imported OR updated
                              print("\nRun option '2' to categorize any remaining uncategorized transactions.")
                     else: print("No path entered.")
                 elif choice == '2': categorize_transactions(db_conn)
@@ -46,7 +60,14 @@ if __name__ == '__main__':
                 elif choice == '6': set_budgets_to_minimums_wrapper(db_conn)
                 elif choice == '7': manage_debts_menu(db_conn)
                 elif choice == '8': check_debt_strategy_affordability(db_conn)
-                elif choice == 'p': print(f"Current points: {get_gamification_points(db_conn)}")
+                elif choice == '9': view_spending_report(db_conn)
+                elif choice == 'c': manage_category_flags_menu(db_conn)
+                elif choice == 'd':
+                    from duplicates import review_duplicates
+                    review_duplicates(db_conn)
+                elif choice == 'p':
+                    streak, last = get_upload_streak(db_conn)
+                    print(f"Current points: {get_gamification_points(db_conn)}  |  Import streak: {streak} week(s){f' (last import {last})' if last else ''}")
                 elif choice == 'q': break
                 else: print("Invalid choice.")
             except Exception as e:
@@ -57,7 +78,12 @@ if __name__ == '__main__':
                  traceback.print_exc()
                  print("--------------------------")
 
-        # Close connection when loop terminates
+        # Close connection when loop terminates (after statistics/vacuum, if their thresholds are crossed;
+        # the weekly integrity check is left to the watcher and 'python maintenance.py run')
+        try:
+            from maintenance import run_if_due
+            for task, outcome in (run_if_due(db_conn, integrity=False) or {}).items(): print(f"Maintenance {task}: {outcome}")
+        except sqlite3.Error as e: print(f"Maintenance skipped: {e}")
         try: db_conn.close(); print("\nDB connection closed. Goodbye!")
         except sqlite3.Error as e: print(f"Error closing DB: {e}")
     else: print("DB connection failed. Exiting."); sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,208 @@
+# maintenance.py
+# Keeps a ledger database fast and healthy: planner statistics (ANALYZE / PRAGMA optimize),
+# incremental vacuum of free pages, WAL checkpoints and a periodic integrity check.
+# Each task runs only when its threshold is crossed; run_if_due() is cheap enough to call after
+# every import (the watcher does) and when the menu exits (without the integrity check there).
+# The explicit 'run' command also converts a file created before auto_vacuum=INCREMENTAL (one VACUUM).
+# State is kept in app_settings.
+# Usage: python maintenance.py [--ledger NAME | --db FILE] [run [--force] [--integrity] | report]
+
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import time
+import db_utils
+from ledgers import add_source_arguments, resolve_db_file
+
+ANALYZE_MIN_CHANGES = 1000        # Rows inserted/deleted since the last ANALYZE before it runs again...
+ANALYZE_CHANGE_RATIO = 0.10       # ...and at least this share of the rows
+ANALYSIS_LIMIT = 1000             # Rows ANALYZE samples per index (bounds its cost on big ledgers)
+FREE_PAGE_RATIO = 0.10            # Free pages / all pages before an incremental vacuum
+MIN_FREE_PAGES = 256              # ...and at least this many (1 MB at 4 KB pages)
+VACUUM_STEP_PAGES = 512           # Pages freed per write transaction, so other writers get a turn
+WAL_TRUNCATE_BYTES = 16 * 1048576 # A WAL bigger than this is checkpointed and truncated
+INTEGRITY_INTERVAL_DAYS = 7       # Days between full integrity checks
+MIN_INTERVAL_MINUTES = 60         # run_if_due() does nothing if maintenance ran more recently
+STATE_KEY = 'maintenance_state'   # app_settings key: JSON with table counts and last run times
+
+def _load_state(conn):
+    try: return json.loads(db_utils.get_setting(conn, STATE_KEY) or '{}')
+    except ValueError: return {}
+
+def _save_state(conn, state):
+    db_utils.set_setting(conn, STATE_KEY, json.dumps(state, sort_keys=True))
+
+def _ago(stamp, now):
+    """ Seconds since an ISO timestamp from the state, or None if it was never set. """
+    return (now - datetime.datetime.fromisoformat(stamp)).total_seconds() if stamp else None
+
+def table_counts(conn):
+    """ {table: [rows, max rowid]} for every user table (max rowid is None for WITHOUT ROWID tables). """
+    counts = {}
+    tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+    for table in tables:
+        try: counts[table] = list(conn.execute(f'SELECT COUNT(*), MAX(rowid) FROM "{table}"').fetchone())
+        except sqlite3.OperationalError: counts[table] = [conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0], None]
+    return counts
+
+def rows_changed(before, after):
+    """ Rows inserted plus rows deleted between two table_counts() results (updates are not counted). """
+    changed = 0
+    for table, (rows, max_id) in after.items():
+        old_rows, old_max = before.get(table, [0, 0])
+        if max_id is not None and old_max is not None:
+            inserted = max(0, max_id - old_max); changed += inserted + max(0, old_rows + inserted - rows)
+        else: changed += abs(rows - old_rows)
+    return changed
+
+def page_stats(conn):
+    """ (page_count, freelist_count, page_size, auto_vacuum mode). """
+    return tuple(conn.execute(f"PRAGMA {p}").fetchone()[0] for p in ('page_count', 'freelist_count', 'page_size', 'auto_vacuum'))
+
+def due_tasks(conn, state=None, now=None):
+    """ {task: reason} for the tasks whose thresholds are crossed. Reads counts and page stats only. """
+    state = _load_state(conn) if state is None else state; now = now or datetime.datetime.now(); due = {}
+    counts = table_counts(conn); total = sum(rows for rows, _ in counts.values())
+    changed = rows_changed(state.get('counts', {}), counts)
+    has_stats = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone() is not None
+    if not has_stats: due['analyze'] = "no planner statistics yet"
+    elif changed >= ANALYZE_MIN_CHANGES and changed >= ANALYZE_CHANGE_RATIO * total: due['analyze'] = f"{changed} rows changed since last ANALYZE"
+    pages, free, _, auto_vacuum = page_stats(conn)
+    if free >= MIN_FREE_PAGES and free >= FREE_PAGE_RATIO * pages:
+        due['vacuum'] = f"{free} of {pages} pages free" + ("" if auto_vacuum == 2 else " (auto_vacuum is off: 'python maintenance.py run' converts the file once)")
+    wal_file = _wal_path(conn)
+    if wal_file and os.path.exists(wal_file) and os.path.getsize(wal_file) >= WAL_TRUNCATE_BYTES:
+        due['checkpoint'] = f"WAL is {os.path.getsize(wal_file) / 1048576:.0f} MB"
+    since = _ago(state.get('integrity_at'), now)
+    if since is None or since >= INTEGRITY_INTERVAL_DAYS * 86400:
+        due['integrity'] = "never checked" if since is None else f"last checked {since / 86400:.0f} days ago"
+    return due
+
+def _wal_path(conn):
+    """ The WAL file of conn's main database, or None if it is not in WAL mode. """
+    if conn.execute("PRAGMA journal_mode").fetchone()[0].lower() != 'wal': return None
+    path = next((r[2] for r in conn.execute("PRAGMA database_list") if r[1] == 'main'), None)
+    return f"{path}-wal" if path else None
+
+def incremental_vacuum(conn, step=VACUUM_STEP_PAGES):
+    """ Returns free pages to the file system in step-sized transactions. Returns pages freed. """
+    freed = 0
+    while True:
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free == 0: break
+        conn.execute(f"PRAGMA incremental_vacuum({min(step, free)})").fetchall(); conn.commit()
+        after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if after >= free: break # auto_vacuum is off, so nothing can be freed
+        freed += free - after
+    return freed
+
+def convert_to_incremental(conn):
+    """ Rewrites a file whose auto_vacuum is not INCREMENTAL with one VACUUM. Returns seconds taken, or None if already converted. """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2: return None
+    start = time.perf_counter()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL"); conn.execute("VACUUM")
+    return time.perf_counter() - start
+
+def run_maintenance(conn, force=False, integrity=None, convert=False):
+    """
+    Runs the due tasks (all of them with force=True; integrity=True/False overrides the integrity schedule)
+    and always PRAGMA optimize. convert=True first rewrites a file that is not auto_vacuum=INCREMENTAL yet.
+    Returns a report {task: outcome}; tasks that did not run are absent.
+    """
+    now = datetime.datetime.now(); state = _load_state(conn); report = {}
+    due = due_tasks(conn, state, now)
+    if force: due = dict.fromkeys(('analyze', 'vacuum', 'checkpoint', 'integrity'), "forced")
+    if integrity is not None:
+        if integrity: due['integrity'] = "requested"
+        else: due.pop('integrity', None)
+    try:
+        if convert:
+            took = convert_to_incremental(conn)
+            if took is not None: report['convert'] = f"rewrote the file for incremental vacuum in {took:.1f}s"; due.pop('vacuum', None)
+        if 'analyze' in due:
+            start = time.perf_counter()
+            conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}"); conn.execute("ANALYZE"); conn.commit()
+            state['counts'] = table_counts(conn); state['analyze_at'] = now.isoformat(timespec='seconds')
+            report['analyze'] = f"{due['analyze']}; ANALYZE took {time.perf_counter() - start:.2f}s"
+        conn.execute("PRAGMA optimize") # Re-analyzes only what the queries since the last call show is stale
+        if 'vacuum' in due:
+            pages, free, page_size, auto_vacuum = page_stats(conn)
+            if auto_vacuum == 2: freed = incremental_vacuum(conn); report['vacuum'] = f"freed {freed} pages ({freed * page_size / 1048576:.1f} MB)"
+            else: report['vacuum'] = f"skipped: {due['vacuum']}"
+        wal_file = _wal_path(conn)
+        if wal_file:
+            mode = 'TRUNCATE' if 'checkpoint' in due or 'vacuum' in report else 'PASSIVE'
+            wal_mb = lambda: os.path.getsize(wal_file) / 1048576 if os.path.exists(wal_file) else 0.0
+            before = wal_mb(); busy = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()[0]
+            if mode == 'TRUNCATE' or busy: report['checkpoint'] = f"{mode}: WAL {before:.1f} MB -> {wal_mb():.1f} MB" + (" (readers busy, will retry)" if busy else "")
+        if 'integrity' in due:
+            start = time.perf_counter()
+            rows = [r[0] for r in conn.execute("PRAGMA integrity_check").fetchall()]
+            state['integrity_at'] = now.isoformat(timespec='seconds'); state['integrity_ok'] = rows == ['ok']
+            report['integrity'] = ("ok" if rows == ['ok'] else f"PROBLEMS: {'; '.join(rows[:5])}") + f" ({time.perf_counter() - start:.2f}s)"
+    except sqlite3.Error as e:
+        conn.rollback(); report['error'] = str(e); print(f"Maintenance error: {e}")
+    state['run_at'] = now.isoformat(timespec='seconds'); _save_state(conn, state)
+    return report
+
+def run_if_due(conn, min_interval_minutes=MIN_INTERVAL_MINUTES, integrity=None):
+    """
+    run_maintenance() unless it ran within min_interval_minutes (integrity=False keeps the full
+    integrity check out, for interactive callers). Never converts the file. Returns the report, or None if skipped.
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'app_settings'").fetchone() is None: return None # Not set up yet: nowhere to keep state
+    since = _ago(_load_state(conn).get('run_at'), datetime.datetime.now())
+    if since is not None and since < min_interval_minutes * 60: return None
+    return run_maintenance(conn, integrity=integrity)
+
+def size_report(conn):
+    """ [(name, type, table, bytes, unused bytes)] per table and index, largest first; None without dbstat. """
+    try:
+        return conn.execute("""
+            SELECT s.name, COALESCE(m.type, 'table') AS type, COALESCE(m.tbl_name, s.name) AS tbl, SUM(s.pgsize) AS bytes, SUM(s.unused) AS unused
+            FROM dbstat s LEFT JOIN sqlite_master m ON m.name = s.name GROUP BY s.name ORDER BY bytes DESC
+        """).fetchall()
+    except sqlite3.OperationalError: return None # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB
+
+def print_report(conn):
+    pages, free, page_size, auto_vacuum = page_stats(conn); state = _load_state(conn)
+    print(f"\nFile: {pages * page_size / 1048576:.1f} MB in {pages} pages, {free} free ({free / pages:.1%}), auto_vacuum={('none', 'full', 'incremental')[auto_vacuum]}")
+    print(f"Last run: {state.get('run_at', 'never')}   ANALYZE: {state.get('analyze_at', 'never')}   Integrity check: {state.get('integrity_at', 'never')}"
+          + ("" if state.get('integrity_ok', True) else "  (FAILED)"))
+    sizes = size_report(conn)
+    if sizes is None: print("Table and index sizes need SQLite's dbstat table, which this build lacks.")
+    else:
+        print(f"\n{'Name':<36} {'Type':<6} {'Table':<24} {'Size':>10} {'Unused':>7}")
+        print("-" * 87)
+        for r in sizes: print(f"{r['name'][:36]:<36} {r['type']:<6} {r['tbl'][:24]:<24} {r['bytes'] / 1024:>8.0f}KB {r['unused'] / max(r['bytes'], 1):>7.0%}")
+    due = due_tasks(conn, state)
+    print("\nDue: " + ("; ".join(f"{task} ({why})" for task, why in due.items()) if due else "nothing"))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Database maintenance: statistics, vacuum, checkpoints, integrity.")
+    add_source_arguments(parser)
+    sub = parser.add_subparsers(dest='command')
+    p = sub.add_parser('run', help="Run the due tasks (default)"); p.add_argument('--force', action='store_true', help="Run every task")
+    p.add_argument('--integrity', action='store_true', help="Run the integrity check even if it is not due")
+    sub.add_parser('report', help="Show file, table and index sizes and what is due")
+    args = parser.parse_args(argv)
+    try: db_file = resolve_db_file(args)
+    except ValueError as e: print(e); return 2
+    if not os.path.exists(db_file): print(f"DB '{db_file}' not found."); return 1
+    conn = db_utils.create_connection(db_file)
+    if conn is None: return 1
+    try:
+        db_utils.tune_connection(conn)
+        if args.command == 'report': print_report(conn); return 0
+        report = run_maintenance(conn, force=getattr(args, 'force', False), integrity=True if getattr(args, 'integrity', False) else None, convert=True)
+        for task, outcome in report.items(): print(f"{task:<11} {outcome}")
+        if not report: print("Nothing due (PRAGMA optimize ran).")
+        return 1 if 'error' in report or 'PROBLEMS' in report.get('integrity', '') else 0
+    except sqlite3.Error as e: print(f"Maintenance error: {e}"); return 1
+    finally: conn.close()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+# payoff_monte_carlo.py
+# Vectorized Monte Carlo engine for debt payoff risk analysis
+# Simulates many payoff paths at once as (paths x debts) NumPy arrays
+
+import datetime
+from decimal import Decimal, ROUND_HALF_UP
+import numpy as np
+from db_utils import get_debts
+
+DEFAULT_PATHS = 10000
+DEFAULT_SEED = 12345
+MAX_MONTHS = 1000 # Same cap as the deterministic simulate_payoff
+ZERO_THRESHOLD = 0.005
+PERCENTILES = (5, 25, 50, 75, 95)
+PROGRESS_EVERY = 12 # Simulated months between progress_callback calls; cancellation is checked every month
+
+# Monthly probabilities / sizes of the random events applied to every path
+DEFAULT_ASSUMPTIONS = {
+    'rate_reset_prob': 0.02,       # Chance per debt per month that the APR resets
+    'rate_reset_sd': 2.0,          # Std dev of a reset, in APR percentage points
+    'max_rate': 36.0,              # APR ceiling after resets
+    'missed_payment_prob': 0.01,   # Chance per month that nothing is paid
+    'reduced_payment_prob': 0.05,  # Chance per month that only minimums are paid
+    'income_shock_prob': 0.005,    # Chance per month that an income shock starts
+    'income_shock_months': 3,      # How long a shock lasts
+    'income_shock_factor': 0.5,    # Share of the planned payment available during a shock
+}
+
+def _allocate(budget, due, order):
+    """ Pays `due` (paths x debts) in `order` from `budget` (paths,). Returns paid amounts. """
+    due_sorted = np.take_along_axis(due, order, axis=1)
+    paid_before = np.cumsum(due_sorted, axis=1) - due_sorted
+    paid_sorted = np.clip(budget[:, None] - paid_before, 0.0, due_sorted)
+    paid = np.empty_like(paid_sorted)
+    np.put_along_axis(paid, order, paid_sorted, axis=1)
+    return paid
+
+def run_payoff_monte_carlo(debts, strategy, total_monthly_payment, n_paths=DEFAULT_PATHS, seed=DEFAULT_SEED, assumptions=None,
+                           progress_callback=None, cancel_event=None):
+    """
+    Runs n_paths stochastic payoff simulations for the given debts (as returned by get_debts).
+    Each month every path may see APR resets, a missed month, a minimums-only month
+    or the start of an income shock. Returns a dict of per-path arrays and percentiles,
+    or None if the inputs are invalid or the run was cancelled.
+
+    :param progress_callback: Optional callable(paths_finished, n_paths) invoked as paths pay off
+    :param cancel_event: Optional threading.Event; when set, the run stops at the next month
+    """
+    strategy = strategy.lower()
+    if strategy not in ('snowball', 'avalanche'): print("Error: Unknown strategy."); return None
+    if not debts: print("No debts to simulate."); return None
+    params = dict(DEFAULT_ASSUMPTIONS)
+    if assumptions: params.update(assumptions)
+
+    payment = float(total_monthly_payment)
+    balance0 = np.array([float(d['current_balance']) for d in debts])
+    rate0 = np.array([float(d['interest_rate']) for d in debts])
+    minimum = np.array([float(d['minimum_payment']) for d in debts])
+    if payment < minimum.sum():
+        print(f"Error: Total payment (${payment:.2f}) < total minimums (${minimum.sum():.2f})."); return None
+
+    rng = np.random.default_rng(seed)
+    n_debts = len(debts)
+    balance = np.tile(balance0, (n_paths, 1))
+    rate = np.tile(rate0, (n_paths, 1))
+    shock_left = np.zeros(n_paths, dtype=np.int64)
+    total_interest = np.zeros(n_paths)
+    payoff_month = np.full(n_paths, -1, dtype=np.int64)
+    # Minimums are always paid in the stored (name) order, like simulate_payoff
+    min_order = np.tile(np.arange(n_debts), (n_paths, 1))
+
+    month = 0
+    active = (balance > ZERO_THRESHOLD).any(axis=1)
+    payoff_month[~active] = 0
+    while active.any() and month < MAX_MONTHS:
+        if cancel_event is not None and cancel_event.is_set(): print("Simulation cancelled."); return None
+        if progress_callback and month % PROGRESS_EVERY == 0: progress_callback(int((~active).sum()), n_paths)
+        month += 1
+        # 1. Rate resets
+        resets = rng.random((n_paths, n_debts)) < params['rate_reset_prob']
+        if resets.any():
+            shifted = rate + rng.normal(0.0, params['rate_reset_sd'], (n_paths, n_debts))
+            rate = np.where(resets, np.clip(shifted, 0.0, params['max_rate']), rate)
+
+        # 2. Interest on open balances
+        open_ = balance > ZERO_THRESHOLD
+        interest = np.where(open_, np.round(balance * rate / 1200.0, 2), 0.0)
+        balance += interest
+        total_interest += interest.sum(axis=1)
+
+        # 3. This month's payment budget per path
+        new_shock = (shock_left == 0) & (rng.random(n_paths) < params['income_shock_prob'])
+        shock_left[new_shock] = params['income_shock_months']
+        budget = np.full(n_paths, payment)
+        budget = np.where(shock_left > 0, payment * params['income_shock_factor'], budget)
+        shock_left = np.maximum(shock_left - 1, 0)
+        min_due = np.minimum(np.where(open_, minimum, 0.0), balance)
+        reduced = rng.random(n_paths) < params['reduced_payment_prob']
+        budget = np.where(reduced, np.minimum(budget, min_due.sum(axis=1)), budget)
+        missed = rng.random(n_paths) < params['missed_payment_prob']
+        budget = np.where(missed | ~active, 0.0, budget)
+
+        # 4. Minimums, then extra by strategy order
+        paid = _allocate(budget, min_due, min_order)
+        balance -= paid
+        extra = budget - paid.sum(axis=1)
+        if (extra > ZERO_THRESHOLD).any():
+            if strategy == 'snowball': order = np.lexsort((-rate, balance), axis=1)
+            else: order = np.lexsort((balance, -rate), axis=1)
+            balance -= _allocate(extra, np.maximum(balance, 0.0), order)
+
+        # 5. Close out paid-off debts and finished paths
+        balance = np.where(balance > ZERO_THRESHOLD, balance, 0.0)
+        finished = active & ~(balance > 0.0).any(axis=1)
+        payoff_month[finished] = month
+        active &= ~finished
+
+    if progress_callback: progress_callback(n_paths, n_paths)
+    paid_off = payoff_month >= 0
+    results = {
+        'strategy': strategy, 'paths': n_paths, 'seed': seed, 'assumptions': params,
+        'total_monthly_payment': Decimal(str(total_monthly_payment)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+        'payoff_months': payoff_month, 'total_interest': total_interest,
+        'paid_off_share': float(paid_off.mean()),
+        'months_percentiles': {}, 'interest_percentiles': {}, 'payoff_date_percentiles': {},
+    }
+    if paid_off.any():
+        month_pcts = np.percentile(payoff_month[paid_off], PERCENTILES)
+        interest_pcts = np.percentile(total_interest[paid_off], PERCENTILES)
+        today = datetime.date.today()
+        for p, m, i in zip(PERCENTILES, month_pcts, interest_pcts):
+            m = int(np.ceil(m))
+            results['months_percentiles'][p] = m
+            results['interest_percentiles'][p] = Decimal(str(float(i))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            y, mo = divmod(today.month - 1 + m, 12)
+            results['payoff_date_percentiles'][p] = datetime.date(today.year + y, mo + 1, 1).strftime('%Y-%m')
+    return results
+
+def simulate_payoff_monte_carlo(conn, strategy, total_monthly_payment, n_paths=DEFAULT_PATHS, seed=DEFAULT_SEED, assumptions=None,
+                                progress_callback=None, cancel_event=None):
+    """ Runs the Monte Carlo engine over the debts currently stored in the database. """
+    debts = get_debts(conn)
+    if not debts: print("No debts to simulate."); return None
+    return run_payoff_monte_carlo(debts, strategy, total_monthly_payment, n_paths=n_paths, seed=seed, assumptions=assumptions,
+                                  progress_callback=progress_callback, cancel_event=cancel_event)
+
+def display_monte_carlo_results(results):
+    """ Prints the percentile summary of a Monte Carlo run. """
+    if not results: print("Nothing to display."); return
+    print(f"\n--- Monte Carlo Payoff Risk: {results['strategy'].title()}, ${results['total_monthly_payment']:.2f}/month ---")
+    print(f"Paths: {results['paths']:,} (seed {results['seed']})")
+    print(f"Paths paid off within {MAX_MONTHS} months: {results['paid_off_share'] * 100:.1f}%")
+    if not results['months_percentiles']: print("No path paid off all debts."); return
+    print("\n{:>10} | {:>8} | {:>12} | {:>15}".format("Percentile", "Months", "Payoff Date", "Total Interest"))
+    print("-" * 55)
+    for p in PERCENTILES:
+        print("{:>9}% | {:>8} | {:>12} | ${:>14.2f}".format(p, results['months_percentiles'][p], results['payoff_date_percentiles'][p], results['interest_percentiles'][p]))
+    print("-" * 55)
@@ -0,0 +1,211 @@
+# profiling.py
+# Opt-in SQL tracing and hot-path timing
+# Enable with `python main.py --profile` or by setting DODOFIN_PROFILE=1;
+# a per-session summary table is printed to stderr when the program exits
+
+import atexit
+import functools
+import os
+import pathlib
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+ENV_VAR = 'DODOFIN_PROFILE'
+TOP_STATEMENTS = 25     # Statements shown in the summary, slowest total first
+SQL_WIDTH = 70          # Statement text is shortened to this many characters in the table
+
+_session = None
+
+def _normalize(sql):
+    """ Collapses whitespace and IN (?,?,...) lists so repeated statements group together. """
+    sql = re.sub(r'\s+', ' ', sql).strip().rstrip(';').strip()
+    return re.sub(r'IN \((\s*\?\s*,?)+\)', 'IN (?...)', sql, flags=re.IGNORECASE)
+
+class ProfileSession:
+    """ Collected timings for one program run. Safe to update from the GUI's worker threads. """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+        self.statements = {}  # normalized sql -> {'calls', 'seconds', 'max', 'rows', 'sql', 'params', 'db_file', 'many'}
+        self.functions = {}   # module.function -> {'calls', 'seconds', 'max'}
+        self.traced = {}      # first keyword -> statements SQLite actually ran (includes implicit BEGIN/COMMIT and every executemany row)
+
+    def record_statement(self, sql, params, seconds, rows, db_file, many=False):
+        key = _normalize(sql)
+        with self.lock:
+            s = self.statements.get(key)
+            if s is None: s = self.statements[key] = {'calls': 0, 'seconds': 0.0, 'max': 0.0, 'rows': 0, 'sql': sql, 'params': params, 'db_file': db_file, 'many': many}
+            s['calls'] += 1; s['seconds'] += seconds; s['max'] = max(s['max'], seconds); s['rows'] += rows
+        return key
+
+    def record_fetch(self, key, seconds, rows):
+        """ Rows are produced while fetching, so fetch time is charged to the statement that made the cursor. """
+        with self.lock:
+            s = self.statements.get(key)
+            if s: s['seconds'] += seconds; s['rows'] += rows
+
+    def record_call(self, name, seconds):
+        with self.lock:
+            f = self.functions.setdefault(name, {'calls': 0, 'seconds': 0.0, 'max': 0.0})
+            f['calls'] += 1; f['seconds'] += seconds; f['max'] = max(f['max'], seconds)
+
+    def record_trace(self, statement):
+        keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else '?'
+        with self.lock: self.traced[keyword] = self.traced.get(keyword, 0) + 1
+
+def enable():
+    """ Starts a profiling session (once) and prints its summary at exit. Connections opened afterwards are traced. """
+    global _session
+    if _session is None:
+        _session = ProfileSession()
+        atexit.register(report)
+    return _session
+
+def is_enabled():
+    return _session is not None
+
+def enabled_from_env():
+    return os.environ.get(ENV_VAR, '').strip().lower() not in ('', '0', 'false', 'no')
+
+# --- Timing decorator ---
+def timed(func):
+    """ Records the wall time of each call while profiling is on; otherwise just calls func. """
+    name = f"{func.__module__}.{func.__qualname__}"
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        session = _session
+        if session is None: return func(*args, **kwargs)
+        start = time.perf_counter()
+        try: return func(*args, **kwargs)
+        finally: session.record_call(name, time.perf_counter() - start)
+    return wrapper
+
+# --- Traced connection / cursor ---
+class ProfilingCursor(sqlite3.Cursor):
+    """ Cursor that times execute and fetch calls and counts the rows they return. """
+    _profile_key = None
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try: return super().execute(sql, parameters)
+        finally: self._record(sql, parameters, time.perf_counter() - start, many=False)
+
+    def executemany(self, sql, seq_of_parameters):
+        first = [] # The first parameter set, kept as the sample for EXPLAIN; generators stay lazy
+        def passthrough():
+            for params in seq_of_parameters:
+                if not first: first.append(params)
+                yield params
+        start = time.perf_counter()
+        try: return super().executemany(sql, passthrough())
+        finally: self._record(sql, first[0] if first else (), time.perf_counter() - start, many=True)
+
+    def _record(self, sql, params, seconds, many):
+        session = _session
+        if session is None: return
+        rows = self.rowcount if self.rowcount > 0 else 0 # Writes report rowcount; SELECT rows are counted as they are fetched
+        self._profile_key = session.record_statement(sql, params, seconds, rows, getattr(self.connection, 'db_file', None), many)
+
+    def _timed_fetch(self, fetch, *args):
+        start = time.perf_counter()
+        result = fetch(*args)
+        if _session is not None and self._profile_key:
+            rows = len(result) if isinstance(result, list) else int(result is not None)
+            _session.record_fetch(self._profile_key, time.perf_counter() - start, rows)
+        return result
+
+    def fetchone(self): return self._timed_fetch(super().fetchone)
+    def fetchmany(self, size=None): return self._timed_fetch(super().fetchmany, size if size is not None else self.arraysize)
+    def fetchall(self): return self._timed_fetch(super().fetchall)
+    def __next__(self):
+        row = self._timed_fetch(super().fetchone)
+        if row is None: raise StopIteration
+        return row
+
+class Connection(sqlite3.Connection):
+    """ sqlite3.Connection that supports weak references, so per-connection caches do not keep closed connections alive. """
+
+class ProfilingConnection(Connection):
+    """ Connection whose cursors are ProfilingCursors and whose statements are also seen by set_trace_callback. """
+    def __init__(self, database, *args, **kwargs):
+        super().__init__(database, *args, **kwargs)
+        self.db_file = database
+        session = _session
+        if session is not None: self.set_trace_callback(session.record_trace)
+
+    def cursor(self, factory=ProfilingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def connection_factory():
+    """ The factory= argument for sqlite3.connect: traced while profiling is on, the plain class otherwise. """
+    return ProfilingConnection if _session is not None else Connection
+
+# --- Query plans ---
+def explain(db_file, sql, params=()):
+    """ Returns the EXPLAIN QUERY PLAN detail lines for sql, run on a separate read-only connection. """
+    conn = sqlite3.connect(pathlib.Path(db_file).resolve().as_uri() + "?mode=ro", uri=True)
+    try: return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+    finally: conn.close()
+
+def plan_warnings(plan):
+    """ Full table scans (SCAN without an index) and temp B-trees for sorting/grouping. """
+    warnings = []
+    for detail in plan:
+        if re.match(r'SCAN \w+$', detail): warnings.append(f"full scan: {detail[5:]}")
+        elif 'USE TEMP B-TREE' in detail: warnings.append(detail.lower())
+    return warnings
+
+def _explainable(sql):
+    return re.match(r'(WITH|SELECT|UPDATE|DELETE)\b', sql, re.IGNORECASE) is not None
+
+# --- Report ---
+def _fmt_sql(sql):
+    return sql if len(sql) <= SQL_WIDTH else sql[:SQL_WIDTH - 3] + '...'
+
+def report(file=None):
+    """ Prints the session summary: function timings, the slowest statements with plan warnings, and trace counts. """
+    session = _session
+    if session is None: return
+    out = file or sys.stderr
+    with session.lock:
+        functions = sorted(session.functions.items(), key=lambda kv: -kv[1]['seconds'])
+        statements = sorted(session.statements.items(), key=lambda kv: -kv[1]['seconds'])
+        traced = dict(session.traced)
+    elapsed = time.perf_counter() - session.started
+
+    print(f"\n--- Profile Summary ({elapsed:.1f}s session) ---", file=out)
+    if functions:
+        print("\n{:<50} | {:>6} | {:>10} | {:>9} | {:>9}".format("Function", "Calls", "Total ms", "Avg ms", "Max ms"), file=out)
+        print("-" * 94, file=out)
+        for name, f in functions:
+            print("{:<50} | {:>6} | {:>10.1f} | {:>9.2f} | {:>9.2f}".format(name[-50:], f['calls'], f['seconds'] * 1000, f['seconds'] * 1000 / f['calls'], f['max'] * 1000), file=out)
+
+    flagged = []
+    if statements:
+        print(f"\n{'SQL (top ' + str(min(TOP_STATEMENTS, len(statements))) + ' by total time)':<{SQL_WIDTH}} | {'Calls':>6} | {'Total ms':>10} | {'Avg ms':>9} | {'Rows':>8} | Plan", file=out)
+        print("-" * (SQL_WIDTH + 54), file=out)
+        for sql, s in statements[:TOP_STATEMENTS]:
+            warnings = []
+            if _explainable(sql) and not s['many'] and s['db_file'] and s['db_file'] != ':memory:':
+                try: warnings = plan_warnings(explain(s['db_file'], s['sql'], s['params'])) # First call's own SQL and parameters
+                except sqlite3.Error as e: warnings = [f"plan unavailable: {e}"]
+            if any(w.startswith('full scan') for w in warnings): flagged.append((sql, warnings))
+            plan = "; ".join(warnings) if warnings else "ok"
+            print("{:<{w}} | {:>6} | {:>10.1f} | {:>9.2f} | {:>8} | {}".format(_fmt_sql(sql), s['calls'], s['seconds'] * 1000, s['seconds'] * 1000 / s['calls'], s['rows'], plan, w=SQL_WIDTH), file=out)
+    if flagged:
+        print(f"\n{len(flagged)} statement(s) do a full table scan:", file=out)
+        for sql, warnings in flagged: print(f"  - {_fmt_sql(sql)}\n      {'; '.join(warnings)}", file=out)
+    if traced:
+        print("\nStatements run by SQLite: " + ", ".join(f"{k} {v}" for k, v in sorted(traced.items(), key=lambda kv: -kv[1])), file=out)
+    print("-" * 40, file=out)
+
+if enabled_from_env(): enable()
@@ -0,0 +1,42 @@
+# tests/test_api_server.py
+# Request values are validated before they reach the database
+
+import asyncio
+from decimal import Decimal
+import pytest
+from api_server import ApiError, ApiServer, _content_length, _decimal, _month
+from database_setup import setup_database
+
+@pytest.mark.parametrize('raw', ['1e999999999', '1e309', 'NaN', 'Infinity', '-5', 'ten'])
+def test_decimal_rejects_values_sqlite_cannot_store(raw):
+    with pytest.raises(ApiError) as e: _decimal({'amount': raw}, 'amount')
+    assert e.value.status == 400
+
+def test_decimal_accepts_money():
+    assert _decimal({'amount': '125.40'}, 'amount') == Decimal('125.40')
+
+@pytest.mark.parametrize('raw', ['2025-13', '2025', 'May'])
+def test_month_rejects_bad_values(raw):
+    with pytest.raises(ApiError): _month({'month': raw})
+
+@pytest.mark.parametrize('raw', ['-5', 'ten', '1e3', '+5', ' ', '٥'])
+def test_content_length_rejects_bad_values(raw):
+    with pytest.raises(ApiError) as e: _content_length({'content-length': raw})
+    assert e.value.status == 400
+
+def test_content_length_defaults_to_zero():
+    assert _content_length({}) == 0 and _content_length({'content-length': '42'}) == 42
+
+def test_bad_content_length_gets_400_and_close(tmp_path):
+    path = str(tmp_path / 'ledger.db'); setup_database(path)
+    async def exchange():
+        api = ApiServer(path, 1, cache=False); port = await api.start('127.0.0.1', 0)
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b"POST /budgets HTTP/1.1\r\nHost: x\r\nContent-Length: -5\r\n\r\n{}"); await writer.drain()
+            response = await reader.read() # The server closes the connection after answering
+            writer.close()
+            return response
+        finally: await api.close()
+    head = asyncio.run(exchange()).split(b"\r\n\r\n")[0]
+    assert head.startswith(b"HTTP/1.1 400 ") and b"Connection: close" in head
@@ -0,0 +1,39 @@
+# tests/test_arrow_export.py
+# Edits that keep a month's totals the same must still mark its partition for rewriting
+
+import pytest
+import db_utils
+from arrow_export import _partition_fingerprints
+from database_setup import setup_database
+
+ROWS = [('2025-01-03', 'MARKET', 18.40), ('2025-01-17', 'CAFE', 4.10), ('2025-02-11', 'RENT', 2169.54)]
+
+@pytest.fixture
+def conn(tmp_path):
+    path = str(tmp_path / 'ledger.db'); setup_database(path)
+    conn = db_utils.create_connection(path)
+    conn.executemany("INSERT INTO transactions (transaction_date, description, amount, is_income) VALUES (?, ?, ?, 0)", ROWS)
+    conn.commit()
+    yield conn
+    conn.close()
+
+def _swap(conn, column):
+    (a, a_value), (b, b_value) = conn.execute(f"SELECT id, {column} FROM transactions WHERE transaction_date LIKE '2025-01-%' ORDER BY id")
+    conn.execute(f"UPDATE transactions SET {column} = ? WHERE id = ?", (b_value, a))
+    conn.execute(f"UPDATE transactions SET {column} = ? WHERE id = ?", (a_value, b))
+
+@pytest.mark.parametrize('edit', [
+    lambda conn: _swap(conn, 'amount'),
+    lambda conn: _swap(conn, 'transaction_date'),
+    lambda conn: _swap(conn, 'description'),
+    lambda conn: conn.execute("UPDATE transactions SET description = 'MARKEX' WHERE description = 'MARKET'"), # Same length
+], ids=['swap amounts', 'swap dates', 'swap descriptions', 'same-length description'])
+def test_fingerprint_sees_edits_that_keep_totals(conn, edit):
+    before = _partition_fingerprints(conn)
+    edit(conn)
+    after = _partition_fingerprints(conn)
+    assert after['2025-01'] != before['2025-01']
+    assert after['2025-02'] == before['2025-02']
+
+def test_fingerprint_is_stable(conn):
+    assert _partition_fingerprints(conn) == _partition_fingerprints(conn)
@@ -0,0 +1,25 @@
+# tests/test_average_spend.py
+# The all-history average divides by the months from the first to the last expense of any kind
+
+from decimal import Decimal
+import pytest
+import db_utils
+from database_setup import setup_database
+
+@pytest.fixture
+def conn(tmp_path):
+    path = str(tmp_path / 'ledger.db'); setup_database(path)
+    conn = db_utils.create_connection(path)
+    yield conn
+    conn.close()
+
+def test_all_history_span_counts_every_expense(conn):
+    groceries, transfer = db_utils.add_category(conn, 'Groceries'), db_utils.add_category(conn, 'Transfer')
+    conn.executemany("INSERT INTO transactions (transaction_date, description, amount, is_income, category_id) VALUES (?, ?, ?, 0, ?)", [
+        ('2025-01-05', 'TO SAVINGS', 500, transfer),   # Excluded from spending, but it still starts the span
+        ('2025-03-02', 'MARKET', 0.10, groceries), ('2025-04-09', 'MARKET', 0.20, groceries), ('2025-04-30', 'MARKET', 0.03, groceries),
+    ])
+    conn.commit()
+    first, last, n_months, avgs = db_utils._compute_average_spend(conn, 'all', 12, None)
+    assert (first, last, n_months) == ('2025-01', '2025-04', 4)
+    assert avgs == {groceries: Decimal('0.08')} # 0.33 / 4 months
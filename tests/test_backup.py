@@ -0,0 +1,58 @@
+# tests/test_backup.py
+# Snapshots restore the data they were taken from, and rotation keeps one per day and week
+
+import datetime
+import gzip
+import os
+import pytest
+import db_utils
+from backup import PRE_RESTORE, create_snapshot, expired_snapshots, list_snapshots, prune_snapshots, restore_snapshot, verify_snapshot
+from database_setup import setup_database
+
+@pytest.fixture
+def ledger(tmp_path):
+    path = str(tmp_path / 'ledger.db'); setup_database(path)
+    conn = db_utils.create_connection(path); db_utils.tune_connection(conn) # WAL, like the app's own connections
+    conn.executemany("INSERT INTO transactions (transaction_date, description, amount, is_income) VALUES (?, ?, ?, 0)",
+                     [(f"2025-01-{d:02d}", f"SHOP {d}", d) for d in range(1, 29)])
+    conn.commit()
+    yield path, conn
+    conn.close()
+
+def _rows(conn):
+    return conn.execute("SELECT transaction_date, description, amount FROM transactions ORDER BY id").fetchall()
+
+def test_snapshot_round_trip(ledger, tmp_path):
+    path, conn = ledger; backups = str(tmp_path / 'backups'); before = [tuple(r) for r in _rows(conn)]
+    snapshot = create_snapshot(path, backups, sleep=0)
+    assert verify_snapshot(snapshot) == [] and list_snapshots(path, backups)[0][0] == snapshot
+    conn.execute("DELETE FROM transactions WHERE amount > 10"); conn.commit()
+    safety = restore_snapshot(snapshot, path, backups)
+    assert [tuple(r) for r in _rows(conn)] == before # The open connection sees the restored data
+    assert PRE_RESTORE in os.path.basename(safety) and verify_snapshot(safety) == []
+
+def test_corrupt_snapshot_is_refused(ledger, tmp_path):
+    path, conn = ledger; backups = str(tmp_path / 'backups')
+    snapshot = create_snapshot(path, backups, sleep=0)
+    with gzip.open(snapshot, 'rb') as f: data = bytearray(f.read())
+    data[4096:8192] = b'\xff' * 4096 # Overwrite the second page
+    with gzip.open(snapshot, 'wb') as f: f.write(bytes(data))
+    assert verify_snapshot(snapshot)
+    with pytest.raises(ValueError): restore_snapshot(snapshot, path, backups)
+    assert len(_rows(conn)) == 28 and len(list_snapshots(path, backups)) == 1 # Untouched, and no pre-restore copy taken
+
+def test_rotation_keeps_newest_per_day_and_week(tmp_path):
+    folder = tmp_path / 'backups' / 'ledger'; folder.mkdir(parents=True); db_file = str(tmp_path / 'ledger.db')
+    start = datetime.datetime(2025, 3, 31, 23, 0) # A Monday
+    times = [start - datetime.timedelta(hours=12 * i) for i in range(60)] # Two a day for 30 days
+    for t in times: (folder / f"ledger-{t:%Y%m%d-%H%M%S}.db.gz").touch()
+    (folder / f"ledger-{times[-1]:%Y%m%d-%H%M%S}.{PRE_RESTORE}.db.gz").touch()
+    (folder / "notes.txt").touch()
+    snapshots = list_snapshots(db_file, str(tmp_path / 'backups'))
+    expired = expired_snapshots(snapshots, keep_daily=3, keep_weekly=3)
+    kept = sorted(set(p for p, _ in snapshots) - set(expired))
+    names = [os.path.basename(p) for p in kept]
+    daily_and_weekly = (times[0], times[2], times[4], times[16]) # Mar 31, 30 and 29, then Sunday Mar 23 for the third ISO week
+    assert names == sorted([f"ledger-{t:%Y%m%d-%H%M%S}.db.gz" for t in daily_and_weekly] + [f"ledger-{times[-1]:%Y%m%d-%H%M%S}.{PRE_RESTORE}.db.gz"])
+    assert sorted(prune_snapshots(db_file, str(tmp_path / 'backups'), 3, 3)) == sorted(expired)
+    assert sorted(os.listdir(folder)) == sorted(names + ['notes.txt'])
@@ -0,0 +1,36 @@
+# tests/test_categorizer.py
+# Manual categorization saves assignments and their points in one transaction per batch, not one per row
+
+import pytest
+import db_utils
+import categorizer
+from database_setup import setup_database
+
+@pytest.fixture
+def conn(tmp_path):
+    path = str(tmp_path / 'ledger.db'); setup_database(path)
+    conn = db_utils.create_connection(path)
+    conn.executemany("INSERT INTO transactions (transaction_date, description, amount, is_income) VALUES (?, ?, ?, 0)",
+                     [(f"2025-01-{day:02d}", f"SHOP {day}", day) for day in range(1, 8)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+def _run(conn, monkeypatch, answers, **kwargs):
+    answers = iter(answers); statements = []
+    monkeypatch.setattr('builtins.input', lambda prompt='': next(answers))
+    conn.set_trace_callback(statements.append)
+    try: categorizer.categorize_transactions(conn, **kwargs)
+    finally: conn.set_trace_callback(None)
+    return sum(s.strip().upper() == 'COMMIT' for s in statements)
+
+def test_quit_saves_assignments_in_one_commit(conn, monkeypatch):
+    points = db_utils.get_gamification_points(conn)
+    assert _run(conn, monkeypatch, ['1', 's', '1', '1', 'q']) == 1
+    assert conn.execute("SELECT COUNT(*) FROM transactions WHERE category_id IS NOT NULL").fetchone()[0] == 3
+    assert conn.execute("SELECT COUNT(*) FROM points_events WHERE event = 'categorize'").fetchone()[0] == 3
+    assert db_utils.get_gamification_points(conn) == points + 3
+
+def test_full_batches_are_flushed_as_they_fill(conn, monkeypatch):
+    assert _run(conn, monkeypatch, ['1'] * 7, batch_size=3) == 3 # Two full batches of three, then the last row at the end
+    assert conn.execute("SELECT COUNT(*) FROM transactions WHERE category_id IS NULL").fetchone()[0] == 0
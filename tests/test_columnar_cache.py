@@ -0,0 +1,113 @@
+# tests/test_columnar_cache.py
+# The columnar store must agree with SQL, notice edits to rows it already holds, and must not keep connections alive
+
+import datetime
+import gc
+import threading
+import pytest
+import db_utils
+import columnar_cache
+from benchmarks.synthetic import generate_ledger
+from database_setup import setup_database
+
+pytest.importorskip('numpy')
+
+END = datetime.date(2025, 6, 30)
+
+@pytest.fixture
+def conn(tmp_path):
+    path = str(tmp_path / 'ledger.db'); setup_database(path)
+    conn = db_utils.create_connection(path)
+    conn.executemany("INSERT INTO transactions (transaction_date, description, amount, is_income) VALUES (?, ?, ?, 0)",
+                     [('2025-01-03', 'MARKET', 18.40), ('2025-02-11', 'RENT', 2169.54), ('2025-03-07', 'CAFE', 4.10)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def ledger(tmp_path):
+    conn = db_utils.create_connection(generate_ledger(str(tmp_path / 'synthetic.db'), n_transactions=3000, years=2, end_date=END))
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def columnar():
+    was = columnar_cache.is_enabled()
+    yield
+    columnar_cache.enable() if was else columnar_cache.disable()
+
+def _store(conn):
+    columnar_cache.get_store(conn)
+    return columnar_cache._stores[columnar_cache._db_file(conn)]
+
+def _both(query):
+    columnar_cache.disable(); sql = query()
+    columnar_cache.enable(); fast = query()
+    return sql, fast
+
+def test_totals_match_sql(ledger, columnar):
+    for year, month in ((2025, 6), (2024, 2), (2023, 7)):
+        sql, fast = _both(lambda: db_utils.get_spending_for_month(ledger, year, month))
+        assert sql and fast == sql
+    sql, fast = _both(lambda: db_utils.get_spending_matrix(ledger, 24, 2025, 6))
+    assert sql['totals'] and fast == sql
+    for cid in list(sql['totals'])[:5]:
+        sql, fast = _both(lambda: db_utils.get_min_monthly_spend(ledger, cid))
+        assert fast == sql
+
+def test_append_skips_checksum(conn):
+    store = _store(conn); checksums, reloads = store.checksums, store.reloads
+    conn.execute("INSERT INTO transactions (transaction_date, description, amount, is_income) VALUES ('2025-04-01', 'GYM', 30, 0)"); conn.commit()
+    columns = columnar_cache.get_store(conn)
+    assert len(columns.id) == 4 and store.checksums == checksums and store.reloads == reloads
+
+def test_swapped_amounts_and_dates_reload(conn):
+    store = _store(conn)
+    (a, a_amount, a_date), (b, b_amount, b_date) = conn.execute("SELECT id, amount, transaction_date FROM transactions ORDER BY id LIMIT 2")
+    conn.execute("UPDATE transactions SET amount = ?, transaction_date = ? WHERE id = ?", (b_amount, b_date, a))
+    conn.execute("UPDATE transactions SET amount = ?, transaction_date = ? WHERE id = ?", (a_amount, a_date, b))
+    conn.commit()
+    reloads = store.reloads
+    columns = columnar_cache.get_store(conn)
+    assert columns is store.columns and store.reloads == reloads + 1
+    assert int(columns.cents[0]) == round(b_amount * 100) and int(columns.cents[1]) == round(a_amount * 100)
+
+def test_delete_reloads(conn):
+    store = _store(conn); reloads = store.reloads
+    conn.execute("DELETE FROM transactions WHERE description = 'RENT'"); conn.commit()
+    assert len(columnar_cache.get_store(conn).id) == 2 and store.reloads == reloads + 1
+
+def test_readers_keep_their_snapshot(conn):
+    old = columnar_cache.get_store(conn)
+    conn.execute("DELETE FROM transactions WHERE description = 'MARKET'"); conn.commit()
+    new = columnar_cache.get_store(conn)
+    assert new is not old and len(old.id) == len(old.cents) == 3 and len(new.id) == len(new.cents) == 2
+    with pytest.raises(AttributeError): old.cents = new.cents
+
+def test_concurrent_readers_see_consistent_columns(ledger):
+    db_file = columnar_cache._db_file(ledger); errors = []; done = threading.Event()
+    def read():
+        reader = db_utils.create_connection(db_file)
+        try:
+            while not done.is_set():
+                c = columnar_cache.get_store(reader)
+                if not len(c.id) == len(c.day) == len(c.cents) == len(c.category) == len(c.income): errors.append(len(c.id))
+        finally: reader.close()
+    threads = [threading.Thread(target=read) for _ in range(3)]
+    for t in threads: t.start()
+    try:
+        for i in range(40):
+            ledger.execute("INSERT INTO transactions (transaction_date, description, amount, is_income) VALUES ('2025-06-30', ?, 1, 0)", (f"ROW {i}",))
+            if i % 10 == 0: ledger.execute("UPDATE transactions SET amount = amount + 1 WHERE id = 1")
+            ledger.commit()
+    finally:
+        done.set()
+        for t in threads: t.join()
+    assert not errors
+
+def test_closed_connections_are_released(conn):
+    db_file = conn.execute("PRAGMA database_list").fetchone()['file']
+    other = db_utils.create_connection(db_file)
+    store = _store(other); assert other in store._tokens
+    other.close(); del other; gc.collect()
+    assert len(store._tokens) == 0
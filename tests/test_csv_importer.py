@@ -0,0 +1,43 @@
+# tests/test_csv_importer.py
+# import_csv must tell callers when a file was not imported, and when another writer held the lock
+
+import importlib.util
+import sqlite3
+import pytest
+import db_utils
+from csv_importer import import_csv, DatabaseBusyError
+from database_setup import setup_database
+
+BACKENDS = ['stream', pytest.param('pandas', marks=pytest.mark.skipif(not importlib.util.find_spec('pandas'), reason="pandas not installed"))]
+
+@pytest.fixture
+def ledger(tmp_path):
+    path = str(tmp_path / 'ledger.db'); setup_database(path)
+    conn = db_utils.create_connection(path)
+    yield conn
+    conn.close()
+
+def _csv(tmp_path, text):
+    path = tmp_path / 'statement.csv'; path.write_text(text)
+    return str(path)
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_missing_column_is_a_failure(ledger, tmp_path, backend):
+    assert import_csv(ledger, _csv(tmp_path, "Description,Amount\nMARKET,-4.20\n"), backend=backend) is None
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_rows_are_counted(ledger, tmp_path, backend):
+    path = _csv(tmp_path, "Date,Description,Amount,Category\n01/03/2025,MARKET,-4.20,Groceries\n01/04/2025,PAY,100,\n")
+    assert import_csv(ledger, path, backend=backend) == (2, 0, 0)
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_locked_database_raises(ledger, tmp_path, backend):
+    path = _csv(tmp_path, "Date,Description,Amount\n01/03/2025,MARKET,-4.20\n")
+    db_file = ledger.execute("PRAGMA database_list").fetchone()['file']
+    blocker = sqlite3.connect(db_file); blocker.execute("BEGIN IMMEDIATE")
+    ledger.execute("PRAGMA busy_timeout = 50")
+    try:
+        with pytest.raises(DatabaseBusyError): import_csv(ledger, path, backend=backend)
+    finally: blocker.rollback(); blocker.close()
+    assert not ledger.in_transaction
+    assert ledger.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 0
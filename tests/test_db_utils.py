@@ -0,0 +1,59 @@
+# tests/test_db_utils.py
+# Helpers shared by every entry point, and the keyset paging behind the transaction browser
+
+import gc
+import sqlite3
+import pytest
+import db_utils
+from database_setup import setup_database
+
+def test_file_uri_opens_awkward_paths_read_only(tmp_path):
+    folder = tmp_path / 'we?ird#name%20'; folder.mkdir()
+    path = str(folder / 'ledger.db'); setup_database(path)
+    conn = sqlite3.connect(db_utils.file_uri(path, readonly=True), uri=True)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM categories").fetchone()[0] > 0
+        with pytest.raises(sqlite3.OperationalError, match='readonly'): conn.execute("DELETE FROM categories")
+    finally: conn.close()
+    assert sorted(p.name for p in folder.iterdir()) == ['ledger.db'] # Nothing was created beside it under a mangled name
+
+def test_query_cache_lets_connections_go(tmp_path):
+    path = str(tmp_path / 'ledger.db'); setup_database(path)
+    conn = db_utils.create_connection(path)
+    calls = []
+    compute = lambda: calls.append(1) or len(calls)
+    assert db_utils._cached(conn, 'test', compute) == 1 and db_utils._cached(conn, 'test', compute) == 1
+    assert conn in db_utils._query_cache
+    before = len(db_utils._query_cache)
+    conn.close(); del conn; gc.collect()
+    assert len(db_utils._query_cache) == before - 1
+
+@pytest.fixture
+def ledger(tmp_path):
+    path = str(tmp_path / 'ledger.db'); setup_database(path)
+    conn = db_utils.create_connection(path)
+    groceries = db_utils.add_category(conn, 'Groceries')
+    conn.executemany("INSERT INTO transactions (transaction_date, description, amount, is_income, category_id) VALUES (?, ?, ?, ?, ?)",
+                     [(f"2025-01-{1 + i % 4:02d}", f"SHOP {i % 7}", 5 + i % 3, i % 5 == 0, groceries if i % 2 else None) for i in range(23)]) # Many ties on every sort column
+    conn.commit()
+    yield conn
+    conn.close()
+
+def _walk(conn, sort, descending, filters, start=None, backwards=False):
+    """ Every row id past `start` (before it when backwards), fetched five at a time by keyset, in display order. """
+    ids, key = [], start
+    while True:
+        page = db_utils.get_transactions_page(conn, sort, descending, **{('before' if backwards else 'after'): key}, limit=5, filters=filters)
+        if not page: return ids
+        ids = [r['id'] for r in page] + ids if backwards else ids + [r['id'] for r in page]
+        key = db_utils.transaction_sort_key(page[0] if backwards else page[-1], sort)
+
+@pytest.mark.parametrize('sort', ['date', 'description', 'amount'])
+@pytest.mark.parametrize('descending', [True, False])
+@pytest.mark.parametrize('filters', [None, {'text': 'SHOP 3'}, {'category_id': 0, 'is_income': 0}], ids=['all', 'text', 'uncategorized expenses'])
+def test_keyset_pages_cover_every_row_once(ledger, sort, descending, filters):
+    full = [r['id'] for r in db_utils.get_transactions_page(ledger, sort, descending, limit=1000, filters=filters)]
+    assert full and len(set(full)) == len(full)
+    assert _walk(ledger, sort, descending, filters) == full
+    last = db_utils.get_transactions_page(ledger, sort, not descending, limit=1, filters=filters)[0] # The final row, read from the other end
+    assert _walk(ledger, sort, descending, filters, start=db_utils.transaction_sort_key(last, sort), backwards=True) + [last['id']] == full
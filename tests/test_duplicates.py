@@ -0,0 +1,54 @@
+# tests/test_duplicates.py
+# Near-duplicates from different sources are queued once, and merging keeps the older row
+
+import pytest
+import db_utils
+from database_setup import setup_database
+from duplicates import find_duplicates, get_pending_duplicates, ignore_duplicates, merge_duplicates, normalize_description
+
+@pytest.fixture
+def conn(tmp_path):
+    path = str(tmp_path / 'ledger.db'); setup_database(path)
+    conn = db_utils.create_connection(path)
+    yield conn
+    conn.close()
+
+def _add(conn, rows):
+    conn.executemany("INSERT INTO transactions (transaction_date, description, amount, is_income, category_id) VALUES (?, ?, ?, ?, ?)", rows)
+    conn.commit()
+
+def _pairs(conn):
+    return {(r['a_desc'], r['b_desc']) for r in get_pending_duplicates(conn)}
+
+def test_normalize_drops_export_noise():
+    assert normalize_description("POS PURCHASE Corner Market #0412 03/14") == normalize_description("CORNER MARKET, INC.") == "CORNER MARKET"
+
+def test_only_similar_rows_close_in_time_are_queued(conn):
+    _add(conn, [
+        ('2025-03-14', 'CORNER MARKET #0412', 42.10, 0, None), ('2025-03-16', 'POS PURCHASE CORNER MARKET', 42.10, 0, None), # Queued
+        ('2025-03-14', 'CITY GARAGE', 42.10, 0, None),                                                                      # Different merchant
+        ('2025-03-25', 'CORNER MARKET', 42.10, 0, None),                                                                    # Too far apart
+        ('2025-03-15', 'CORNER MARKET REFUND', 42.10, 1, None),                                                             # Income, not expense
+        ('2025-03-15', 'CORNER MARKET', 42.11, 0, None),                                                                    # Different amount
+    ])
+    assert find_duplicates(conn) == 1
+    assert _pairs(conn) == {('CORNER MARKET #0412', 'POS PURCHASE CORNER MARKET')}
+
+def test_scans_are_incremental_and_ignores_stick(conn):
+    _add(conn, [('2025-03-14', 'CORNER MARKET #0412', 42.10, 0, None), ('2025-03-15', 'CORNER MARKET 0415', 42.10, 0, None)])
+    assert find_duplicates(conn) == 1 and find_duplicates(conn) == 0
+    ignore_duplicates(conn, [r['id'] for r in get_pending_duplicates(conn)])
+    assert find_duplicates(conn, full=True) == 0 and not _pairs(conn)
+    _add(conn, [('2025-03-16', 'DEBIT CORNER MARKET', 42.10, 0, None)]) # Pairs with both older rows
+    assert find_duplicates(conn) == 2
+
+def test_merge_keeps_the_older_row_and_its_category(conn):
+    groceries = db_utils.add_category(conn, 'Groceries')
+    _add(conn, [('2025-03-14', 'CORNER MARKET', 42.10, 0, None), ('2025-03-15', 'CORNER MARKET 1', 42.10, 0, groceries),
+                ('2025-03-16', 'CORNER MARKET 2', 42.10, 0, None)])
+    assert find_duplicates(conn) == 3
+    first = next(r for r in get_pending_duplicates(conn) if (r['a_desc'], r['b_desc']) == ('CORNER MARKET', 'CORNER MARKET 1'))
+    assert merge_duplicates(conn, [first['id']]) == 1
+    kept = conn.execute("SELECT description, category_id FROM transactions ORDER BY id").fetchall()
+    assert [tuple(r) for r in kept] == [('CORNER MARKET', groceries), ('CORNER MARKET 2', None)]
+    assert _pairs(conn) == {('CORNER MARKET', 'CORNER MARKET 2')} # The pair with the deleted row is gone
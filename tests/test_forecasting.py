@@ -0,0 +1,30 @@
+# tests/test_forecasting.py
+# The forecast projects month-to-date spend from the same rows its curves were learned from
+
+import datetime
+from decimal import Decimal
+import pytest
+import db_utils
+from database_setup import setup_database
+from forecasting import forecast_month
+
+AS_OF = datetime.date(2025, 6, 15)
+
+@pytest.fixture
+def conn(tmp_path):
+    path = str(tmp_path / 'ledger.db'); setup_database(path)
+    conn = db_utils.create_connection(path)
+    yield conn
+    conn.close()
+
+def test_spent_is_month_to_date_report_spending(conn):
+    hobbies, fees = db_utils.add_category(conn, 'Hobbies'), db_utils.add_category(conn, 'Club Fees')
+    db_utils.set_category_flag(conn, fees, 'budgetable', 0) # Counted as spending, but not in reports or curves
+    conn.executemany("INSERT INTO transactions (transaction_date, description, amount, is_income, category_id) VALUES (?, ?, ?, 0, ?)", [
+        ('2025-06-03', 'PAINT', 10, hobbies), ('2025-06-20', 'EASEL', 20, hobbies), # The second is after as_of
+        ('2025-06-05', 'MEMBERSHIP', 5, fees),
+    ])
+    conn.commit()
+    forecast = forecast_month(conn, as_of=AS_OF)
+    assert forecast[hobbies]['spent'] == Decimal('10.00') and fees not in forecast
+    assert db_utils.get_spending_for_month(conn, 2025, 6) == {hobbies: Decimal('30.00'), fees: Decimal('5.00')} # What the summary shows as spent
@@ -0,0 +1,34 @@
+# tests/test_ledgers.py
+# Rollups must work across ledgers created by older versions
+
+import sqlite3
+from decimal import Decimal
+import pytest
+import db_utils
+from database_setup import SCHEMA_VERSION, setup_database
+from ledgers import rollup_month
+from test_schema_migration import PRE_SERIES_SCHEMA
+
+@pytest.fixture
+def ledgers(tmp_path):
+    old, new = str(tmp_path / 'old.db'), str(tmp_path / 'new.db')
+    raw = sqlite3.connect(old); raw.executescript(PRE_SERIES_SCHEMA); raw.close()
+    setup_database(new)
+    conn = db_utils.create_connection(new)
+    groceries = conn.execute("SELECT id FROM categories WHERE name = 'Groceries'").fetchone()[0]
+    conn.executemany("INSERT INTO transactions (transaction_date, description, amount, is_income, category_id) VALUES (?, ?, ?, ?, ?)",
+                     [('2025-01-10', 'MARKET', 12.5, 0, groceries), ('2025-01-31', 'PAYROLL', 900, 1, None)])
+    conn.commit(); conn.close()
+    return [('old', old), ('new', new)]
+
+def test_rollup_migrates_old_ledgers(ledgers):
+    rollup = rollup_month(ledgers, 2025, 1)
+    assert rollup['new'] == {'income': Decimal('900.00'), 'spending': Decimal('12.50'), 'by_category': {'Groceries': Decimal('12.50')}}
+    assert rollup['old']['by_category'] == {} and rollup['old']['spending'] == Decimal('0.00') # Its rows are uncategorized
+    raw = sqlite3.connect(ledgers[0][1])
+    try: assert raw.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    finally: raw.close()
+
+def test_rollup_reports_ledgers_it_cannot_open(ledgers, tmp_path, capsys):
+    assert rollup_month(ledgers + [('gone', str(tmp_path / 'gone.db'))], 2025, 1) is None
+    assert 'gone' in capsys.readouterr().out and not (tmp_path / 'gone.db').exists()
@@ -0,0 +1,59 @@
+# tests/test_maintenance.py
+# Each maintenance task runs only once its threshold is crossed
+
+import datetime
+import pytest
+import db_utils
+import maintenance
+from database_setup import setup_database
+
+@pytest.fixture
+def conn(tmp_path):
+    path = str(tmp_path / 'ledger.db'); setup_database(path)
+    conn = db_utils.create_connection(path)
+    yield conn
+    conn.close()
+
+def _insert(conn, n, start=0, size=10):
+    conn.executemany("INSERT INTO transactions (transaction_date, description, amount, is_income) VALUES ('2025-01-01', ?, 1, 0)",
+                     [(f"{i:08d}" + 'x' * size,) for i in range(start, start + n)])
+    conn.commit()
+
+def test_rows_changed_counts_inserts_and_deletes():
+    before = {'transactions': [100, 100], 'tags': [5, None]}
+    after = {'transactions': [90, 120], 'tags': [7, None], 'new': [3, 3]} # 20 inserted, 30 deleted; 2 more tags; a new table
+    assert maintenance.rows_changed(before, after) == 20 + 30 + 2 + 3
+
+def test_fresh_ledger_needs_statistics_and_a_check_then_nothing(conn):
+    assert set(maintenance.due_tasks(conn)) == {'analyze', 'integrity'}
+    report = maintenance.run_maintenance(conn)
+    assert set(report) >= {'analyze', 'integrity'} and report['integrity'].startswith('ok')
+    assert maintenance.due_tasks(conn) == {}
+    assert maintenance.run_if_due(conn) is None # Ran moments ago
+
+def test_analyze_waits_for_enough_changes(conn):
+    _insert(conn, 3000); maintenance.run_maintenance(conn)
+    _insert(conn, 200, start=3000)
+    assert 'analyze' not in maintenance.due_tasks(conn) # Below ANALYZE_MIN_CHANGES
+    _insert(conn, 1000, start=3200)
+    assert 'analyze' in maintenance.due_tasks(conn)     # 1200 rows, and more than a tenth of the ledger
+    conn.execute("DELETE FROM transactions WHERE id > 3000"); conn.commit(); maintenance.run_maintenance(conn)
+    conn.execute("DELETE FROM transactions WHERE id <= 1200"); conn.commit()
+    assert 'analyze' in maintenance.due_tasks(conn)     # Deletes count too
+
+def test_free_pages_are_vacuumed(conn):
+    _insert(conn, 3000, size=500); maintenance.run_maintenance(conn)
+    conn.execute("DELETE FROM transactions WHERE id % 10 = 0"); conn.commit()
+    assert 'vacuum' not in maintenance.due_tasks(conn) # A tenth of the rows freed few whole pages
+    conn.execute("DELETE FROM transactions"); conn.commit()
+    pages, _, _, auto_vacuum = maintenance.page_stats(conn)
+    assert auto_vacuum == 2 and 'vacuum' in maintenance.due_tasks(conn)
+    assert maintenance.run_maintenance(conn)['vacuum'].startswith('freed')
+    assert maintenance.page_stats(conn)[1] == 0 and maintenance.page_stats(conn)[0] < pages
+
+def test_integrity_check_is_weekly(conn):
+    maintenance.run_maintenance(conn)
+    now = datetime.datetime.now()
+    assert 'integrity' not in maintenance.due_tasks(conn, now=now + datetime.timedelta(days=maintenance.INTEGRITY_INTERVAL_DAYS - 1))
+    assert 'integrity' in maintenance.due_tasks(conn, now=now + datetime.timedelta(days=maintenance.INTEGRITY_INTERVAL_DAYS))
+    assert 'integrity' not in maintenance.run_maintenance(conn, integrity=False)
@@ -0,0 +1,57 @@
+# tests/test_payoff_monte_carlo.py
+# The Monte Carlo engine must agree with the deterministic simulation, report progress and stop when cancelled
+
+import threading
+from decimal import Decimal
+import pytest
+import db_utils
+from database_setup import setup_database
+from debt_manager import simulate_payoff
+
+np = pytest.importorskip('numpy')
+from payoff_monte_carlo import DEFAULT_ASSUMPTIONS, PERCENTILES, run_payoff_monte_carlo, simulate_payoff_monte_carlo
+
+NO_SHOCKS = {name: 0.0 for name in DEFAULT_ASSUMPTIONS if name.endswith('_prob')}
+
+DEBTS = [
+    {'name': 'Card', 'current_balance': Decimal('4200.00'), 'interest_rate': Decimal('22.9'), 'minimum_payment': Decimal('120.00')},
+    {'name': 'Car', 'current_balance': Decimal('9800.00'), 'interest_rate': Decimal('6.4'), 'minimum_payment': Decimal('260.00')},
+]
+
+@pytest.fixture
+def conn(tmp_path):
+    path = str(tmp_path / 'ledger.db'); setup_database(path)
+    conn = db_utils.create_connection(path)
+    for d in DEBTS: db_utils.add_debt(conn, d['name'], 'Bank', d['current_balance'], d['interest_rate'], d['minimum_payment'])
+    yield conn
+    conn.close()
+
+def test_seeded_percentiles_are_ordered_and_repeatable():
+    first = run_payoff_monte_carlo(DEBTS, 'avalanche', Decimal('500'), n_paths=2000, seed=7)
+    again = run_payoff_monte_carlo(DEBTS, 'avalanche', Decimal('500'), n_paths=2000, seed=7)
+    months = [first['months_percentiles'][p] for p in PERCENTILES]; interest = [first['interest_percentiles'][p] for p in PERCENTILES]
+    assert months == sorted(months) and interest == sorted(interest) and months[0] < months[-1] # The shocks spread the paths out
+    assert first['months_percentiles'] == again['months_percentiles'] and first['interest_percentiles'] == again['interest_percentiles']
+    assert np.array_equal(first['payoff_months'], again['payoff_months'])
+
+@pytest.mark.parametrize('strategy', ['avalanche', 'snowball'])
+def test_zero_volatility_matches_simulate_payoff(conn, strategy):
+    _, summary = simulate_payoff(conn, strategy, Decimal('600'))
+    results = simulate_payoff_monte_carlo(conn, strategy, Decimal('600'), n_paths=50, assumptions=NO_SHOCKS)
+    assert results['paid_off_share'] == 1.0 and set(results['payoff_months'].tolist()) == {summary['total_months']}
+    assert all(m == summary['total_months'] for m in results['months_percentiles'].values())
+    assert all(abs(i - summary['total_interest']) <= Decimal('0.05') for i in results['interest_percentiles'].values())
+
+def test_progress_reaches_every_path():
+    seen = []
+    results = run_payoff_monte_carlo(DEBTS, 'avalanche', Decimal('600'), n_paths=500, progress_callback=lambda n, total: seen.append((n, total)))
+    assert results and len(seen) > 1
+    assert all(total == 500 for _, total in seen) and [n for n, _ in seen] == sorted(n for n, _ in seen) and seen[-1] == (500, 500)
+
+def test_cancel_stops_the_run():
+    cancel = threading.Event(); months = []
+    def progress(n, total):
+        months.append(n)
+        if len(months) == 2: cancel.set()
+    assert run_payoff_monte_carlo(DEBTS, 'snowball', Decimal('600'), n_paths=500, progress_callback=progress, cancel_event=cancel) is None
+    assert len(months) == 2 # Stopped at the first month after the event was set
@@ -0,0 +1,69 @@
+# tests/test_schema_migration.py
+# A ledger created before the category flags and the points ledger must keep working once an entry point connects
+
+import sqlite3
+import pytest
+import db_utils
+from categorization_queue import UncategorizedQueue
+from database_setup import SCHEMA_VERSION, ensure_schema
+
+# The schema of the finance.db shipped before these tables and columns existed
+PRE_SERIES_SCHEMA = """
+CREATE TABLE categories (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE);
+CREATE TABLE transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, transaction_date DATE NOT NULL, description TEXT NOT NULL, amount REAL NOT NULL,
+    category_id INTEGER, is_income BOOLEAN DEFAULT 0, import_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (category_id) REFERENCES categories (id));
+CREATE TABLE budget_simple (id INTEGER PRIMARY KEY AUTOINCREMENT, category_id INTEGER NOT NULL UNIQUE, monthly_limit REAL NOT NULL);
+CREATE TABLE gamification (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER DEFAULT 1, points INTEGER DEFAULT 0, last_upload_date DATE, upload_streak INTEGER DEFAULT 0);
+CREATE UNIQUE INDEX idx_unique_transaction ON transactions (transaction_date, description, amount);
+CREATE TABLE debts (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, lender TEXT, current_balance REAL NOT NULL,
+    interest_rate REAL NOT NULL, minimum_payment REAL NOT NULL, last_updated DATE);
+INSERT INTO categories (name) VALUES ('Groceries'), ('Transfer');
+INSERT INTO transactions (transaction_date, description, amount) VALUES ('2025-01-03', 'MARKET', -42.5), ('2025-01-04', 'TRANSFER OUT', -100);
+-- Older versions added a gamification row on every setup run; the oldest holds the full total
+INSERT INTO gamification (user_id, points) VALUES (1, 3), (1, 2);
+"""
+
+@pytest.fixture
+def old_ledger(tmp_path):
+    path = str(tmp_path / 'old.db')
+    raw = sqlite3.connect(path); raw.executescript(PRE_SERIES_SCHEMA); raw.close()
+    conn = db_utils.create_connection(path)
+    yield conn
+    conn.close()
+
+def test_categorize_after_migration(old_ledger):
+    assert ensure_schema(old_ledger)
+    assert old_ledger.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    tx_id = old_ledger.execute("SELECT id FROM transactions WHERE description = 'MARKET'").fetchone()[0]
+    groceries = old_ledger.execute("SELECT id FROM categories WHERE name = 'Groceries'").fetchone()[0]
+    queue = UncategorizedQueue(old_ledger)
+    assert queue.assign({'id': tx_id}, groceries) and queue.flush()
+    assert old_ledger.execute("SELECT category_id FROM transactions WHERE id = ?", (tx_id,)).fetchone()[0] == groceries
+    assert db_utils.get_gamification_points(old_ledger) == 4
+    assert [tuple(r) for r in old_ledger.execute("SELECT event, points, ref FROM points_events WHERE event = 'categorize'")] == [('categorize', 1, str(tx_id))]
+
+def test_migration_adds_category_flags(old_ledger):
+    assert ensure_schema(old_ledger)
+    flags = {row['name']: row for row in db_utils.get_categories(old_ledger)}
+    assert flags['Transfer']['exclude_spending'] == 1 and flags['Groceries']['exclude_spending'] == 0
+    assert db_utils.get_dashboard_snapshot(old_ledger) is not None
+
+def test_import_event_after_migration(old_ledger):
+    assert ensure_schema(old_ledger)
+    assert db_utils.record_import(old_ledger)
+    assert old_ledger.execute("SELECT COUNT(*) FROM points_events WHERE event = 'import'").fetchone()[0] == 1
+    assert old_ledger.execute("SELECT last_upload_date FROM gamification WHERE user_id = 1").fetchone()[0] is not None
+
+def test_current_schema_is_left_alone(old_ledger, capsys):
+    assert ensure_schema(old_ledger)
+    capsys.readouterr()
+    assert ensure_schema(old_ledger)
+    assert capsys.readouterr().out == ""
+
+def test_new_category_gets_default_flags(old_ledger):
+    assert ensure_schema(old_ledger)
+    for name in ('ATM Fee', 'returned purchase', 'Hobbies'): db_utils.add_category(old_ledger, name)
+    flags = {row['name']: (row['exclude_spending'], row['budgetable']) for row in db_utils.get_categories(old_ledger)}
+    assert flags['ATM Fee'] == (1, 0) and flags['returned purchase'] == (1, 0) and flags['Hobbies'] == (0, 1)
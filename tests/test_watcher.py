@@ -0,0 +1,61 @@
+# tests/test_watcher.py
+# The drop-folder watcher waits for files to settle and imports the same content only once
+
+import os
+import pytest
+import db_utils
+from database_setup import setup_database
+from watcher import DropFolderWatcher
+
+CSV = "Date,Description,Amount,Category\n01/03/2025,MARKET,-4.20,Groceries\n01/04/2025,PAYROLL,100,\n"
+
+@pytest.fixture
+def conn(tmp_path):
+    path = str(tmp_path / 'ledger.db'); setup_database(path)
+    conn = db_utils.create_connection(path)
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def watcher(conn, tmp_path):
+    inbox = tmp_path / 'inbox'; inbox.mkdir()
+    return DropFolderWatcher(conn, str(inbox), settle=3, backend='stream')
+
+def _drop(watcher, name, text=CSV, mtime=1000):
+    path = os.path.join(watcher.watch_dir, name)
+    with open(path, 'w', encoding='utf-8') as f: f.write(text)
+    os.utime(path, (mtime, mtime))
+    return path
+
+def _statuses(conn):
+    return [tuple(r) for r in conn.execute("SELECT name, status, imported FROM imported_files ORDER BY id")]
+
+def test_files_wait_until_unchanged_for_settle_seconds(watcher):
+    path = _drop(watcher, 'march.csv')
+    assert watcher.scan(now=1001) == []                  # First sighting
+    assert watcher.scan(now=1003) == []                  # Unchanged for only 2s
+    with open(path, 'a', encoding='utf-8') as f: f.write("01/05/2025,CAFE,-3.00,\n")
+    os.utime(path, (1003, 1003))
+    assert watcher.scan(now=1005) == []                  # Still being written: the clock restarts
+    assert watcher.scan(now=1007) == []
+    assert watcher.scan(now=1008) == [path]
+    os.remove(path); watcher.scan(now=1009)
+    assert watcher.seen == {}                            # Vanished files are forgotten
+
+def test_same_content_is_imported_once(watcher, conn):
+    first = _drop(watcher, 'march.csv'); watcher.process(first)
+    copy = _drop(watcher, 'march (1).csv'); watcher.process(copy)
+    assert conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 2
+    assert _statuses(conn) == [('march.csv', 'imported', 2), ('march (1).csv', 'duplicate', 0)]
+    assert sorted(os.listdir(watcher.processed_dir)) == ['march (1).csv', 'march.csv'] and not os.path.exists(copy)
+
+def test_unreadable_files_are_moved_to_failed(watcher, conn):
+    path = _drop(watcher, 'broken.csv', "Description,Amount\nMARKET,-4.20\n"); watcher.process(path)
+    assert _statuses(conn) == [('broken.csv', 'failed', 0)] and os.listdir(watcher.failed_dir) == ['broken.csv']
+    again = _drop(watcher, 'broken.csv', "Description,Amount\nMARKET,-4.20\n"); watcher.process(again) # A failure does not count as imported
+    assert [s for _, s, _ in _statuses(conn)] == ['failed', 'failed'] and len(os.listdir(watcher.failed_dir)) == 2
+
+def test_once_imports_settled_files(watcher, conn):
+    _drop(watcher, 'march.csv')
+    watcher.run(once=True)
+    assert _statuses(conn) == [('march.csv', 'imported', 2)] and os.listdir(watcher.processed_dir) == ['march.csv']
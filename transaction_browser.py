@@ -0,0 +1,178 @@
+# transaction_browser.py
+# Virtualized transaction browser window for the Tkinter GUI
+# Shows a sliding window of keyset pages; sorting and filtering run in SQL
+
+import tkinter as tk
+from tkinter import ttk, messagebox
+import db_utils
+
+PAGE_SIZE = 200     # Rows fetched per keyset query
+MAX_PAGES = 3       # Pages kept in the Treeview at once; older ones are dropped as the user scrolls
+EDGE = 0.15         # Fetch the next/previous page when the view is this close to either end
+SAVE_EVERY = 100    # Pending recategorizations written per batch
+SORTABLE = {'date': 'Date', 'description': 'Description', 'amount': 'Amount'}
+
+class TransactionBrowser:
+    """ Treeview over `transactions` that only ever holds a few pages, fetched on demand by keyset. """
+    def __init__(self, app):
+        self.app = app
+        self.conn = app.db_conn
+        self.sort = 'date'; self.descending = True; self.filters = {}
+        self.keys = {}        # Treeview iid -> (sort value, id)
+        self.pending = {}     # transaction id -> category id, not yet written
+        self.at_start = True; self.at_end = False
+        self.loading = False; self.generation = 0
+        self.categories = [(c['id'], c['name']) for c in db_utils.get_categories(self.conn)]
+        self._build_window()
+        self.reload()
+
+    # --- Window ---
+    def _build_window(self):
+        self.win = tk.Toplevel(self.app.root); self.win.title("Transactions"); self.win.geometry("900x600"); self.win.transient(self.app.root)
+        self.win.protocol("WM_DELETE_WINDOW", self.close)
+        flt = ttk.LabelFrame(self.win, text="Filter", padding="5"); flt.pack(fill=tk.X, padx=5, pady=5)
+        self.text_var = tk.StringVar(); self.cat_filter_var = tk.StringVar(value="All"); self.from_var = tk.StringVar(); self.to_var = tk.StringVar(); self.type_var = tk.StringVar(value="All")
+        ttk.Label(flt, text="Search:").grid(row=0, column=0, sticky=tk.W); search = ttk.Entry(flt, textvariable=self.text_var, width=22); search.grid(row=0, column=1, padx=3); search.bind('<Return>', lambda e: self.apply_filters())
+        ttk.Label(flt, text="Category:").grid(row=0, column=2, sticky=tk.W); ttk.Combobox(flt, textvariable=self.cat_filter_var, values=["All", "(Uncategorized)"] + [n for _, n in self.categories], state='readonly', width=20).grid(row=0, column=3, padx=3)
+        ttk.Label(flt, text="Type:").grid(row=0, column=4, sticky=tk.W); ttk.Combobox(flt, textvariable=self.type_var, values=("All", "Expense", "Income"), state='readonly', width=8).grid(row=0, column=5, padx=3)
+        ttk.Label(flt, text="From (YYYY-MM-DD):").grid(row=1, column=0, sticky=tk.W); ttk.Entry(flt, textvariable=self.from_var, width=12).grid(row=1, column=1, sticky=tk.W, padx=3)
+        ttk.Label(flt, text="To:").grid(row=1, column=2, sticky=tk.W); ttk.Entry(flt, textvariable=self.to_var, width=12).grid(row=1, column=3, sticky=tk.W, padx=3)
+        ttk.Button(flt, text="Apply", command=self.apply_filters).grid(row=1, column=4, padx=3); ttk.Button(flt, text="Clear", command=self.clear_filters).grid(row=1, column=5, padx=3)
+
+        fr = ttk.Frame(self.win, padding="5"); fr.pack(fill=tk.BOTH, expand=True, padx=5)
+        cols = ('date', 'description', 'amount', 'type', 'category')
+        self.tree = ttk.Treeview(fr, columns=cols, show='headings', selectmode='extended')
+        for col, text, width, anchor in (('date', 'Date', 90, tk.CENTER), ('description', 'Description', 380, tk.W), ('amount', 'Amount', 100, tk.E), ('type', 'Type', 50, tk.CENTER), ('category', 'Category', 180, tk.W)):
+            self.tree.heading(col, text=text); self.tree.column(col, width=width, anchor=anchor)
+            if col in SORTABLE: self.tree.heading(col, command=lambda c=col: self.sort_by(c))
+        self.scrollbar = ttk.Scrollbar(fr, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self._on_scroll)
+        self.tree.grid(row=0, column=0, sticky='nsew'); self.scrollbar.grid(row=0, column=1, sticky='ns'); fr.grid_rowconfigure(0, weight=1); fr.grid_columnconfigure(0, weight=1)
+
+        act = ttk.Frame(self.win, padding="5"); act.pack(fill=tk.X, padx=5)
+        self.assign_var = tk.StringVar()
+        ttk.Label(act, text="Set category:").pack(side=tk.LEFT); ttk.Combobox(act, textvariable=self.assign_var, values=[n for _, n in self.categories], state='readonly', width=22).pack(side=tk.LEFT, padx=3)
+        ttk.Button(act, text="Apply to Selected", command=self.recategorize_selected).pack(side=tk.LEFT, padx=3)
+        ttk.Button(act, text="Save Changes", command=self.save_pending).pack(side=tk.LEFT, padx=3)
+        ttk.Button(act, text="Close", command=self.close).pack(side=tk.RIGHT, padx=3)
+        self.status_var = tk.StringVar(value="Loading..."); ttk.Label(self.win, textvariable=self.status_var, anchor=tk.W).pack(fill=tk.X, padx=10, pady=(0, 5))
+        self._update_headings()
+
+    def _update_headings(self):
+        for col, text in SORTABLE.items():
+            arrow = (" ▼" if self.descending else " ▲") if col == self.sort else ""
+            self.tree.heading(col, text=text + arrow)
+
+    def _update_status(self):
+        pending = f" | {len(self.pending)} unsaved change(s)" if self.pending else ""
+        more = "" if self.at_end else " (scroll for more)"
+        self.status_var.set(f"{len(self.keys)} rows in view, sorted by {SORTABLE[self.sort].lower()}{more}{pending}")
+
+    # --- Loading ---
+    def reload(self):
+        """ Drops the current window and fetches the first page for the current sort and filters. """
+        self.generation += 1; self.loading = False
+        self.tree.delete(*self.tree.get_children()); self.keys.clear()
+        self.at_start = True; self.at_end = False
+        self._fetch(None)
+
+    def _fetch(self, direction):
+        if self.loading: return
+        children = self.tree.get_children()
+        after = self.keys[children[-1]] if direction == 'after' else None
+        before = self.keys[children[0]] if direction == 'before' else None
+        self.loading = True; generation = self.generation
+        sort, descending, filters = self.sort, self.descending, dict(self.filters)
+        def work(conn, task): return [dict(r) for r in db_utils.get_transactions_page(conn, sort, descending, after=after, before=before, limit=PAGE_SIZE, filters=filters)]
+        def done(rows):
+            if generation != self.generation or not self.win.winfo_exists(): return # Stale page for an old sort/filter
+            self.loading = False; self._apply_page(rows, direction)
+        def failed(e):
+            if generation != self.generation or not self.win.winfo_exists(): return # The newer fetch owns self.loading
+            self.loading = False; self.status_var.set(f"Error loading transactions: {e}")
+        self.app.run_task("Browse transactions", work, on_done=done, on_error=failed)
+
+    def _row_values(self, row):
+        cat_id = self.pending.get(row['id'], row['category_id'])
+        if row['id'] in self.pending: category = next((n for i, n in self.categories if i == cat_id), f"ID {cat_id}") + " *"
+        else: category = row['category_name'] or "(Uncategorized)"
+        return (row['transaction_date'], row['description'], f"${row['amount']:,.2f}", "Inc" if row['is_income'] else "Exp", category)
+
+    def _apply_page(self, rows, direction):
+        first, last = (float(x) for x in self.tree.yview())
+        before_count = len(self.keys); top_index = int(first * before_count)
+        if direction == 'before':
+            if len(rows) < PAGE_SIZE: self.at_start = True
+            for pos, row in enumerate(rows): self._insert(row, pos)
+            top_index += len(rows)
+            excess = len(self.keys) - MAX_PAGES * PAGE_SIZE
+            if excess > 0:
+                for iid in self.tree.get_children()[-excess:]: self.tree.delete(iid); del self.keys[iid]
+                self.at_end = False
+        else:
+            if len(rows) < PAGE_SIZE: self.at_end = True
+            for row in rows: self._insert(row, tk.END)
+            excess = len(self.keys) - MAX_PAGES * PAGE_SIZE
+            if excess > 0:
+                for iid in self.tree.get_children()[:excess]: self.tree.delete(iid); del self.keys[iid]
+                self.at_start = False; top_index -= excess
+        if direction and self.keys: self.tree.yview_moveto(max(0, top_index) / len(self.keys)) # Keep the rows the user was looking at in place
+        self._update_status()
+
+    def _insert(self, row, index):
+        iid = str(row['id'])
+        self.tree.insert('', index, iid=iid, values=self._row_values(row))
+        self.keys[iid] = db_utils.transaction_sort_key(row, self.sort)
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self.loading or not self.keys: return
+        if float(last) > 1 - EDGE and not self.at_end: self._fetch('after')
+        elif float(first) < EDGE and not self.at_start: self._fetch('before')
+
+    # --- Sorting / Filtering ---
+    def sort_by(self, col):
+        if col == self.sort: self.descending = not self.descending
+        else: self.sort = col; self.descending = col != 'description'
+        self._update_headings(); self.save_pending(); self.reload()
+
+    def apply_filters(self):
+        filters = {}
+        if self.text_var.get().strip(): filters['text'] = self.text_var.get().strip()
+        cat = self.cat_filter_var.get()
+        if cat == "(Uncategorized)": filters['category_id'] = 0
+        elif cat and cat != "All": filters['category_id'] = next((i for i, n in self.categories if n == cat), None)
+        for key, var in (('date_from', self.from_var), ('date_to', self.to_var)):
+            if var.get().strip(): filters[key] = var.get().strip()
+        if self.type_var.get() != "All": filters['is_income'] = 1 if self.type_var.get() == "Income" else 0
+        self.filters = filters; self.save_pending(); self.reload()
+
+    def clear_filters(self):
+        self.text_var.set(""); self.cat_filter_var.set("All"); self.from_var.set(""); self.to_var.set(""); self.type_var.set("All")
+        self.apply_filters()
+
+    # --- Recategorization ---
+    def recategorize_selected(self):
+        name = self.assign_var.get(); sel = self.tree.selection()
+        cat_id = next((i for i, n in self.categories if n == name), None)
+        if not sel or cat_id is None: messagebox.showwarning("Select", "Select rows and a category first.", parent=self.win); return
+        for iid in sel:
+            self.pending[int(iid)] = cat_id
+            self.tree.set(iid, 'category', name + " *")
+        if len(self.pending) >= SAVE_EVERY: self.save_pending()
+        self._update_status()
+
+    def save_pending(self):
+        """ Writes all pending recategorizations in one transaction. """
+        if not self.pending: return True
+        updated = db_utils.update_transaction_categories(self.conn, self.pending.items())
+        if updated is None: messagebox.showerror("Error", "Failed to save category changes.", parent=self.win); return False
+        names = dict(self.categories)
+        for tx_id, cat_id in self.pending.items():
+            if self.tree.exists(str(tx_id)): self.tree.set(str(tx_id), 'category', names.get(cat_id, f"ID {cat_id}"))
+        self.pending.clear(); self._update_status()
+        return True
+
+    def close(self):
+        if self.save_pending() or messagebox.askyesno("Discard", "Discard unsaved category changes?", parent=self.win):
+            self.generation += 1; self.win.destroy(); self.app.load_dashboard_data()
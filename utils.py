@@ -1,6 +1,7 @@
 # utils.py
 # Helper functions for input validation
 
+import datetime
 from decimal import Decimal, ROUND_HALF_UP
 
 def get_decimal_input(prompt, allow_negative=False):
@@ -29,4 +30,29 @@ def get_string_input(prompt, allow_empty=False):
          if value or allow_empty:
              return value
          elif not allow_empty:
-             print("Input cannot be empty.")
\ No newline at end of file
+             print("Input cannot be empty.")
+
+def parse_decimal(value_str, default=None):
+    """ Parses an optional money string. Returns default when empty and None when invalid. """
+    value_str = value_str.strip().replace('$', '').replace(',', '')
+    if not value_str:
+        return default
+    try:
+        value = Decimal(value_str)
+    except Exception:
+        return None
+    if not value.is_finite():
+        return None
+    return value.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+def parse_month(value):
+    """ Parses 'YYYY-MM' into (year, month). Raises ValueError when value is not a valid month. """
+    year, month = map(int, value.split('-'))
+    datetime.date(year, month, 1)
+    return year, month
+
+def json_default(value):
+    """ json.dumps default= for the command-line tools and the API: Decimal as a string, dates in ISO format. """
+    if isinstance(value, Decimal): return str(value)
+    if isinstance(value, (datetime.date, datetime.datetime)): return value.isoformat()
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
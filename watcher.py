@@ -0,0 +1,176 @@
+# watcher.py
+# Drop-folder daemon: imports CSV files as they land in a directory
+# A file is imported once its size and mtime have stayed the same for --settle seconds
+# (so half-copied downloads are left alone), then moved to processed/ or failed/.
+# Content hashes are recorded in imported_files, so a re-dropped copy is not imported twice.
+# Uses WAL and a busy timeout, so it can run next to the GUI or main.py.
+# Usage: python watcher.py [--dir inbox] [--ledger NAME | --db FILE] [--interval 5] [--settle 3] [--apply-rules] [--once]
+
+import argparse
+import contextlib
+import datetime
+import hashlib
+import io
+import os
+import shutil
+import signal
+import sqlite3
+import sys
+import time
+import db_utils
+import maintenance
+from database_setup import ensure_schema
+from ledgers import add_source_arguments, resolve_db_file
+
+DEFAULT_DIR = 'inbox'
+DEFAULT_INTERVAL = 5.0   # Seconds between directory scans
+DEFAULT_SETTLE = 3.0     # Seconds a file must stay unchanged before it is imported
+LOCK_RETRY_LIMIT = 5     # Scans a file is retried while the database stays locked before it is failed
+LOG_NAME = 'watcher.log'
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''): digest.update(chunk)
+    return digest.hexdigest()
+
+def _move_aside(path, target_dir):
+    """ Moves path into target_dir, adding a timestamp when the name is taken. Returns the new path. """
+    os.makedirs(target_dir, exist_ok=True)
+    name = os.path.basename(path); target = os.path.join(target_dir, name)
+    if os.path.exists(target):
+        stem, ext = os.path.splitext(name)
+        target = os.path.join(target_dir, f"{stem}.{datetime.datetime.now():%Y%m%d-%H%M%S}{ext}")
+    shutil.move(path, target)
+    return target
+
+class DropFolderWatcher:
+    """ Polls one directory. Keeps {path: (size, mtime_ns, unchanged since)} for files still settling. """
+    def __init__(self, conn, watch_dir, settle=DEFAULT_SETTLE, backend=None, apply_rules=False, log_path=None):
+        self.conn = conn; self.watch_dir = watch_dir; self.settle = settle
+        self.backend = backend; self.apply_rules = apply_rules
+        self.processed_dir = os.path.join(watch_dir, 'processed'); self.failed_dir = os.path.join(watch_dir, 'failed')
+        self.log_path = log_path or os.path.join(watch_dir, LOG_NAME)
+        self.seen = {}; self.lock_retries = {}; self.imported = False
+
+    def log(self, line):
+        line = f"{datetime.datetime.now().isoformat(timespec='seconds')} {line}"
+        print(line, flush=True)
+        try:
+            with open(self.log_path, 'a', encoding='utf-8') as f: f.write(line + '\n')
+        except OSError as e: print(f"Cannot write log {self.log_path}: {e}")
+
+    def scan(self, now=None):
+        """ One poll: returns the files that have settled and are ready to import. """
+        now = time.time() if now is None else now; ready = []; present = set()
+        for entry in os.scandir(self.watch_dir):
+            if not entry.is_file() or not entry.name.lower().endswith('.csv'): continue
+            try: st = entry.stat()
+            except FileNotFoundError: continue # Moved away mid-scan
+            present.add(entry.path); sig = (st.st_size, st.st_mtime_ns)
+            prev = self.seen.get(entry.path)
+            if prev is None or prev[:2] != sig: self.seen[entry.path] = (*sig, now); continue # New or still being written
+            if now - prev[2] >= self.settle and now - st.st_mtime >= self.settle: ready.append(entry.path)
+        for gone in set(self.seen) - present: del self.seen[gone]
+        return sorted(ready)
+
+    def _known(self, sha):
+        row = self.conn.execute("SELECT processed_at FROM imported_files WHERE sha256 = ? AND status = 'imported' LIMIT 1", (sha,)).fetchone()
+        return row['processed_at'] if row else None
+
+    def _record(self, path, st, sha, status, imported=0, skipped=0):
+        self.conn.execute("INSERT INTO imported_files (name, size, mtime_ns, sha256, status, imported, skipped) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                          (os.path.basename(path), st.st_size, st.st_mtime_ns, sha, status, imported, skipped))
+        self.conn.commit()
+
+    def process(self, path):
+        """ Imports one settled file and moves it aside. Writes one log line. """
+        from csv_importer import import_csv, DatabaseBusyError
+        name = os.path.basename(path); start = time.perf_counter()
+        try: st = os.stat(path); sha = _sha256(path)
+        except OSError as e: self.log(f"error {name}: {e}"); return
+        self.seen.pop(path, None)
+        try:
+            done_at = self._known(sha)
+            if done_at:
+                self._record(path, st, sha, 'duplicate'); _move_aside(path, self.processed_dir)
+                self.log(f"duplicate {name} sha={sha[:12]} (same content imported {done_at}); moved to processed/"); return
+            output = io.StringIO(); categorized = None; locked = False
+            with contextlib.redirect_stdout(output): # The importer's progress chatter stays out of the log
+                try: result = import_csv(self.conn, path, backend=self.backend)
+                except DatabaseBusyError: result = None; locked = True # Someone held the write lock past the busy timeout; nothing was written
+                if result and self.apply_rules and result[0] + result[1]:
+                    from category_rules import apply_rules
+                    outcome = apply_rules(self.conn)
+                    if outcome: categorized = outcome['by_rule'] + outcome['by_history']
+            if locked:
+                tries = self.lock_retries.get(path, 0) + 1; self.lock_retries[path] = tries
+                if tries < LOCK_RETRY_LIMIT: self.log(f"busy {name}: database locked, retry {tries}/{LOCK_RETRY_LIMIT - 1}"); return
+            self.lock_retries.pop(path, None)
+            imported, updated, skipped = result or (0, 0, 0)
+            failed = result is None or (imported + updated == 0 and skipped > 0)
+            self._record(path, st, sha, 'failed' if failed else 'imported', imported + updated, skipped)
+            moved = _move_aside(path, self.failed_dir if failed else self.processed_dir)
+            elapsed = time.perf_counter() - start
+            if failed:
+                lines = [l.strip() for l in output.getvalue().splitlines() if l.strip()] # The importer's last message, for the log only
+                reason = (f"database still locked after {LOCK_RETRY_LIMIT} tries" if locked else f"all {skipped} rows skipped" if result
+                          else lines[-1] if lines else 'import failed')
+                self.log(f"failed {name} sha={sha[:12]} {elapsed:.1f}s: {reason}; moved to {os.path.relpath(moved, self.watch_dir)}")
+            else:
+                extra = f" categorized={categorized}" if categorized is not None else ""
+                self.log(f"imported {name} rows={imported + updated} skipped={skipped}{extra} sha={sha[:12]} {elapsed:.1f}s")
+                self.imported = True
+        except (sqlite3.Error, OSError) as e:
+            self.log(f"error {name}: {e}")
+
+    def maintain(self):
+        """ After a scan that imported something: statistics, vacuum and checkpoint if their thresholds are crossed. """
+        if not self.imported: return
+        self.imported = False
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output): report = maintenance.run_if_due(self.conn)
+        if report: self.log("maintenance " + "; ".join(f"{task}: {outcome}" for task, outcome in report.items()))
+
+    def run(self, interval=DEFAULT_INTERVAL, once=False):
+        """ Polls until stopped (SIGINT/SIGTERM). With once=True, imports what is there now and returns. """
+        stop = []
+        signal.signal(signal.SIGTERM, lambda *_: stop.append(True))
+        self.log(f"watching {os.path.abspath(self.watch_dir)}")
+        try:
+            if once:
+                self.scan(now=0) # Files count as settled once their mtime is --settle seconds old
+                for path in self.scan(): self.process(path)
+                self.maintain(); return
+            while not stop:
+                for path in self.scan(): self.process(path)
+                self.maintain(); time.sleep(interval)
+        except KeyboardInterrupt: pass
+        finally: self.log("stopped")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import CSV files dropped into a folder.")
+    add_source_arguments(parser)
+    parser.add_argument('--dir', default=DEFAULT_DIR, help=f"Folder to watch (default: {DEFAULT_DIR})")
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL, help=f"Seconds between scans (default: {DEFAULT_INTERVAL:g})")
+    parser.add_argument('--settle', type=float, default=DEFAULT_SETTLE, help=f"Seconds a file must be unchanged before import (default: {DEFAULT_SETTLE:g})")
+    parser.add_argument('--backend', choices=['pandas', 'stream'], help="Importer backend (default: the app's default)")
+    parser.add_argument('--apply-rules', action='store_true', help="Categorize new transactions by rules and history after each import")
+    parser.add_argument('--log', help=f"Log file (default: <dir>/{LOG_NAME})")
+    parser.add_argument('--once', action='store_true', help="Import what is in the folder now and exit")
+    args = parser.parse_args(argv)
+    try: db_file = resolve_db_file(args)
+    except ValueError as e: print(e); return 2
+    if not os.path.exists(db_file): print(f"DB '{db_file}' not found."); return 1
+    os.makedirs(args.dir, exist_ok=True)
+    conn = db_utils.create_connection(db_file)
+    if conn is None: return 1
+    try:
+        db_utils.tune_connection(conn)
+        if not ensure_schema(conn): return 1
+        DropFolderWatcher(conn, args.dir, args.settle, args.backend, args.apply_rules, args.log).run(args.interval, args.once)
+    finally: conn.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())